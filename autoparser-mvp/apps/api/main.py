@@ -1,16 +1,23 @@
-from fastapi import FastAPI, HTTPException, Query, Response, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Response, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import os, glob, json, datetime
+import aiofiles, anyio.to_thread
+from sqlalchemy import select
+from sqlalchemy.orm import defer
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from packages.agents.prompt_loader import (
     load_prompt, save_prompt, render_prompt, load_sample_vars, default_vars, PROMPTS_BASE, load_required
 )
-from packages.persistence.db import SessionLocal, init_db
+from packages.persistence.async_db import get_session, init_async_db, dispose as dispose_async_db
 from packages.persistence.models import Run, Step, Measure, Snapshot as DBSnapshot
-from apps.api.runner import run_parser
+from packages.persistence import export, search_index
+from packages.pipeline import control
+from apps.api.runner import run_parser, resume_parser
 
 CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../config/config.json"))
 
@@ -32,16 +39,25 @@ def mask_key(k: str) -> str:
 
 app = FastAPI(title="Autoparser API", version="0.6.0")
 
+# Потоки для оставшихся sync-эндпоинтов (промпты, конфиг, запуск); БД-эндпоинты — async
+API_THREADS = int(os.getenv("API_THREADS", "40"))
+
 @app.on_event("startup")
-def _startup():
+async def _startup():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADS
     # Инициализируем БД (для MVP)
     try:
-        from packages.persistence.db import init_db
-        init_db()
+        await init_async_db()
+        # Запуски, чей процесс умер (перезапуск single-exe, упавший воркер), — в stale
+        await anyio.to_thread.run_sync(control.mark_stale_runs)
     except Exception:
         # не роняем старт, логи можно добавить
         pass
 
+@app.on_event("shutdown")
+async def _shutdown():
+    await dispose_async_db()
+
 CORS_ORIGINS = os.getenv("CORS_ORIGINS")
 if CORS_ORIGINS:
     origins = [o.strip() for o in CORS_ORIGINS.split(",")]
@@ -94,133 +110,210 @@ def start_parse(req: RunRequest, background: BackgroundTasks):
         run_id = run_parser(req.region)
         return {"status": "queued", "mode": "celery", "region": req.region, "run_id": run_id}
 
+def _run_dict(r: Run) -> dict:
+    return {
+        "id": r.id, "region": r.region, "status": r.status,
+        "started_at": r.started_at.isoformat() if r.started_at else None,
+        "finished_at": r.finished_at.isoformat() if r.finished_at else None,
+        "found": r.found, "processed": r.processed, "ok": r.ok, "errors": r.errors, "filtered": r.filtered or 0,
+        "heartbeat_at": r.heartbeat_at.isoformat() if r.heartbeat_at else None,
+        "cancel_requested": bool(r.cancel_requested), "stale": control.is_stale(r)
+    }
+
+async def _get_step(db: AsyncSession, run_id: int, step_id: int) -> Step | None:
+    return (await db.execute(select(Step).where(Step.run_id==run_id, Step.id==step_id))).scalar_one_or_none()
+
 @app.get("/runs", response_model=List[dict])
-def list_runs():
-    init_db()
-    db = SessionLocal()
-    try:
-        q = db.query(Run).order_by(Run.id.desc()).limit(100).all()
-        return [{
-            "id": r.id, "region": r.region, "status": r.status,
-            "started_at": r.started_at.isoformat() if r.started_at else None,
-            "finished_at": r.finished_at.isoformat() if r.finished_at else None,
-            "found": r.found, "processed": r.processed, "ok": r.ok, "errors": r.errors
-        } for r in q]
-    finally:
-        db.close()
+async def list_runs(db: AsyncSession = Depends(get_session)):
+    q = (await db.execute(select(Run).order_by(Run.id.desc()).limit(100))).scalars().all()
+    return [_run_dict(r) for r in q]
 
 @app.get("/runs/{run_id}")
-def get_run(run_id: int):
-    init_db()
-    db = SessionLocal()
+async def get_run(run_id: int, db: AsyncSession = Depends(get_session)):
+    r = await db.get(Run, run_id)
+    if not r: raise HTTPException(404, "Run not found")
+    return _run_dict(r)
+
+# Resume/cancel — sync, как и /parse/start: записи идут через db.run_write
+@app.post("/runs/{run_id}/resume")
+def resume_run(run_id: int, background: BackgroundTasks):
+    """Продолжить запуск: готовые шаги (ok) не повторяются. 409 — запуск ещё жив (есть свежий heartbeat)."""
     try:
-        r = db.query(Run).get(run_id)
-        if not r: raise HTTPException(404, "Run not found")
-        return {
-            "id": r.id, "region": r.region, "status": r.status,
-            "started_at": r.started_at.isoformat() if r.started_at else None,
-            "finished_at": r.finished_at.isoformat() if r.finished_at else None,
-            "found": r.found, "processed": r.processed, "ok": r.ok, "errors": r.errors
-        }
-    finally:
-        db.close()
+        previous = control.request_resume(run_id)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    if previous is None:
+        raise HTTPException(404, "Run not found")
+    if os.getenv("LOCAL_SINGLEEXE") == "1":
+        background.add_task(resume_parser, run_id)
+        return {"status": "queued", "mode": "local", "run_id": run_id, "previous_status": previous}
+    task = resume_parser(run_id)
+    return {"status": "queued", "mode": "celery", "run_id": run_id, "previous_status": previous, "task": task}
 
-@app.get("/runs/{run_id}/steps")
-def get_steps(run_id: int):
-    init_db()
-    db = SessionLocal()
+@app.post("/runs/{run_id}/cancel")
+def cancel_run(run_id: int):
+    """Кооперативная отмена: текущие шаги доделываются, новые не начинаются."""
     try:
-        steps = db.query(Step).filter(Step.run_id==run_id).order_by(Step.id.asc()).all()
-        return [{
-            "id": s.id, "stage": s.stage, "status": s.status,
-            "created_at": s.created_at.isoformat() if s.created_at else None,
-            "finished_at": s.finished_at.isoformat() if s.finished_at else None,
-            "has_payload": bool(s.payload)
-        } for s in steps]
-    finally:
-        db.close()
+        status = control.request_cancel(run_id)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    if status is None:
+        raise HTTPException(404, "Run not found")
+    return {"run_id": run_id, "status": status}
+
+@app.get("/runs/{run_id}/steps")
+async def get_steps(run_id: int, db: AsyncSession = Depends(get_session)):
+    steps = (await db.execute(
+        select(Step).options(defer(Step.spans)).where(Step.run_id==run_id).order_by(Step.id.asc())
+    )).scalars().all()
+    return [{
+        "id": s.id, "stage": s.stage, "status": s.status,
+        "created_at": s.created_at.isoformat() if s.created_at else None,
+        "finished_at": s.finished_at.isoformat() if s.finished_at else None,
+        "has_payload": bool(s.payload)
+    } for s in steps]
+
+def _epoch(dt: datetime.datetime | None) -> float | None:
+    # created_at/finished_at пишутся как naive UTC (datetime.utcnow)
+    return dt.replace(tzinfo=datetime.timezone.utc).timestamp() if dt else None
+
+def _span_rows(spans: list[dict], t0: float) -> list[dict]:
+    depth: dict[int, int] = {}
+    rows = []
+    for sp in sorted(spans or [], key=lambda x: x["start"]):
+        depth[sp["id"]] = depth.get(sp.get("parent"), -1) + 1
+        rows.append({"name": sp["name"], "start_ms": round((sp["start"] - t0) * 1000, 1),
+                     "duration_ms": sp.get("duration_ms"), "depth": depth[sp["id"]], "attrs": sp.get("attrs") or {}})
+    return rows
+
+@app.get("/runs/{run_id}/timeline")
+async def get_timeline(run_id: int, db: AsyncSession = Depends(get_session)):
+    """Шаги запуска и их спаны на общей шкале (мс от начала запуска) — для Гантта в админке."""
+    r = await db.get(Run, run_id)
+    if not r: raise HTTPException(404, "Run not found")
+    steps = (await db.execute(
+        select(Step).options(defer(Step.payload)).where(Step.run_id==run_id).order_by(Step.id.asc())
+    )).scalars().all()
+    t0 = _epoch(r.started_at) or min((_epoch(s.created_at) for s in steps if s.created_at), default=0.0)
+    end = _epoch(r.finished_at) or max((_epoch(s.finished_at) for s in steps if s.finished_at), default=t0)
+    rows, by_stage = [], {}
+    for s in steps:
+        start, fin = _epoch(s.created_at), _epoch(s.finished_at)
+        duration = round((fin - start) * 1000, 1) if start and fin else None
+        if duration is not None:
+            by_stage[s.stage] = round(by_stage.get(s.stage, 0.0) + duration, 1)
+        rows.append({
+            "id": s.id, "stage": s.stage, "status": s.status, "source_id": s.source_id,
+            "start_ms": round((start - t0) * 1000, 1) if start else None,
+            "duration_ms": duration, "llm_tokens": s.llm_tokens,
+            "spans": _span_rows(s.spans, t0),
+        })
+    return {
+        "run_id": r.id,
+        "started_at": r.started_at.isoformat() if r.started_at else None,
+        "total_ms": round((end - t0) * 1000, 1),
+        "steps": rows,
+        "by_stage": by_stage,
+    }
 
 @app.get("/runs/{run_id}/steps/{step_id}")
-def get_step(run_id: int, step_id: int):
-    init_db()
-    db = SessionLocal()
-    try:
-        s = db.query(Step).filter(Step.run_id==run_id, Step.id==step_id).first()
-        if not s: raise HTTPException(404, "Step not found")
-        return {
-            "id": s.id, "stage": s.stage, "status": s.status,
-            "created_at": s.created_at.isoformat() if s.created_at else None,
-            "finished_at": s.finished_at.isoformat() if s.finished_at else None,
-            "payload": s.payload
-        }
-    finally:
-        db.close()
+async def get_step(run_id: int, step_id: int, db: AsyncSession = Depends(get_session)):
+    s = await _get_step(db, run_id, step_id)
+    if not s: raise HTTPException(404, "Step not found")
+    return {
+        "id": s.id, "stage": s.stage, "status": s.status,
+        "created_at": s.created_at.isoformat() if s.created_at else None,
+        "finished_at": s.finished_at.isoformat() if s.finished_at else None,
+        "payload": s.payload
+    }
 
 @app.get("/runs/{run_id}/steps/{step_id}/download")
-def download_step(run_id: int, step_id: int, fmt: str = Query("json", enum=["json","txt"])):
-    init_db()
-    db = SessionLocal()
-    try:
-        s = db.query(Step).filter(Step.run_id==run_id, Step.id==step_id).first()
-        if not s or not s.payload: raise HTTPException(404, "No payload")
-        if fmt == "json":
-            return s.payload
-        else:
-            txt = json.dumps(s.payload, ensure_ascii=False, indent=2)
-            return Response(content=txt, media_type="text/plain")
-    finally:
-        db.close()
+async def download_step(run_id: int, step_id: int, fmt: str = Query("json", enum=["json","txt"]),
+                        db: AsyncSession = Depends(get_session)):
+    s = await _get_step(db, run_id, step_id)
+    if not s or not s.payload: raise HTTPException(404, "No payload")
+    if fmt == "json":
+        return s.payload
+    else:
+        txt = json.dumps(s.payload, ensure_ascii=False, indent=2)
+        return Response(content=txt, media_type="text/plain")
 
 # New: serve snapshot content (txt/html) for a step (expects FETCH payload with snapshot_id)
 @app.get("/runs/{run_id}/steps/{step_id}/snapshot")
-def get_snapshot_content(run_id: int, step_id: int, kind: str = Query("txt", enum=["txt","html"])):
-    init_db()
-    db = SessionLocal()
-    try:
-        s = db.query(Step).filter(Step.run_id==run_id, Step.id==step_id).first()
-        if not s or not s.payload or "snapshot_id" not in s.payload:
-            raise HTTPException(404, "Snapshot not found")
-        snap_id = s.payload["snapshot_id"]
-        snap = db.query(DBSnapshot).filter(DBSnapshot.id==snap_id).first()
-        if not snap: raise HTTPException(404, "Snapshot record missing")
-        path = snap.path_txt if kind=="txt" else snap.path_html
-        if not path or not os.path.exists(path): raise HTTPException(404, "Snapshot file missing")
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            data = f.read()
-        media = "text/plain" if kind=="txt" else "text/html"
-        return Response(content=data, media_type=media)
-    finally:
-        db.close()
+async def get_snapshot_content(run_id: int, step_id: int, kind: str = Query("txt", enum=["txt","html"]),
+                               db: AsyncSession = Depends(get_session)):
+    s = await _get_step(db, run_id, step_id)
+    if not s or not s.payload or "snapshot_id" not in s.payload:
+        raise HTTPException(404, "Snapshot not found")
+    snap = await db.get(DBSnapshot, s.payload["snapshot_id"])
+    if not snap: raise HTTPException(404, "Snapshot record missing")
+    path = snap.path_txt if kind=="txt" else snap.path_html
+    if not path or not os.path.exists(path): raise HTTPException(404, "Snapshot file missing")
+    if kind=="html" and snap.content_type and snap.content_type != "text/html":
+        # PDF/DOCX: отдаём исходный файл документа
+        return FileResponse(path, media_type=snap.content_type, filename=os.path.basename(path))
+    async with aiofiles.open(path, "r", encoding="utf-8", errors="ignore") as f:
+        data = await f.read()
+    media = "text/plain" if kind=="txt" else "text/html"
+    return Response(content=data, media_type=media)
 
 # New: list measures for a run (by SAVE steps)
 @app.get("/runs/{run_id}/measures")
-def get_run_measures(run_id: int):
-    init_db()
-    db = SessionLocal()
+async def get_run_measures(run_id: int, db: AsyncSession = Depends(get_session)):
+    payloads = (await db.execute(
+        select(Step.payload).where(Step.run_id==run_id, Step.stage=="SAVE", Step.status=="ok").order_by(Step.id.asc())
+    )).scalars().all()
+    ids = [p.get("msr_intlid") for p in payloads if p]
+    ids = [i for i in ids if i]
+    rows = (await db.execute(
+        select(Measure.msr_intlid, Measure.region_code, Measure.prglvl, Measure.segmnt, Measure.typeid)
+        .where(Measure.msr_intlid.in_(ids))
+    )).all() if ids else []
+    found = {r.msr_intlid: r for r in rows}
+    measures = [{"msr_intlid": mid, "region_code": found[mid].region_code, "prglvl": found[mid].prglvl,
+                 "segmnt": found[mid].segmnt, "typeid": found[mid].typeid} for mid in ids if mid in found]
+    return {"items": measures}
+
+# Search: объявлен до /measures/{msr_intlid}
+@app.get("/measures/search")
+async def search_measures(q: Optional[str] = None,
+                          region_code: Optional[str] = None, prglvl: Optional[str] = None,
+                          segmnt: Optional[str] = None, typeid: Optional[str] = None,
+                          limit: int = Query(20, ge=1, le=200), cursor: Optional[str] = None,
+                          facets: bool = True, db: AsyncSession = Depends(get_session)):
+    """Полнотекстовый поиск по карточкам и тексту источников + фасеты; следующая страница — ?cursor=next_cursor."""
+    filters = {"region_code": region_code, "prglvl": prglvl, "segmnt": segmnt, "typeid": typeid}
     try:
-        steps = db.query(Step).filter(Step.run_id==run_id, Step.stage=="SAVE", Step.status=="ok").all()
-        ids = [s.payload.get("msr_intlid") for s in steps if s.payload]
-        ids = [i for i in ids if i]
-        measures = []
-        for mid in ids:
-            m = db.query(Measure).filter(Measure.msr_intlid==mid).first()
-            if m:
-                measures.append({"msr_intlid": mid, "region_code": m.region_code, "prglvl": m.prglvl, "segmnt": m.segmnt, "typeid": m.typeid})
-        return {"items": measures}
-    finally:
-        db.close()
+        return await search_index.search(db, q, filters, limit=limit, cursor=cursor, facets=facets)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+# Bulk export: объявлен до /measures/{msr_intlid}, иначе "export" уйдёт в path-параметр
+@app.get("/measures/export")
+async def export_measures(request: Request,
+                          format: str = Query("ndjson", enum=list(export.FORMATS)),
+                          region_code: Optional[str] = None, prglvl: Optional[str] = None,
+                          segmnt: Optional[str] = None, typeid: Optional[str] = None,
+                          chkdat_from: Optional[datetime.datetime] = None,
+                          chkdat_to: Optional[datetime.datetime] = None):
+    """Потоковая выгрузка карточек; gzip — если клиент прислал Accept-Encoding: gzip (кроме parquet)."""
+    if format == "parquet" and export.pa is None:
+        raise HTTPException(400, "Parquet export requires pyarrow")
+    await init_async_db()
+    media, ext = export.FORMATS[format]
+    use_gzip = format != "parquet" and "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"Content-Disposition": f'attachment; filename="measures.{ext}"'}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    query = export.export_query(region_code, prglvl, segmnt, typeid, chkdat_from, chkdat_to)
+    return StreamingResponse(export.stream_export(query, format, gzip=use_gzip), media_type=media, headers=headers)
 
 # New: get measure card
 @app.get("/measures/{msr_intlid}")
-def get_measure(msr_intlid: str):
-    init_db()
-    db = SessionLocal()
-    try:
-        m = db.query(Measure).filter(Measure.msr_intlid==msr_intlid).first()
-        if not m: raise HTTPException(404, "Measure not found")
-        return {"msr_intlid": msr_intlid, "card": m.card}
-    finally:
-        db.close()
+async def get_measure(msr_intlid: str, db: AsyncSession = Depends(get_session)):
+    m = await db.get(Measure, msr_intlid)
+    if not m: raise HTTPException(404, "Measure not found")
+    return {"msr_intlid": msr_intlid, "card": m.card}
 
 # ---- PROMPTS API (unchanged) ----
 @app.get("/prompts", response_model=List[str])
@@ -15,3 +15,13 @@ def run_parser(region: str) -> Any:
         from apps.api.worker.app import run_parser as celery_run_parser
         task = celery_run_parser.delay(region)
         return {"status": "queued", "task_id": task.id}
+
+def resume_parser(run_id: int) -> Any:
+    """Продолжение запуска — тот же переключатель, что и run_parser"""
+    if os.getenv("LOCAL_SINGLEEXE"):
+        from apps.api.worker.local_impl import resume_run_local
+        return resume_run_local(run_id)
+    else:
+        from apps.api.worker.app import resume_run as celery_resume_run
+        task = celery_resume_run.delay(run_id)
+        return {"status": "queued", "task_id": task.id}
@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+from apps.api.main import app
+
+@pytest.fixture(scope="module")
+def client(sqlite_db):
+    with TestClient(app) as c:
+        yield c
+
+def _get(client, url):
+    resp = client.get(url)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+def bench_list_runs(benchmark, client, seeded_run):
+    assert benchmark(_get, client, "/runs")
+
+def bench_get_run(benchmark, client, seeded_run):
+    assert benchmark(_get, client, f"/runs/{seeded_run}")["id"] == seeded_run
+
+def bench_list_steps(benchmark, client, seeded_run):
+    assert len(benchmark(_get, client, f"/runs/{seeded_run}/steps")) > 60
+
+def bench_run_measures(benchmark, client, seeded_run):
+    assert len(benchmark(_get, client, f"/runs/{seeded_run}/measures")["items"]) == 6
+
+def bench_search_fulltext(benchmark, client, search_catalogue):
+    res = benchmark(_get, client, "/measures/search?q=субсидии на лизинг&segmnt=AGR&limit=20")
+    assert res["items"] and res["facets"]["segmnt"]
+
+def bench_search_browse_facets(benchmark, client, search_catalogue):
+    res = benchmark(_get, client, "/measures/search?region_code=78&limit=50")
+    assert len(res["items"]) == 50 and res["next_cursor"]
@@ -0,0 +1,25 @@
+import pytest
+from packages.scraper import clean
+
+SNAPSHOTS = ["mert_tatarstan_subsidy", "portal_news_list", "fund_loan_article"]
+
+@pytest.mark.parametrize("name", SNAPSHOTS)
+def bench_clean_html(benchmark, name, snapshots):
+    result = benchmark(clean.clean_html, snapshots[name])
+    assert result["text"]
+
+@pytest.mark.parametrize("name", SNAPSHOTS)
+def bench_extract_lxml(benchmark, name, snapshots):
+    text, _has_main = benchmark(clean.extract_lxml, snapshots[name])
+    assert text
+
+@pytest.mark.parametrize("name", SNAPSHOTS)
+def bench_extract_readability(benchmark, name, snapshots):
+    # На списочных страницах readability может вернуть пусто — это и есть повод для fast-path
+    benchmark(clean.extract_readability, snapshots[name])
+
+@pytest.mark.skipif(clean.HTMLParser is None, reason="selectolax не установлен")
+@pytest.mark.parametrize("name", SNAPSHOTS)
+def bench_extract_selectolax(benchmark, name, snapshots):
+    text, _has_main = benchmark(clean.extract_selectolax, snapshots[name])
+    assert text
@@ -0,0 +1,42 @@
+import random
+from packages.persistence.db import run_write, session_scope
+from packages.persistence.models import Measure
+from packages.persistence import dedup_index
+
+CATALOGUE = 2000
+
+def bench_dedup_signature(benchmark, source_text):
+    sig, n = benchmark(dedup_index.signature, source_text)
+    assert sig and n > dedup_index.DEDUP_MIN_WORDS
+
+def bench_dedup_signature_long(benchmark, source_text):
+    """Худший случай на горячем пути: длинный документ. Подпись строится по первым DEDUP_MAX_WORDS словам."""
+    words = source_text.split()
+    text_ = " ".join(words * (dedup_index.DEDUP_MAX_WORDS * 10 // len(words) + 1))
+    sig, n = benchmark(dedup_index.signature, text_)
+    assert sig and n <= dedup_index.DEDUP_MAX_WORDS
+
+def bench_dedup_lookup(benchmark, sqlite_db, source_text):
+    """Поиск почти-дубликата среди CATALOGUE сохранённых подписей (разных текстов)."""
+    words = source_text.split()
+    rnd = random.Random(7)
+    def write(db):
+        for i in range(CATALOGUE):
+            mid = f"92_REG_MSP_DEDUP_{i:05d}"
+            text_ = " ".join(rnd.sample(words, 300))  # тот же словарь, другие шинглы
+            sig, n = dedup_index.signature(text_)
+            db.merge(Measure(msr_intlid=mid, card={}, region_code="92", prglvl="REG", segmnt="MSP", typeid="DEDUP"))
+            dedup_index.add_signature(db, sig, n, msr_intlid=mid)
+        sig, n = dedup_index.signature(source_text)
+        db.merge(Measure(msr_intlid="92_REG_MSP_DEDUP_SRC", card={}, region_code="92", prglvl="REG",
+                         segmnt="MSP", typeid="DEDUP"))
+        dedup_index.add_signature(db, sig, n, msr_intlid="92_REG_MSP_DEDUP_SRC")
+    run_write(write)
+    copy_sig, _n = dedup_index.signature("Мой бизнес. " + source_text)
+
+    def lookup():
+        with session_scope() as db:
+            return dedup_index.find_duplicate(db, copy_sig)
+
+    match = benchmark(lookup)
+    assert match and match[0] == "92_REG_MSP_DEDUP_SRC"
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+from packages.persistence.db import session_scope
+from packages.persistence.models import Measure
+from packages.agents.id_builder import build_intlid
+from packages.pipeline.engine import recorder
+
+THREADS = 8
+PER_THREAD = 5
+
+def _allocate(e1: dict, e4: dict) -> str:
+    # Та же последовательность, что в stage_build_and_save
+    with recorder.measure_lock():
+        with session_scope() as db:
+            msr_intlid = build_intlid(e1, e4, db)
+        with session_scope() as db:
+            db.merge(Measure(msr_intlid=msr_intlid, card={}, region_code=e1["msr_geocde"],
+                             prglvl=e1["msr_prglvl"], segmnt=e4["msr_segmnt"], typeid=e4["msr_typeid"]))
+    return msr_intlid
+
+def bench_build_intlid_concurrent(benchmark, sqlite_db, stage_outputs):
+    e1 = stage_outputs["E1"]
+    rounds = iter(range(1000))
+
+    def allocate_batch():
+        e4 = {"msr_segmnt": "MSP", "msr_typeid": f"BENCH{next(rounds)}"}
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            ids = list(pool.map(lambda _i: _allocate(e1, e4), range(THREADS * PER_THREAD)))
+        assert len(set(ids)) == len(ids)
+        return ids
+
+    ids = benchmark.pedantic(allocate_batch, rounds=5, warmup_rounds=1)
+    assert sorted(ids)[-1].endswith(f"_{THREADS * PER_THREAD:03d}")
@@ -0,0 +1,15 @@
+import pytest
+from packages.agents.prompt_loader import render_prompt
+from packages.pipeline.engine import STAGE_MAP
+
+PROMPTS = [prompt for _stage, prompt in STAGE_MAP] + ["E8_ID_Build"]
+
+@pytest.mark.parametrize("name", PROMPTS)
+def bench_render_prompt(benchmark, name, source_text):
+    variables = {
+        "msr_geocde": "92", "msr_geonme": "Республика Татарстан", "msr_prglvl": "REG",
+        "msr_srclnk": "https://mert.tatarstan.ru/", "SOURCE_TEXT": source_text, "TODAY": "08.08.2025",
+        "msr_segmnt": "MSP", "msr_typeid": "SUBS",
+    }
+    result = benchmark(render_prompt, name, variables)
+    assert result["ok"], result["missing"]
@@ -0,0 +1,16 @@
+from packages.pipeline.engine import recorder, STAGE_MAP
+
+STAGES = ["FETCH", "CLEAN", "FILTER", "DEDUP"] + [stage for stage, _prompt in STAGE_MAP] + ["BUILD_ID", "SAVE"]
+
+def bench_record_source_steps(benchmark, recording_db, stage_outputs):
+    """Запись всех шагов одного источника + счётчики запуска (как в process_source)."""
+    run_id = recorder.start_run("92")
+    sid = recorder.source_for(f"https://bench.tatarstan.ru/{recording_db.dialect.name}/{run_id}", "92")
+
+    def record():
+        for stage in STAGES:
+            with recorder.step(run_id, stage, sid) as st:
+                st.finish("ok", stage_outputs.get(stage, {"chars": 10000}))
+        recorder.bump(run_id, processed=1, ok=1)
+
+    benchmark.pedantic(record, rounds=20, warmup_rounds=2)
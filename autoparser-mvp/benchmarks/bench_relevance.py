@@ -0,0 +1,16 @@
+from packages.agents import relevance
+
+def bench_relevance_classify(benchmark, source_text):
+    verdict = benchmark(relevance.classify, source_text)
+    assert verdict["relevant"]
+
+def bench_relevance_train(benchmark, snapshots):
+    from packages.scraper.clean import clean_html
+    texts = [clean_html(html)["text"] for html in snapshots.values()]
+    words = " ".join(texts).split()
+    # Синтетическая разметка: «меры» — куски про субсидии, «не меры» — те же куски без ключевых основ
+    pos = [" ".join(words[i:i + 300]) for i in range(0, len(words) - 300, 150)]
+    neg = [" ".join(w for w in text.split() if not w.lower().startswith(("субси", "заяв", "получ"))) for text in pos]
+    samples = [(t, 1) for t in pos] + [(t, 0) for t in neg]
+    model, metrics = benchmark.pedantic(relevance.train, args=(samples,), kwargs={"epochs": 10}, rounds=1)
+    assert model["weights"] and metrics["recall"] >= 0.9
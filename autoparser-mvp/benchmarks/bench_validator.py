@@ -0,0 +1,25 @@
+import pytest
+from packages.schemas.validator import validate_stage, stage_errors
+
+STAGES = ["E1", "E2", "E3", "E4", "E5", "E6", "E7"]
+
+@pytest.mark.parametrize("stage", STAGES)
+def bench_validate_stage(benchmark, stage, stage_outputs):
+    ok, err = benchmark(validate_stage, stage, stage_outputs[stage])
+    assert ok, err
+
+@pytest.mark.parametrize("stage", ["E1", "E3", "E6"])
+def bench_validate_stage_invalid(benchmark, stage, stage_outputs):
+    data = dict(stage_outputs[stage])
+    data.pop(next(iter(data)))
+    ok, _err = benchmark(validate_stage, stage, data)
+    assert not ok
+
+@pytest.mark.parametrize("stage", ["E1", "E6"])
+def bench_stage_errors(benchmark, stage, stage_outputs):
+    """Пути всех ошибок — вход для запроса исправления полей."""
+    data = dict(stage_outputs[stage])
+    data.pop(next(iter(data)))
+    data["unexpected"] = "x"
+    errors = benchmark(stage_errors, stage, data)
+    assert {e["extra"] for e in errors} == {True, False}
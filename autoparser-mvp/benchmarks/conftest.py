@@ -0,0 +1,106 @@
+"""
+Общие фикстуры бенчмарков. Всё офлайн: временная SQLite (или Postgres из
+BENCH_POSTGRES_URL), снапшоты и ответы этапов из benchmarks/fixtures.
+"""
+import os, sys, glob, json, tempfile
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+sys.path.insert(0, ROOT)
+
+# До импорта packages.persistence.db: бенчмарки никогда не пишут в рабочую БД
+_tmp = tempfile.mkdtemp(prefix="autoparser-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ["SNAP_DIR"] = os.path.join(_tmp, "snapshots")
+
+from packages.persistence import db as dbmod  # noqa: E402
+from packages.persistence.models import Measure  # noqa: E402
+
+@pytest.fixture(scope="session")
+def stage_outputs() -> dict:
+    with open(os.path.join(FIXTURES, "stage_outputs.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@pytest.fixture(scope="session")
+def snapshots() -> dict:
+    out = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "snapshots", "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            out[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return out
+
+@pytest.fixture(scope="session")
+def source_text(snapshots) -> str:
+    from packages.scraper.clean import clean_html
+    return clean_html(snapshots["mert_tatarstan_subsidy"])["text"]
+
+@pytest.fixture(scope="session")
+def sqlite_db():
+    dbmod.init_db()
+    return dbmod.engine
+
+@pytest.fixture(scope="session", params=["sqlite", "postgres"])
+def recording_db(request, sqlite_db):
+    """Привязывает SessionLocal к нужной БД на время бенчмарка."""
+    if request.param == "sqlite":
+        yield sqlite_db
+        return
+    url = os.getenv("BENCH_POSTGRES_URL")
+    if not url:
+        pytest.skip("BENCH_POSTGRES_URL не задан")
+    from sqlalchemy import create_engine
+    eng = create_engine(url, pool_pre_ping=True, future=True)
+    dbmod.Base.metadata.create_all(bind=eng)
+    dbmod.SessionLocal.configure(bind=eng)
+    try:
+        yield eng
+    finally:
+        dbmod.SessionLocal.configure(bind=dbmod.engine)
+        eng.dispose()
+
+@pytest.fixture(scope="session")
+def seeded_run(sqlite_db, stage_outputs) -> int:
+    """Запуск с 6 источниками и полным набором шагов — как после реального прогона."""
+    from packages.pipeline.engine import recorder, STAGE_MAP, finish_run
+    run_id = recorder.start_run("92")
+    recorder.update_run(run_id, found=6)
+    with recorder.step(run_id, "SEARCH") as st:
+        st.finish("ok", {"urls": [f"https://min{i}.tatarstan.ru/" for i in range(6)]})
+    for i in range(6):
+        sid = recorder.source_for(f"https://min{i}.tatarstan.ru/bench-{run_id}", "92")
+        for stage in ("FETCH", "CLEAN"):
+            with recorder.step(run_id, stage, sid) as st:
+                st.finish("ok", {"chars": 10000})
+        for stage, _prompt in STAGE_MAP:
+            with recorder.step(run_id, stage, sid) as st:
+                st.finish("ok", stage_outputs[stage])
+        msr_intlid = f"92_REG_MSP_BENCH{run_id}_{i + 1:03d}"
+        with dbmod.session_scope() as db:
+            card = {k: v for out in stage_outputs.values() for k, v in out.items()}
+            db.merge(Measure(msr_intlid=msr_intlid, card={**card, "msr_intlid": msr_intlid},
+                             region_code="92", prglvl="REG", segmnt="MSP", typeid="SUBS"))
+        for stage in ("BUILD_ID", "SAVE"):
+            with recorder.step(run_id, stage, sid) as st:
+                st.finish("ok", {"msr_intlid": msr_intlid})
+        recorder.bump(run_id, processed=1, ok=1)
+    finish_run(run_id)
+    return run_id
+
+SEARCH_TOPICS = ["оборудование", "лизинг", "экспорт", "туризм", "сельское хозяйство", "инновации"]
+
+@pytest.fixture(scope="session")
+def search_catalogue(sqlite_db, stage_outputs, source_text) -> int:
+    """2000 карточек в полнотекстовом индексе: разные регионы/сегменты/типы и темы."""
+    from packages.persistence.search_index import index_measure
+    card = {k: v for out in stage_outputs.values() for k, v in out.items()}
+    n = 2000
+    def write(db):
+        for i in range(n):
+            mid = f"{77 + i % 3}_REG_{('MSP', 'AGR')[i % 2]}_{('GRANT', 'LOAN', 'TAX')[i % 3]}_S{i:05d}"
+            c = {**card, "msr_intlid": mid, "msr_flname": f"Субсидия: {SEARCH_TOPICS[i % 6]} ({i})"}
+            db.merge(Measure(msr_intlid=mid, card=c, region_code=str(77 + i % 3), prglvl="REG",
+                             segmnt=("MSP", "AGR")[i % 2], typeid=("GRANT", "LOAN", "TAX")[i % 3]))
+            index_measure(db, mid, c, source_text)
+    dbmod.run_write(write)
+    return n
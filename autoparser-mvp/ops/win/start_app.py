@@ -1,4 +1,4 @@
-import os, sys, threading, time, webbrowser
+import os, sys, threading, time, webbrowser, multiprocessing
 import uvicorn
 
 # Force local-singleexe mode + headless Playwright
@@ -25,6 +25,8 @@ def run_server():
     uvicorn.run("apps.api.main:app", host="127.0.0.1", port=8000, reload=False, log_level="info")
 
 if __name__ == "__main__":
+    # Пул процессов скрапера (PDF/DOCX) в замороженном EXE
+    multiprocessing.freeze_support()
     t = threading.Thread(target=run_server, daemon=True)
     t.start()
     time.sleep(1.5)
@@ -3,6 +3,14 @@ from typing import Dict, Any
 from google import genai
 from google.genai import types
 from .prompt_loader import render_prompt
+from packages.observability.tracing import span
+from packages.schemas.validator import llm_schema
+
+# Схема этапа уходит в response_json_schema: модель сама держит типы/enum/обязательные поля
+GEMINI_RESPONSE_SCHEMA = os.getenv("GEMINI_RESPONSE_SCHEMA", "1") == "1"
+GEMINI_REPAIR_ATTEMPTS = int(os.getenv("GEMINI_REPAIR_ATTEMPTS", "2"))
+GEMINI_REPAIR_SOURCE_CHARS = int(os.getenv("GEMINI_REPAIR_SOURCE_CHARS", "20000"))
+REPAIR_PROMPT = "Repair_Fields"
 
 class GeminiClient:
     def __init__(self, api_key: str | None = None, model: str | None = None, vertexai: bool | None = None):
@@ -10,7 +18,11 @@ class GeminiClient:
         self.model = model or os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
         # If running against Vertex AI (Express mode), pass vertexai=True, else False for Developer API
         vtx_flag = vertexai if vertexai is not None else bool(os.getenv("GOOGLE_GENAI_USE_VERTEXAI"))
-        if api_key and not vtx_flag:
+        # GEMINI_BASE_URL: альтернативный endpoint (прокси, локальный fake-сервер для нагрузочных тестов)
+        base_url = os.getenv("GEMINI_BASE_URL")
+        if base_url and not vtx_flag:
+            self.client = genai.Client(api_key=api_key or "local", http_options=types.HttpOptions(base_url=base_url))
+        elif api_key and not vtx_flag:
             self.client = genai.Client(api_key=api_key)  # Developer API
         else:
             # Vertex AI uses ADC or env flags; if vertexai=True no api_key is needed here
@@ -20,17 +32,69 @@ class GeminiClient:
                 self.client = genai.Client(vertexai=vtx_flag)
 
     def run_stage(self, stage: str, prompt_name: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        return self.run_prompt(prompt_name, variables, llm_schema(stage), label=stage)
+
+    def run_prompt(self, prompt_name: str, variables: Dict[str, Any], schema: dict | None = None,
+                   label: str | None = None) -> Dict[str, Any]:
         # Render the Markdown prompt with variables
-        prompt = render_prompt(prompt_name, variables).get("rendered", "")
+        with span("prompt.render", prompt=prompt_name) as attrs:
+            prompt = render_prompt(prompt_name, variables).get("rendered", "")
+            attrs["chars"] = len(prompt)
+        text = self._generate(prompt, schema)
+        with span("llm.parse_json", chars=len(text)):
+            return self._parse_json(label or prompt_name, text)
+
+    def repair_stage(self, stage: str, data: Any, errors: list[dict], variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Исправить только поля с ошибками: запрос с путями ошибок и текущим результатом, ответ вливается в data.
+
+        Лишние поля удаляются без запроса; если не объект — запрашиваются все поля этапа.
+        """
+        schema = llm_schema(stage) or {}
+        data = dict(data) if isinstance(data, dict) else {}
+        for err in errors:
+            if err["extra"]:
+                data.pop(err["field"], None)
+        if any(err["field"] is None for err in errors):
+            fields = list(schema.get("properties", {}))
+        else:
+            fields = list(dict.fromkeys(err["field"] for err in errors if not err["extra"]))
+        if not fields:
+            return data
+        sub = llm_schema(stage, fields)
+        repair_vars = {
+            "STAGE": stage,
+            "STAGE_NUM": stage.lstrip("E"),
+            "FIELDS": fields,
+            "ERRORS": [err for err in errors if not err["extra"]],
+            "PARTIAL_JSON": json.dumps({k: v for k, v in data.items() if k not in fields}, ensure_ascii=False, indent=2),
+            "SCHEMA_JSON": json.dumps(sub, ensure_ascii=False),
+            "SOURCE_TEXT": (variables.get("SOURCE_TEXT") or "")[:GEMINI_REPAIR_SOURCE_CHARS],
+        }
+        with span("prompt.render", prompt=REPAIR_PROMPT) as attrs:
+            prompt = render_prompt(REPAIR_PROMPT, repair_vars).get("rendered", "")
+            attrs["chars"] = len(prompt)
+        text = self._generate(prompt, sub)
+        with span("llm.parse_json", chars=len(text)):
+            fixed = self._parse_json(stage, text)
+        if isinstance(fixed, dict):
+            data.update({k: v for k, v in fixed.items() if k in fields})
+        return data
+
+    def _generate(self, prompt: str, schema: dict | None = None) -> str:
         cfg = types.GenerateContentConfig(
             response_mime_type="application/json",  # ask Gemini for JSON
+            response_json_schema=schema if GEMINI_RESPONSE_SCHEMA else None,
             temperature=float(os.getenv("GEMINI_TEMPERATURE","0.1"))
         )
-        resp = self.client.models.generate_content(
-            model=self.model,
-            contents=prompt,
-            config=cfg
-        )
+        with span("llm.call", model=self.model) as attrs:
+            resp = self.client.models.generate_content(
+                model=self.model,
+                contents=prompt,
+                config=cfg
+            )
+            usage = getattr(resp, "usage_metadata", None)
+            if usage is not None and getattr(usage, "total_token_count", None):
+                attrs["tokens"] = usage.total_token_count
         # Prefer resp.text() quick accessor if present; fallback to candidates
         try:
             text = resp.text  # new SDK exposes property
@@ -43,6 +107,10 @@ class GeminiClient:
                 text = "".join(getattr(p, "text", "") for p in cand.content.parts)
             except Exception:
                 text = ""
+        return text
+
+    @staticmethod
+    def _parse_json(stage: str, text: str) -> Dict[str, Any]:
         # Try to parse JSON
         try:
             return json.loads(text)
@@ -2,8 +2,8 @@ from sqlalchemy import text
 
 def build_intlid(e1: dict, e4: dict, db_session) -> str:
     prefix = f"{e1['msr_geocde']}_{e1['msr_prglvl']}_{e4['msr_segmnt']}_{e4['msr_typeid']}"
-    # Query existing max seq for this prefix
-    sql = text("SELECT msr_intlid FROM measures WHERE msr_intlid LIKE :pref || '\\_%' ORDER BY msr_intlid DESC LIMIT 1")
+    # Query existing max seq for this prefix (ESCAPE явно: в SQLite у LIKE нет escape-символа по умолчанию)
+    sql = text("SELECT msr_intlid FROM measures WHERE msr_intlid LIKE :pref || '\\_%' ESCAPE '\\' ORDER BY msr_intlid DESC LIMIT 1")
     row = db_session.execute(sql, {"pref": prefix}).fetchone()
     if row and row[0]:
         try:
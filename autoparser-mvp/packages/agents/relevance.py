@@ -0,0 +1,179 @@
+"""
+Фильтр релевантности (этап FILTER после CLEAN): описывает ли страница меру поддержки.
+
+Поиск приносит новости, контакты и общие страницы порталов. Без фильтра каждая такая
+страница проходит загрузку и семь больших вызовов LLM, и только SAVE замечает, что
+E1/E4 пусты. Здесь решение принимает офлайн-модель: логистическая регрессия по основам
+слов (первые STEM букв) и меткам <date>/<phone>/<email>, признак — log(1 + частота).
+Веса лежат в relevance_weights.json; scripts/train_relevance.py переобучает их
+на сохранённых карточках и отброшенных источниках. Стартовые веса — ручной словарь
+ключевых слов: ленты новостей с теми же словами он пропускает, поэтому фильтр выключен
+по умолчанию (RELEVANCE_ENABLED=1 — после обучения на своей истории).
+
+Оценка ниже порога — источник отсеивается. С RELEVANCE_LLM=1 пограничный отказ
+(оценка не ниже RELEVANCE_LLM_FLOOR) подтверждает один вызов дешёвой модели:
+мера, потерянная фильтром, стоит дороже семи лишних вызовов.
+"""
+import os, re, json, math, random, threading, traceback
+from collections import Counter
+from functools import lru_cache
+from packages.observability.tracing import span
+
+RELEVANCE_ENABLED = os.getenv("RELEVANCE_ENABLED", "0") == "1"
+RELEVANCE_WEIGHTS = os.getenv("RELEVANCE_WEIGHTS") or os.path.join(os.path.dirname(__file__), "relevance_weights.json")
+RELEVANCE_THRESHOLD = os.getenv("RELEVANCE_THRESHOLD", "")  # пусто — порог из файла весов
+RELEVANCE_MAX_WORDS = int(os.getenv("RELEVANCE_MAX_WORDS", "3000"))  # оценка по началу текста
+RELEVANCE_LLM = os.getenv("RELEVANCE_LLM", "0") == "1"
+RELEVANCE_LLM_MODEL = os.getenv("RELEVANCE_LLM_MODEL", "gemini-2.5-flash-lite")
+RELEVANCE_LLM_FLOOR = float(os.getenv("RELEVANCE_LLM_FLOOR", "0.05"))  # ниже — отказ без LLM
+RELEVANCE_LLM_CHARS = int(os.getenv("RELEVANCE_LLM_CHARS", "6000"))
+RELEVANCE_PROMPT = "Relevance_Check"
+RELEVANCE_SCHEMA = {
+    "type": "object",
+    "properties": {"is_measure": {"type": "boolean"}, "reason": {"type": "string"}},
+    "required": ["is_measure", "reason"],
+}
+
+_MARKERS = [
+    ("<date>", re.compile(r"(?<!\d)\d{1,2}[./]\d{1,2}[./](?:\d{4}|\d{2})(?!\d)")),
+    ("<phone>", re.compile(r"(?:\+7|(?<!\d)8)[\s(-]*\d{3,4}[\s)-]*\d{2,3}[\s-]*\d{2}[\s-]*\d{2}(?!\d)")),
+    ("<email>", re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")),
+]
+_word = re.compile(r"[^\W\d_]{3,}", re.UNICODE)
+
+# ---- Features ----
+def features(text_: str, stem: int) -> dict[str, float]:
+    """Признаки текста: {основа или метка: log(1 + частота)}."""
+    text_ = (text_ or "").lower()
+    counts: Counter = Counter()
+    for name, pattern in _MARKERS:
+        text_, n = pattern.subn(" ", text_)
+        if n:
+            counts[name] = n
+    counts.update(w[:stem] for w in _word.findall(text_)[:RELEVANCE_MAX_WORDS])
+    return {k: math.log1p(v) for k, v in counts.items()}
+
+def _sigmoid(z: float) -> float:
+    return 1 / (1 + math.exp(-z)) if z >= 0 else math.exp(z) / (1 + math.exp(z))
+
+@lru_cache(maxsize=None)
+def load_model(path: str = RELEVANCE_WEIGHTS) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_model(model: dict, path: str = RELEVANCE_WEIGHTS) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False, indent=1, sort_keys=True)
+    load_model.cache_clear()
+
+def threshold(model: dict) -> float:
+    return float(RELEVANCE_THRESHOLD) if RELEVANCE_THRESHOLD else float(model["threshold"])
+
+def score(text_: str, model: dict | None = None) -> tuple[float, dict[str, float]]:
+    """(вероятность «мера поддержки», вклады признаков)."""
+    model = model or load_model()
+    weights = model["weights"]
+    contrib = {k: weights[k] * v for k, v in features(text_, model["stem"]).items() if k in weights}
+    return _sigmoid(model["bias"] + sum(contrib.values())), contrib
+
+def classify(text_: str, model: dict | None = None) -> dict:
+    """Решение офлайн-модели для payload шага: score, threshold, relevant, terms (главные вклады)."""
+    model = model or load_model()
+    p, contrib = score(text_, model)
+    top = sorted(contrib.items(), key=lambda kv: -abs(kv[1]))[:8]
+    cut = threshold(model)
+    return {"score": round(p, 4), "threshold": cut, "relevant": p >= cut,
+            "terms": {k: round(v, 2) for k, v in top}, "model": model.get("version")}
+
+# ---- LLM confirmation ----
+_client = None
+_client_lock = threading.Lock()
+
+def _llm():
+    global _client
+    from .gemini import GeminiClient
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient(model=RELEVANCE_LLM_MODEL)
+        return _client
+
+def confirm(text_: str, url: str) -> dict:
+    """Один вызов дешёвой модели: {"is_measure": bool, "reason": str}."""
+    variables = {"URL": url, "SOURCE_TEXT": (text_ or "")[:RELEVANCE_LLM_CHARS]}
+    return _llm().run_prompt(RELEVANCE_PROMPT, variables, RELEVANCE_SCHEMA)
+
+def judge(text_: str, url: str) -> dict:
+    """classify + подтверждение отказа LLM (RELEVANCE_LLM=1, оценка в серой зоне).
+
+    Ошибка LLM источник не отсеивает: пограничную страницу дешевле прогнать, чем потерять.
+    """
+    with span("relevance.score"):
+        verdict = classify(text_)
+    if verdict["relevant"] or not RELEVANCE_LLM or verdict["score"] < RELEVANCE_LLM_FLOOR:
+        return verdict
+    try:
+        with span("llm.relevance", model=RELEVANCE_LLM_MODEL):
+            answer = confirm(text_, url)
+        verdict["llm"] = {"is_measure": bool(answer.get("is_measure")), "reason": answer.get("reason")}
+        verdict["relevant"] = verdict["llm"]["is_measure"]
+    except Exception as e:
+        traceback.print_exc()
+        verdict.update(llm={"error": str(e) or type(e).__name__}, relevant=True)
+    return verdict
+
+# ---- Training ----
+def train(samples: list[tuple[str, int]], stem: int = 5, min_df: int = 3, max_features: int = 2000,
+          epochs: int = 30, lr: float = 0.2, l2: float = 1e-4, recall: float = 0.98, holdout: float = 0.2,
+          seed: int = 13) -> tuple[dict, dict]:
+    """Логистическая регрессия (SGD, L2, веса классов) по размеченным текстам (текст, 1 — мера / 0 — нет).
+
+    Порог подбирается на отложенной выборке: пропускает долю мер recall и отодвинут к ближайшей
+    «не мере» — ложный отказ теряет меру, ложный пропуск стоит лишь вызовов LLM. Затем модель
+    переобучается на всех данных. Возвращает (модель, метрики на отложенной выборке).
+    """
+    docs = [(features(t, stem), y) for t, y in samples]
+    df = Counter(k for x, _y in docs for k in x)
+    vocab = {k for k, n in df.most_common(max_features * 5) if n >= min_df}
+    docs = [({k: v for k, v in x.items() if k in vocab}, y) for x, y in docs]
+    rnd = random.Random(seed)
+    order = list(range(len(docs)))
+    rnd.shuffle(order)
+    cut = int(len(docs) * holdout)
+    test, fit_on = [docs[i] for i in order[:cut]], [docs[i] for i in order[cut:]]
+    if not {y for _x, y in test} >= {0, 1}:
+        test, fit_on = docs, docs  # мало данных: порог по обучающей выборке
+    bias, weights = _sgd(fit_on, epochs, lr, l2, rnd)
+    scored = sorted((_sigmoid(bias + sum(weights.get(k, 0.0) * v for k, v in x.items())), y) for x, y in test)
+    positives = [p for p, y in scored if y == 1]
+    thr = positives[int(len(positives) * (1 - recall))] if positives else 0.5
+    below = [p for p, y in scored if y == 0 and p < thr]
+    if below:
+        thr = (thr + max(below)) / 2  # запас в сторону мер: порог посередине до ближайшей «не меры»
+    kept = [y for p, y in scored if p >= thr]
+    metrics = {"samples": len(docs), "holdout": len(test), "threshold": round(thr, 4),
+               "recall": round(sum(kept) / max(1, len(positives)), 4),
+               "precision": round(sum(kept) / max(1, len(kept)), 4),
+               "filtered_share": round(1 - len(kept) / max(1, len(scored)), 4)}
+    bias, weights = _sgd(docs, epochs, lr, l2, rnd)
+    top = sorted(weights.items(), key=lambda kv: -abs(kv[1]))[:max_features]
+    model = {"version": f"trained-{len(docs)}", "stem": stem, "bias": round(bias, 4),
+             "threshold": round(thr, 4), "weights": {k: round(w, 4) for k, w in top if abs(w) >= 1e-3}}
+    return model, metrics
+
+def _sgd(docs: list[tuple[dict, int]], epochs: int, lr: float, l2: float, rnd: random.Random):
+    n_pos = sum(y for _x, y in docs) or 1
+    n_neg = (len(docs) - n_pos) or 1
+    class_w = {1: len(docs) / (2 * n_pos), 0: len(docs) / (2 * n_neg)}
+    bias, weights = 0.0, {}
+    docs = list(docs)
+    for epoch in range(epochs):
+        rnd.shuffle(docs)
+        step = lr / (1 + epoch)
+        for x, y in docs:
+            z = bias + sum(weights.get(k, 0.0) * v for k, v in x.items())
+            g = (_sigmoid(z) - y) * class_w[y]
+            bias -= step * g
+            for k, v in x.items():
+                w = weights.get(k, 0.0)
+                weights[k] = w - step * (g * v + l2 * w)  # L2 только по признакам документа (разреженно)
+    return bias, weights
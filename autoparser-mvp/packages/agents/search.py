@@ -1,7 +1,7 @@
 from duckduckgo_search import DDGS
 from urllib.parse import urlparse, urlunparse
 from typing import List
-import re
+import os, re
 
 OFFICIAL_PATTERNS = [
     r"\.gov\.ru$", r"\.gosuslugi\.ru$",
@@ -22,6 +22,10 @@ def canonicalize(url: str) -> str:
     return urlunparse((scheme, p.netloc.lower(), p.path, "", "", ""))
 
 def search_official_urls(region: str, max_results: int = 10) -> List[str]:
+    # SEARCH_STATIC_URLS: фиксированный список источников вместо поиска (офлайн-прогоны, нагрузочные тесты)
+    static = [u.strip() for u in os.getenv("SEARCH_STATIC_URLS", "").split(",") if u.strip()]
+    if static:
+        return static[:max_results]
     queries = [
         f"меры поддержки бизнес {region} официальный сайт",
         f"субсидии гранты {region} мой бизнес официальный сайт",
@@ -0,0 +1,86 @@
+"""
+Лёгкие tracing-спаны для таймлайна запуска.
+
+Спаны собираются в список текущего шага (contextvar, см. collect()) и
+сохраняются в Step.spans. При TRACING_OTEL=1 и установленном opentelemetry-api
+каждый спан дублируется в OpenTelemetry; если есть opentelemetry-sdk и
+задан OTEL_EXPORTER_OTLP_ENDPOINT — настраивается OTLP-экспортер.
+"""
+import os, time, itertools, threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+_spans: ContextVar[list | None] = ContextVar("trace_spans", default=None)
+_parent: ContextVar[int | None] = ContextVar("trace_parent", default=None)
+_ids = itertools.count(1)
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def _setup_otlp_exporter() -> None:
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "autoparser")}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+
+def _otel_tracer():
+    global _tracer
+    if otel_trace is None or os.getenv("TRACING_OTEL") != "1":
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            _setup_otlp_exporter()
+            _tracer = otel_trace.get_tracer("autoparser")
+        return _tracer
+
+@contextmanager
+def collect():
+    """Собирать спаны блока (и вложенных вызовов, включая asyncio.run) в список."""
+    spans: list[dict] = []
+    token, ptoken = _spans.set(spans), _parent.set(None)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+        _parent.reset(ptoken)
+
+def current_spans() -> list[dict] | None:
+    return _spans.get()
+
+@contextmanager
+def span(name: str, **attrs):
+    """Спан: yield — словарь атрибутов, его можно дополнять внутри блока."""
+    sink = _spans.get()
+    tracer = _otel_tracer()
+    record = {"id": next(_ids), "parent": _parent.get(), "name": name,
+              "start": round(time.time(), 4), "attrs": dict(attrs)}
+    ptoken = _parent.set(record["id"])
+    t0 = time.perf_counter()
+    with tracer.start_as_current_span(name) if tracer else nullcontext() as otel_span:
+        try:
+            yield record["attrs"]
+        except Exception as e:
+            record["attrs"]["error"] = type(e).__name__
+            raise
+        finally:
+            _parent.reset(ptoken)
+            record["duration_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            if otel_span is not None:
+                for k, v in record["attrs"].items():
+                    if isinstance(v, (str, bool, int, float)):
+                        otel_span.set_attribute(k, v)
+            if sink is not None:
+                sink.append(record)
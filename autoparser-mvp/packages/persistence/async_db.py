@@ -0,0 +1,59 @@
+"""
+Асинхронный доступ к БД для эндпоинтов API (asyncpg / aiosqlite).
+
+Модели общие с синхронным кодом конвейера (models.py); URL выводится из того же
+DATABASE_URL, что и в db.py. Запись по-прежнему делают воркеры через db.py,
+API в основном читает — отдельный пул не отнимает потоки у threadpool FastAPI.
+"""
+import os, asyncio
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from . import db as sync_db
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+API_DB_POOL_SIZE = int(os.getenv("API_DB_POOL_SIZE", "10"))
+API_DB_MAX_OVERFLOW = int(os.getenv("API_DB_MAX_OVERFLOW", "20"))
+API_DB_POOL_TIMEOUT = float(os.getenv("API_DB_POOL_TIMEOUT", "10"))
+API_DB_POOL_RECYCLE = int(os.getenv("API_DB_POOL_RECYCLE", "1800"))
+
+def async_database_url(url: str) -> str:
+    """postgresql+psycopg2://… -> postgresql+asyncpg://…, sqlite:///… -> sqlite+aiosqlite:///…"""
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend}")
+    return u.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+ASYNC_DB_URL = async_database_url(sync_db.DB_URL)
+
+_pool_args = {"pool_pre_ping": True}
+if not sync_db.IS_SQLITE:
+    _pool_args.update(pool_size=API_DB_POOL_SIZE, max_overflow=API_DB_MAX_OVERFLOW,
+                      pool_timeout=API_DB_POOL_TIMEOUT, pool_recycle=API_DB_POOL_RECYCLE)
+
+async_engine = create_async_engine(ASYNC_DB_URL, **_pool_args)
+
+if sync_db.IS_SQLITE:
+    # Тот же профиль, что и у синхронного движка: WAL, busy_timeout, mmap, кэш
+    event.listen(async_engine.sync_engine, "connect", sync_db.apply_sqlite_pragmas)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+async def init_async_db() -> None:
+    # create_all/ALTER — синхронно и один раз на процесс; из event loop — в потоке
+    if not sync_db._initialized:
+        await asyncio.to_thread(sync_db.init_db)
+
+async def get_session():
+    """FastAPI dependency: AsyncSession на запрос."""
+    await init_async_db()
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def dispose() -> None:
+    await async_engine.dispose()
@@ -1,7 +1,10 @@
 import os
 import platform
+import threading
+from concurrent.futures import Future
+from queue import Queue
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, literal, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from contextlib import contextmanager
 
@@ -51,11 +54,121 @@ engine = create_engine(
     future=True,
 )
 
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+# SQLite-профиль для single-exe: WAL (читатели не ждут писателя), короткий fsync,
+# ожидание блокировки вместо мгновенного "database is locked", mmap и кэш страниц.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # <0 — в КиБ: 64 МБ
+    "temp_store": "MEMORY",
+}
+
+def apply_sqlite_pragmas(dbapi_conn, _record=None):
+    cur = dbapi_conn.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cur.execute(f"PRAGMA {name}={value}")
+    finally:
+        cur.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
+_initialized = False
+_init_lock = threading.Lock()
+
 def init_db():
-    # Неблокирующий create_all для MVP; позже — alembic
-    Base.metadata.create_all(bind=engine)
+    # Неблокирующий create_all для MVP; позже — alembic. Один раз на процесс.
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        from . import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+        Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
+        _add_missing_indexes()
+        from . import search_index
+        search_index.ensure_schema()
+        _initialized = True
+
+def _add_missing_columns():
+    # create_all не меняет существующие таблицы: новые nullable-колонки добавляем сами
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing or not col.nullable:
+                    continue
+                ddl = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {ddl}{_default_clause(col)}'))
+
+def _default_clause(col) -> str:
+    # Без DEFAULT старые строки получат NULL, и счётчики (runs.filtered, runs.queued) не инкрементируются
+    if col.server_default is not None:
+        value = col.server_default.arg
+        if not isinstance(value, str):
+            return f" DEFAULT {value.compile(dialect=engine.dialect)}"
+    elif col.default is not None and col.default.is_scalar:
+        value = col.default.arg
+    else:
+        return ""  # callable-дефолты (datetime.utcnow) в DDL не выразить
+    return f" DEFAULT {literal(value, col.type).compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})}"
+
+def _add_missing_indexes():
+    # То же для индексов, объявленных в моделях после создания таблиц
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+# ---- Single writer ----
+# SQLite допускает одного писателя на файл. Все записи процесса идут через одну
+# очередь и выполняются отдельным потоком по порядку; чтения (API, отчёты) — параллельно.
+# Для Postgres run_write выполняет fn сразу в вызывающем потоке.
+SQLITE_SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "1") == "1"
+
+class _Writer(threading.Thread):
+    def __init__(self):
+        super().__init__(name="sqlite-writer", daemon=True)
+        self.queue: Queue = Queue()
+
+    def run(self):
+        while True:
+            fn, fut = self.queue.get()
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                with session_scope() as session:
+                    result = fn(session)
+                fut.set_result(result)
+            except BaseException as e:
+                fut.set_exception(e)
+
+_writer: _Writer | None = None
+_writer_lock = threading.Lock()
+
+def _get_writer() -> _Writer:
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = _Writer()
+            _writer.start()
+        return _writer
+
+def run_write(fn):
+    """Выполнить fn(session) в транзакции на запись и вернуть результат (исключения пробрасываются)."""
+    if not (IS_SQLITE and SQLITE_SINGLE_WRITER) or threading.current_thread() is _writer:
+        with session_scope() as session:
+            return fn(session)
+    fut: Future = Future()
+    _get_writer().queue.put((fn, fut))
+    return fut.result()
 
 # Контекстный помощник
 @contextmanager
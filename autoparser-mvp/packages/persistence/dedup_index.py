@@ -0,0 +1,125 @@
+"""
+Поиск почти-дубликатов источников: MinHash очищенного текста + LSH по полосам.
+
+Одна и та же мера публикуется на сайте министерства, портале «Мой бизнес» и сайте
+фонда. Копия, похожая на уже извлечённый текст (оценка Жаккара по MinHash не ниже
+DEDUP_THRESHOLD), не проходит E1..E7: её URL дописывается в provenance.source_urls
+существующей карточки.
+
+Подписи и полосы хранятся в БД (text_signatures, lsh_buckets), поэтому дубликаты
+находятся и между запусками, и между воркерами. Хэши — crc32 и фиксированные
+перестановки: hash() в Python солится на процесс и для хранения не годится.
+"""
+import os, re, random, zlib, functools
+from datetime import datetime
+from sqlalchemy import select, update, tuple_
+from .models import TextSignature, LshBucket, Measure
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "50"))  # короче — подпись ненадёжна, не сравниваем
+DEDUP_MAX_WORDS = int(os.getenv("DEDUP_MAX_WORDS", "5000"))  # подпись по началу текста: ~0.15 с вместо секунд на длинных PDF
+DEDUP_MAX_CANDIDATES = int(os.getenv("DEDUP_MAX_CANDIDATES", "200"))
+
+# Параметры подписи общие для всех сохранённых записей — не выносим в env
+SHINGLE = 5            # слов в шингле
+NUM_PERM = 128
+BANDS, ROWS = 32, 4    # кандидат при сходстве примерно от (1/32)^(1/4) ≈ 0.42, решает DEDUP_THRESHOLD
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_word = re.compile(r"\w+", re.UNICODE)
+
+# ---- Signature ----
+def shingles(text_: str) -> set[int]:
+    words = _word.findall((text_ or "").lower())[:DEDUP_MAX_WORDS]
+    if len(words) < DEDUP_MIN_WORDS:
+        return set()
+    return {zlib.crc32(" ".join(words[i:i + SHINGLE]).encode("utf-8"))
+            for i in range(len(words) - SHINGLE + 1)}
+
+def minhash(hashes: set[int]) -> list[int] | None:
+    if not hashes:
+        return None
+    hashes = list(hashes)
+    return [min([(a * h + b) % _PRIME for h in hashes]) for a, b in _PERMS]
+
+def signature(text_: str) -> tuple[list[int] | None, int]:
+    """(MinHash, число шинглов); None — текст слишком короткий для сравнения."""
+    hashes = shingles(text_)
+    return minhash(hashes), len(hashes)
+
+def similarity(a: list[int], b: list[int]) -> float:
+    """Оценка коэффициента Жаккара по двум подписям."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+def band_keys(sig: list[int]) -> list[tuple[int, int]]:
+    return [(i, zlib.crc32(",".join(map(str, sig[i * ROWS:(i + 1) * ROWS])).encode()))
+            for i in range(BANDS)]
+
+# ---- Index ----
+def find_duplicate(session, sig: list[int] | None) -> tuple[str, int, float] | None:
+    """Лучшая сохранённая карточка с похожим текстом: (msr_intlid, signature_id, сходство) или None."""
+    if not sig:
+        return None
+    candidates = select(LshBucket.signature_id).where(tuple_(LshBucket.band, LshBucket.bucket).in_(band_keys(sig)))
+    rows = session.execute(
+        select(TextSignature.id, TextSignature.msr_intlid, TextSignature.minhash)
+        .join(Measure, Measure.msr_intlid == TextSignature.msr_intlid)
+        .where(TextSignature.id.in_(candidates))
+        .order_by(TextSignature.id.desc()).limit(DEDUP_MAX_CANDIDATES)
+    ).all()
+    best = None
+    for sig_id, mid, other in rows:
+        sim = similarity(sig, other)
+        if sim >= DEDUP_THRESHOLD and (best is None or sim > best[2]):
+            best = (mid, sig_id, sim)
+    return best
+
+def add_signature(session, sig: list[int], n_shingles: int, source_id: int | None = None,
+                  snapshot_id: int | None = None, msr_intlid: str | None = None) -> int:
+    row = TextSignature(source_id=source_id, snapshot_id=snapshot_id, msr_intlid=msr_intlid,
+                        minhash=sig, shingles=n_shingles, created_at=datetime.utcnow())
+    session.add(row); session.flush()
+    session.add_all(LshBucket(band=band, bucket=bucket, signature_id=row.id) for band, bucket in band_keys(sig))
+    return row.id
+
+def link_signature(session, signature_id: int, msr_intlid: str) -> None:
+    session.execute(update(TextSignature).where(TextSignature.id == signature_id).values(msr_intlid=msr_intlid))
+
+def attach_source(session, msr_intlid: str, url: str) -> bool:
+    """Дописать url в provenance.source_urls карточки. False — url там уже был."""
+    m = session.get(Measure, msr_intlid)
+    card = dict(m.card or {})
+    prov = dict(card.get("provenance") or {})
+    urls = list(prov.get("source_urls") or [])
+    m.chkdat = datetime.utcnow()
+    if url in urls:
+        return False
+    prov["source_urls"] = urls + [url]
+    card["provenance"] = prov
+    m.card = card  # новый dict: JSON-колонка не отслеживает изменения на месте
+    return True
+
+def backfill() -> int:
+    """Подписи для карточек, сохранённых до появления DEDUP (по снапшоту их SAVE). Возвращает число добавленных."""
+    from . import db as sync_db, search_index
+    with sync_db.SessionLocal() as reader:
+        ids = reader.execute(select(Measure.msr_intlid)
+                             .where(~Measure.msr_intlid.in_(select(TextSignature.msr_intlid)
+                                                            .where(TextSignature.msr_intlid.is_not(None))))
+                             .order_by(Measure.msr_intlid)).scalars().all()
+        saved = search_index.saved_snapshots(reader)
+        sources = {mid: saved.get(mid) for mid in ids}
+    n = 0
+    for mid, row in sources.items():
+        if not row or not row[2] or not os.path.exists(row[2]):
+            continue
+        with open(row[2], "r", encoding="utf-8", errors="ignore") as f:
+            sig, count = signature(f.read())
+        if sig:
+            sync_db.run_write(functools.partial(add_signature, sig=sig, n_shingles=count, source_id=row[0],
+                                                snapshot_id=row[1], msr_intlid=mid))
+            n += 1
+    return n
@@ -0,0 +1,195 @@
+"""
+Потоковая выгрузка карточек мер: NDJSON / CSV / Parquet.
+
+Строки читаются серверным курсором порциями по EXPORT_BATCH (yield_per) и сразу
+уходят клиенту — весь результат в памяти не собирается. Для CSV и Parquet
+карточка раскладывается в плоские колонки по JSON-схемам E1..E7:
+вложенные объекты — `поле.подполе`, массивы — JSON-строкой.
+"""
+import os, io, csv, json, zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import AsyncIterator, Iterable
+from sqlalchemy import select, Row
+from packages.schemas.validator import SCHEMAS_DIR
+from .models import Measure
+from .async_db import AsyncSessionLocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # опционально: pip install pyarrow
+    pa = pq = None
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "1000"))
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+BASE_COLUMNS = ["msr_intlid", "region_code", "prglvl", "segmnt", "typeid", "chkdat"]
+STAGE_SCHEMAS = [f"e{i}.json" for i in range(1, 8)]
+
+def _resolve(prop: dict, schema: dict) -> dict:
+    ref = prop.get("$ref")
+    if ref and ref.startswith("#/"):
+        node = schema
+        for part in ref[2:].split("/"):
+            node = node[part]
+        return node
+    return prop
+
+def _schema(name: str) -> dict:
+    with open(os.path.join(SCHEMAS_DIR, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@lru_cache(maxsize=1)
+def card_columns() -> tuple[str, ...]:
+    """Плоские колонки карточки в порядке E1..E7 (без дублей с BASE_COLUMNS)."""
+    cols: list[str] = []
+    for name in STAGE_SCHEMAS:
+        schema = _schema(name)
+        for key, prop in schema.get("properties", {}).items():
+            prop = _resolve(prop, schema)
+            if prop.get("type") == "object" and prop.get("properties"):
+                cols.extend(f"{key}.{sub}" for sub in prop["properties"])
+            else:
+                cols.append(key)
+    cols.append("provenance.source_urls")
+    return tuple(c for c in dict.fromkeys(cols) if c not in BASE_COLUMNS)
+
+def columns() -> list[str]:
+    return BASE_COLUMNS + list(card_columns())
+
+def _scalar(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+def flatten_card(card: dict | None) -> dict:
+    card = card or {}
+    row = {}
+    for col in card_columns():
+        head, _, sub = col.partition(".")
+        value = card.get(head)
+        if sub:
+            value = value.get(sub) if isinstance(value, dict) else None
+        row[col] = _scalar(value)
+    return row
+
+def export_query(region_code: str | None = None, prglvl: str | None = None, segmnt: str | None = None,
+                 typeid: str | None = None, chkdat_from: datetime | None = None, chkdat_to: datetime | None = None):
+    # Колонки, а не сущности: строки не попадают в identity map сессии
+    q = select(Measure.msr_intlid, Measure.region_code, Measure.prglvl, Measure.segmnt,
+               Measure.typeid, Measure.chkdat, Measure.card)
+    for col, value in ((Measure.region_code, region_code), (Measure.prglvl, prglvl),
+                       (Measure.segmnt, segmnt), (Measure.typeid, typeid)):
+        if value:
+            q = q.where(col == value)
+    if chkdat_from:
+        q = q.where(Measure.chkdat >= chkdat_from)
+    if chkdat_to:
+        q = q.where(Measure.chkdat < chkdat_to)
+    return q.order_by(Measure.msr_intlid).execution_options(yield_per=EXPORT_BATCH)
+
+async def iter_batches(query) -> AsyncIterator[list[Row]]:
+    # Своя сессия: генератор живёт дольше обработчика запроса (StreamingResponse)
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query)
+        async for batch in result.partitions():
+            yield batch
+
+def _base(m: Row) -> dict:
+    return {"msr_intlid": m.msr_intlid, "region_code": m.region_code, "prglvl": m.prglvl,
+            "segmnt": m.segmnt, "typeid": m.typeid, "chkdat": m.chkdat.isoformat() if m.chkdat else None}
+
+# ---- Encoders: порция строк -> bytes ----
+def encode_ndjson(batch: Iterable[Row]) -> bytes:
+    return "".join(json.dumps({**_base(m), "card": m.card}, ensure_ascii=False) + "\n" for m in batch).encode("utf-8")
+
+class CsvEncoder:
+    def __init__(self):
+        self.buf = io.StringIO()
+        self.writer = csv.DictWriter(self.buf, fieldnames=columns())
+        self.header = True
+
+    def __call__(self, batch: Iterable[Row]) -> bytes:
+        if self.header:
+            # BOM — чтобы Excel открыл кириллицу без мастера импорта
+            self.buf.write("\ufeff")
+            self.writer.writeheader()
+            self.header = False
+        for m in batch:
+            self.writer.writerow({**_base(m), **flatten_card(m.card)})
+        data = self.buf.getvalue().encode("utf-8")
+        self.buf.seek(0); self.buf.truncate()
+        return data
+
+    def close(self) -> bytes:
+        # Пустая выборка — всё равно отдаём заголовок
+        return self([]) if self.header else b""
+
+class _Sink(io.RawIOBase):
+    """Файл для ParquetWriter: копит записанное до следующего drain()."""
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        self.chunks.append(bytes(b))
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+class ParquetEncoder:
+    """Каждая порция — отдельная row group; футер дописывается в close()."""
+    def __init__(self):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        self.schema = pa.schema([(c, pa.timestamp("us") if c == "chkdat" else pa.string()) for c in columns()])
+        self.sink = _Sink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def __call__(self, batch: Iterable[Row]) -> bytes:
+        rows = [{**_base(m), **flatten_card(m.card), "chkdat": m.chkdat} for m in batch]
+        self.writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+def make_encoder(fmt: str):
+    if fmt == "ndjson":
+        return encode_ndjson
+    if fmt == "csv":
+        return CsvEncoder()
+    if fmt == "parquet":
+        return ParquetEncoder()
+    raise ValueError(f"Unknown format {fmt}")
+
+async def stream_export(query, fmt: str, gzip: bool = False) -> AsyncIterator[bytes]:
+    encoder = make_encoder(fmt)
+    z = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None  # wbits=31 — gzip-контейнер
+    async for batch in iter_batches(query):
+        data = encoder(batch)
+        if z is not None:
+            data = z.compress(data)
+        if data:
+            yield data
+    tail = encoder.close() if hasattr(encoder, "close") else b""
+    if z is not None:
+        tail = z.compress(tail) + z.flush()
+    if tail:
+        yield tail
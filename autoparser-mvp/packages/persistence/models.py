@@ -1,8 +1,11 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import BigInteger, Text, JSON, DateTime, Integer, Boolean, ForeignKey
+from sqlalchemy import BigInteger, Text, JSON, DateTime, Integer, Boolean, ForeignKey, Index
 from datetime import datetime
 from .db import Base
 
+# SQLite автоинкрементирует только INTEGER PRIMARY KEY (rowid) — BIGINT там остаётся NULL
+BigIntPK = BigInteger().with_variant(Integer, "sqlite")
+
 class Measure(Base):
     __tablename__ = "measures"
     msr_intlid: Mapped[str] = mapped_column(Text, primary_key=True)
@@ -13,9 +16,16 @@ class Measure(Base):
     typeid: Mapped[str] = mapped_column(Text)
     chkdat: Mapped[datetime | None]
 
+    __table_args__ = (
+        # Фасеты и фильтры /measures/search и /measures/export
+        Index("ix_measures_facets", "region_code", "prglvl", "segmnt", "typeid"),
+        Index("ix_measures_segmnt_typeid", "segmnt", "typeid"),
+        Index("ix_measures_chkdat", "chkdat", "msr_intlid"),
+    )
+
 class Source(Base):
     __tablename__ = "sources"
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(BigIntPK, primary_key=True, autoincrement=True)
     url: Mapped[str] = mapped_column(Text, unique=True)
     domain: Mapped[str | None] = mapped_column(Text)
     is_official: Mapped[bool | None]
@@ -26,7 +36,7 @@ class Source(Base):
 
 class Snapshot(Base):
     __tablename__ = "snapshots"
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(BigIntPK, primary_key=True, autoincrement=True)
     source_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("sources.id", ondelete="CASCADE"))
     sha256: Mapped[str | None] = mapped_column(Text)
     stored_at: Mapped[datetime | None]
@@ -34,27 +44,54 @@ class Snapshot(Base):
     path_txt: Mapped[str | None] = mapped_column(Text)
     http_status: Mapped[int | None]
     charset: Mapped[str | None] = mapped_column(Text)
+    content_type: Mapped[str | None] = mapped_column(Text)  # text/html, application/pdf, ...
 
 class Run(Base):
     __tablename__ = "runs"
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(BigIntPK, primary_key=True, autoincrement=True)
     region: Mapped[str] = mapped_column(Text)
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime)
-    status: Mapped[str] = mapped_column(Text, default="queued")
+    status: Mapped[str] = mapped_column(Text, default="queued")  # queued/running/cancelling/done/error/cancelled/stale
     found: Mapped[int] = mapped_column(Integer, default=0)
     processed: Mapped[int] = mapped_column(Integer, default=0)
     ok: Mapped[int] = mapped_column(Integer, default=0)
     errors: Mapped[int] = mapped_column(Integer, default=0)
+    filtered: Mapped[int | None] = mapped_column(Integer, default=0)  # отсеяны на FILTER (не мера поддержки)
+    queued: Mapped[int | None] = mapped_column(Integer, default=0)  # источники в брокере, ещё не взятые воркером
+    # Живость и остановка: heartbeat_at обновляют процессы, работающие над запуском;
+    # cancel_requested проверяется на границе шагов (см. engine.StepRecorder.step)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime)
+    cancel_requested: Mapped[bool | None] = mapped_column(Boolean, default=False)
 
 class Step(Base):
     __tablename__ = "steps"
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(BigIntPK, primary_key=True, autoincrement=True)
     run_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("runs.id", ondelete="CASCADE"))
     source_id: Mapped[int | None] = mapped_column(BigInteger, ForeignKey("sources.id", ondelete="CASCADE"))
-    stage: Mapped[str] = mapped_column(Text)  # SEARCH/FETCH/CLEAN/E1..E7/BUILD_ID/SAVE
+    stage: Mapped[str] = mapped_column(Text)  # SEARCH/CRAWL/FETCH/CLEAN/FILTER/DEDUP/E1..E7/BUILD_ID/SAVE
     status: Mapped[str] = mapped_column(Text, default="queued")
     payload: Mapped[dict | None] = mapped_column(JSON)
     llm_tokens: Mapped[int | None] = mapped_column(Integer)
+    spans: Mapped[list | None] = mapped_column(JSON)  # tracing-спаны шага, см. packages/observability/tracing.py
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+class TextSignature(Base):
+    """MinHash очищенного текста источника; msr_intlid — карточка, к которой текст относится (после SAVE)."""
+    __tablename__ = "text_signatures"
+    id: Mapped[int] = mapped_column(BigIntPK, primary_key=True, autoincrement=True)
+    source_id: Mapped[int | None] = mapped_column(BigInteger, ForeignKey("sources.id", ondelete="CASCADE"))
+    snapshot_id: Mapped[int | None] = mapped_column(BigInteger)
+    msr_intlid: Mapped[str | None] = mapped_column(Text, index=True)
+    minhash: Mapped[list] = mapped_column(JSON)
+    shingles: Mapped[int | None] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class LshBucket(Base):
+    """LSH-индекс по полосам MinHash: совпадение хотя бы одной полосы — кандидат в дубликаты."""
+    __tablename__ = "lsh_buckets"
+    band: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    signature_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("text_signatures.id", ondelete="CASCADE"),
+                                              primary_key=True)
@@ -0,0 +1,270 @@
+"""
+Полнотекстовый индекс карточек мер и очищенного текста источников.
+
+Postgres: таблица measure_search с tsvector (конфигурация russian) и GIN-индексом;
+веса — название (A), поля карточки (B), текст источника (C).
+SQLite (single-exe): виртуальная таблица FTS5 measure_fts, ранжирование bm25.
+
+Индекс обновляется в той же транзакции, что и SAVE (index_measure);
+rebuild() переиндексирует всё — например, после переноса БД.
+Поиск — async (API): search() с фасетами и keyset-пагинацией.
+"""
+import os, re, json, base64, functools
+from sqlalchemy import text, inspect, bindparam
+from . import db as sync_db
+
+SEARCH_SOURCE_MAX_CHARS = int(os.getenv("SEARCH_SOURCE_MAX_CHARS", "100000"))  # tsvector — не больше 1 МБ
+FACETS = ("region_code", "prglvl", "segmnt", "typeid")
+SKIP_KEYS = {"msr_intlid", "provenance"}
+
+def _dialect() -> str:
+    return sync_db.engine.dialect.name
+
+# ---- Schema ----
+PG_DDL = [
+    """CREATE TABLE IF NOT EXISTS measure_search (
+        msr_intlid TEXT PRIMARY KEY REFERENCES measures(msr_intlid) ON DELETE CASCADE,
+        title TEXT,
+        body TEXT,
+        tsv TSVECTOR NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_measure_search_tsv ON measure_search USING GIN (tsv)",
+]
+# prefix — индексы префиксов (в символах) под запросы вида "лизин"* из fts5_query:
+# без них каждый префикс перебирает все термы индекса
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS measure_fts USING fts5(
+        msr_intlid UNINDEXED, title, body, source,
+        tokenize='unicode61 remove_diacritics 2', prefix='3 4 5 6 7 8'
+    )""",
+]
+
+def _table() -> str:
+    return "measure_search" if _dialect() == "postgresql" else "measure_fts"
+
+def ensure_schema() -> None:
+    """Создать таблицу индекса; если её не было, а карточки уже есть — проиндексировать их."""
+    ddl = PG_DDL if _dialect() == "postgresql" else SQLITE_DDL if _dialect() == "sqlite" else None
+    if ddl is None:
+        return
+    existed = inspect(sync_db.engine).has_table(_table())
+    with sync_db.engine.begin() as conn:
+        for stmt in ddl:
+            conn.execute(text(stmt))
+    if not existed:
+        rebuild()
+
+# ---- Indexing ----
+def card_text(card: dict) -> str:
+    """Все строковые значения карточки (кроме служебных) одной строкой."""
+    parts: list[str] = []
+    def walk(value):
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for v in value.values():
+                walk(v)
+        elif isinstance(value, list):
+            for v in value:
+                walk(v)
+    for key, value in (card or {}).items():
+        if key not in SKIP_KEYS:
+            walk(value)
+    return "\n".join(p for p in parts if p)
+
+def index_measure(session, msr_intlid: str, card: dict, source_text: str = "") -> None:
+    """Upsert записи индекса в текущей (пишущей) транзакции."""
+    title = (card or {}).get("msr_flname") or ""
+    body = card_text(card)
+    source = (source_text or "")[:SEARCH_SOURCE_MAX_CHARS]
+    params = {"id": msr_intlid, "title": title, "body": body, "source": source}
+    if _dialect() == "postgresql":
+        session.execute(text("""
+            INSERT INTO measure_search (msr_intlid, title, body, tsv)
+            VALUES (:id, :title, :body,
+                    setweight(to_tsvector('russian', :title), 'A') ||
+                    setweight(to_tsvector('russian', :body), 'B') ||
+                    setweight(to_tsvector('russian', :source), 'C'))
+            ON CONFLICT (msr_intlid) DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body, tsv = EXCLUDED.tsv
+        """), params)
+    elif _dialect() == "sqlite":
+        session.execute(text("DELETE FROM measure_fts WHERE msr_intlid = :id"), params)
+        session.execute(text("INSERT INTO measure_fts (msr_intlid, title, body, source) VALUES (:id, :title, :body, :source)"),
+                        params)
+
+def saved_snapshots(session) -> dict[str, tuple[int, int, str | None]]:
+    """{msr_intlid: (source_id, snapshot_id, path_txt)} — последний снапшот источника, из которого сохранена карточка.
+
+    Один проход по шагам SAVE (msr_intlid — из JSON payload) вместо LIKE-поиска по steps на каждую карточку.
+    """
+    from .models import Step, Snapshot
+    from sqlalchemy import select
+    mid = Step.payload["msr_intlid"].as_string()
+    rows = session.execute(select(mid, Snapshot.source_id, Snapshot.id, Snapshot.path_txt)
+                           .join(Snapshot, Snapshot.source_id == Step.source_id)
+                           .where(Step.stage == "SAVE", Step.status == "ok", Step.source_id.is_not(None))
+                           .order_by(Snapshot.id)).all()
+    return {m: (source_id, snapshot_id, path) for m, source_id, snapshot_id, path in rows if m}
+
+def _read_source(path: str | None) -> str:
+    if not path or not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read(SEARCH_SOURCE_MAX_CHARS)
+
+def rebuild(batch: int = 500) -> int:
+    """Переиндексировать все карточки. Возвращает их число."""
+    from .models import Measure
+    from sqlalchemy import select
+    n = 0
+    with sync_db.SessionLocal() as reader:
+        ids = reader.execute(select(Measure.msr_intlid).order_by(Measure.msr_intlid)).scalars().all()
+        paths = {mid: row[2] for mid, row in saved_snapshots(reader).items()}
+    for i in range(0, len(ids), batch):
+        n += sync_db.run_write(functools.partial(_reindex, ids=ids[i:i + batch], paths=paths))
+    return n
+
+def _reindex(session, ids: list[str], paths: dict[str, str | None]) -> int:
+    from .models import Measure
+    from sqlalchemy import select
+    rows = session.execute(select(Measure.msr_intlid, Measure.card).where(Measure.msr_intlid.in_(ids))).all()
+    for mid, card in rows:
+        index_measure(session, mid, card, _read_source(paths.get(mid)))
+    return len(rows)
+
+# ---- Search ----
+_token = re.compile(r"\w+", re.UNICODE)
+
+def _stem(word: str) -> str:
+    # У FTS5 нет русской морфологии: отрезаем окончание и ищем по префиксу
+    # («лизинга» -> «лизин*», «оборудования» -> «оборудован*»)
+    return word[:max(4, len(word) - 2)] if len(word) > 5 else word
+
+def fts5_query(q: str) -> str:
+    # Пользовательский ввод -> безопасный запрос FTS5: все слова, каждое как префикс.
+    # Предлоги и союзы («на», «и», «в») как префиксы совпадают почти со всем — пропускаем.
+    tokens = _token.findall(q.lower())
+    words = [t for t in tokens if len(t) > 2] or tokens
+    return " ".join(f'"{_stem(t)}"*' for t in words)
+
+def encode_cursor(rank: float | None, msr_intlid: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, msr_intlid]).encode()).decode()
+
+def decode_cursor(cursor: str | None) -> tuple[float | None, str | None]:
+    if not cursor:
+        return None, None
+    try:
+        rank, mid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return rank, mid
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _filters(filters: dict, params: dict, skip: str | None = None) -> str:
+    clauses = []
+    for name in FACETS:
+        if name != skip and filters.get(name):
+            clauses.append(f"m.{name} = :f_{name}")
+            params[f"f_{name}"] = filters[name]
+    return "".join(f" AND {c}" for c in clauses)
+
+def _match(q: str | None, params: dict) -> tuple[str, str, str]:
+    """(FROM/JOIN, WHERE, выражение ранга) для диалекта."""
+    if not q:
+        return "measures m", "1=1", "NULL"
+    if _dialect() == "postgresql":
+        params["q"] = q
+        return ("measure_search s JOIN measures m ON m.msr_intlid = s.msr_intlid",
+                "s.tsv @@ websearch_to_tsquery('russian', :q)",
+                "ts_rank_cd(s.tsv, websearch_to_tsquery('russian', :q))")
+    params["q"] = fts5_query(q)
+    # bm25 меньше — лучше; знак меняем, чтобы везде «больше — релевантнее».
+    # CROSS JOIN фиксирует порядок: сначала MATCH, потом measures по ключу; иначе с фильтром
+    # по фасету планировщик идёт от measures и выполняет MATCH на каждую строку
+    return ("measure_fts CROSS JOIN measures m ON m.msr_intlid = measure_fts.msr_intlid",
+            "measure_fts MATCH :q",
+            "-bm25(measure_fts, 0.0, 10.0, 3.0, 1.0)")
+
+async def _snippets(session, q: str, ids: list[str]) -> dict:
+    # Отдельным запросом и только для страницы: сниппет дорогой, в основном запросе
+    # он считался бы для каждого совпадения до сортировки и LIMIT. Берём его из полей
+    # карточки (body), как и в Postgres: текст источника большой и токенизируется заново
+    if _dialect() == "postgresql":
+        sql = text("""SELECT msr_intlid, ts_headline('russian', body, websearch_to_tsquery('russian', :q),
+                                                     'MaxWords=30, MinWords=10, StartSel=<b>, StopSel=</b>')
+                      FROM measure_search WHERE msr_intlid IN :ids""")
+        params = {"q": q, "ids": ids}
+    else:
+        sql = text("""SELECT msr_intlid, snippet(measure_fts, 2, '<b>', '</b>', '…', 16)
+                      FROM measure_fts WHERE measure_fts MATCH :q AND msr_intlid IN :ids""")
+        params = {"q": fts5_query(q), "ids": ids}
+    rows = await session.execute(sql.bindparams(bindparam("ids", expanding=True)), params)
+    return dict(rows.all())
+
+async def search(session, q: str | None = None, filters: dict | None = None, limit: int = 20,
+                 cursor: str | None = None, facets: bool = True) -> dict:
+    filters = filters or {}
+    q = (q or "").strip() or None
+    if q and _dialect() == "sqlite" and not fts5_query(q):
+        q = None
+    after_rank, after_id = decode_cursor(cursor)
+
+    params: dict = {"limit": limit + 1}
+    source, match, rank = _match(q, params)
+    where = match + _filters(filters, params)
+    inner = f"""SELECT m.msr_intlid, m.region_code, m.prglvl, m.segmnt, m.typeid, m.chkdat, {rank} AS rank
+                FROM {source} WHERE {where}"""
+    if q:
+        keyset, order = "(rank < :a_rank OR (rank = :a_rank AND msr_intlid > :a_id))", "rank DESC, msr_intlid"
+    else:
+        keyset, order = "msr_intlid > :a_id", "msr_intlid"
+    outer_where = ""
+    if after_id is not None:
+        outer_where = f"WHERE {keyset}"
+        params.update(a_rank=after_rank, a_id=after_id)
+    sql = f"SELECT * FROM ({inner}) hits {outer_where} ORDER BY {order} LIMIT :limit"
+    rows = (await session.execute(text(sql), params)).mappings().all()
+
+    items = [dict(r) for r in rows[:limit]]
+    for it in items:
+        if it["chkdat"] is not None and not isinstance(it["chkdat"], str):
+            it["chkdat"] = it["chkdat"].isoformat()
+    if items:
+        ids = [it["msr_intlid"] for it in items]
+        titles = await _titles(session, ids)
+        snippets = await _snippets(session, q, ids) if q else {}
+        for it in items:
+            it["title"] = titles.get(it["msr_intlid"])
+            it["snippet"] = snippets.get(it["msr_intlid"])
+    next_cursor = encode_cursor(items[-1]["rank"], items[-1]["msr_intlid"]) if len(rows) > limit else None
+
+    result = {"items": items, "next_cursor": next_cursor}
+    if facets:
+        result["facets"] = await facet_counts(session, q, filters)
+    return result
+
+async def _titles(session, ids: list[str]) -> dict:
+    from .models import Measure
+    from sqlalchemy import select
+    rows = (await session.execute(select(Measure.msr_intlid, Measure.card).where(Measure.msr_intlid.in_(ids)))).all()
+    return {mid: (card or {}).get("msr_flname") for mid, card in rows}
+
+async def facet_counts(session, q: str | None, filters: dict) -> dict:
+    """Для каждого фасета — счётчики значений с учётом остальных фильтров (кроме самого фасета)."""
+    # Один проход по совпадениям: группы по всем фасетам сразу (их комбинаций немного),
+    # а «все фильтры, кроме своего» применяем уже к группам — вместо запроса на каждый фасет
+    params: dict = {}
+    source, match, _rank = _match(q, params)
+    cols = ", ".join(f"m.{name}" for name in FACETS)
+    sql = f"SELECT {cols}, COUNT(*) AS n FROM {source} WHERE {match} GROUP BY {cols}"
+    groups = (await session.execute(text(sql), params)).all()
+    out = {}
+    for i, name in enumerate(FACETS):
+        counts: dict = {}
+        for row in groups:
+            if row[i] is None:
+                continue
+            if all(not filters.get(other) or row[j] == filters[other]
+                   for j, other in enumerate(FACETS) if other != name):
+                counts[str(row[i])] = counts.get(str(row[i]), 0) + row[-1]
+        out[name] = dict(sorted(counts.items(), key=lambda kv: -kv[1]))
+    return out
@@ -0,0 +1,159 @@
+"""
+Управление запусками: heartbeat, кооперативная отмена, продолжение.
+
+heartbeat — один поток на процесс раз в RUN_HEARTBEAT_SEC отмечает runs.heartbeat_at
+у запусков, над которыми в этом процессе идёт работа. Запуск в running/cancelling
+без отметки дольше RUN_STALE_SEC считается зависшим (воркер умер, процесс перезапущен).
+Пока у запуска есть источники в очереди брокера (runs.queued > 0), heartbeat'а может
+не быть просто потому, что задачи не начались, — для таких срок RUN_QUEUE_STALE_SEC.
+
+Отмена — флаг runs.cancel_requested; StepRecorder.step проверяет его перед каждым
+шагом и бросает RunCancelled: текущий вызов LLM доделывается, следующий не начинается.
+
+Продолжение — request_resume() переводит запуск обратно в running; сама работа —
+engine.resume_run(), которая восстанавливает источники по ok-шагам.
+"""
+import os, time, threading, traceback
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func, or_, and_
+from packages.persistence.db import session_scope, run_write
+from packages.persistence.models import Run
+
+RUN_HEARTBEAT_SEC = float(os.getenv("RUN_HEARTBEAT_SEC", "15"))
+RUN_STALE_SEC = float(os.getenv("RUN_STALE_SEC", "180"))
+RUN_QUEUE_STALE_SEC = float(os.getenv("RUN_QUEUE_STALE_SEC", "21600"))  # брокер мог потерять задачи
+RUN_CANCEL_CHECK_SEC = float(os.getenv("RUN_CANCEL_CHECK_SEC", "2"))
+ACTIVE_STATUSES = ("queued", "running", "cancelling")
+
+class RunCancelled(Exception):
+    """Запуск отменён (POST /runs/{id}/cancel)."""
+
+# ---- Heartbeat ----
+class _Heartbeat(threading.Thread):
+    def __init__(self):
+        super().__init__(name="run-heartbeat", daemon=True)
+        self.active: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def run(self):
+        while True:
+            time.sleep(RUN_HEARTBEAT_SEC)
+            with self.lock:
+                ids = [run_id for run_id, n in self.active.items() if n > 0]
+            if ids:
+                try:
+                    touch(ids)
+                except Exception:
+                    traceback.print_exc()
+
+_heartbeat: _Heartbeat | None = None
+_heartbeat_lock = threading.Lock()
+
+def _get_heartbeat() -> _Heartbeat:
+    global _heartbeat
+    with _heartbeat_lock:
+        if _heartbeat is None or not _heartbeat.is_alive():
+            _heartbeat = _Heartbeat()
+            _heartbeat.start()
+        return _heartbeat
+
+def touch(run_ids: list[int]) -> None:
+    run_write(lambda db: db.execute(update(Run).where(Run.id.in_(run_ids)).values(heartbeat_at=datetime.utcnow())))
+
+@contextmanager
+def heartbeat(run_id: int):
+    """Пока блок выполняется, запуск считается живым (вложенные/параллельные блоки — одна отметка)."""
+    hb = _get_heartbeat()
+    with hb.lock:
+        hb.active[run_id] += 1
+    touch([run_id])
+    try:
+        yield
+    finally:
+        with hb.lock:
+            hb.active[run_id] -= 1
+            if hb.active[run_id] <= 0:
+                del hb.active[run_id]
+
+def is_stale(run: Run, now: datetime | None = None) -> bool:
+    if run.status not in ACTIVE_STATUSES:
+        return False
+    seen = run.heartbeat_at or run.started_at
+    limit = RUN_QUEUE_STALE_SEC if (run.queued or 0) > 0 else RUN_STALE_SEC
+    return seen is not None and (now or datetime.utcnow()) - seen > timedelta(seconds=limit)
+
+def mark_stale_runs() -> int:
+    """running/cancelling без heartbeat дольше RUN_STALE_SEC (с задачами в очереди — RUN_QUEUE_STALE_SEC)
+    -> stale. Возвращает число таких запусков."""
+    now = datetime.utcnow()
+    seen = func.coalesce(Run.heartbeat_at, Run.started_at)
+    has_queue = func.coalesce(Run.queued, 0) > 0
+    stale = and_(Run.status.in_(ACTIVE_STATUSES),
+                 or_(and_(~has_queue, seen < now - timedelta(seconds=RUN_STALE_SEC)),
+                     and_(has_queue, seen < now - timedelta(seconds=RUN_QUEUE_STALE_SEC))))
+    return run_write(lambda db: db.execute(update(Run).where(stale).values(status="stale")).rowcount)
+
+# ---- Cancel ----
+_cancel_cache: dict[int, tuple[float, bool]] = {}
+_cancel_lock = threading.Lock()
+
+def is_cancelled(run_id: int) -> bool:
+    # Флаг читается не чаще раза в RUN_CANCEL_CHECK_SEC на запуск: шагов у запуска сотни
+    now = time.monotonic()
+    with _cancel_lock:
+        hit = _cancel_cache.get(run_id)
+    if hit and now - hit[0] < RUN_CANCEL_CHECK_SEC:
+        return hit[1]
+    with session_scope() as db:
+        flag = bool(db.execute(select(Run.cancel_requested).where(Run.id == run_id)).scalar())
+    with _cancel_lock:
+        _cancel_cache[run_id] = (now, flag)
+    return flag
+
+def check_cancelled(run_id: int) -> None:
+    if is_cancelled(run_id):
+        raise RunCancelled(f"Run {run_id} cancelled")
+
+def request_cancel(run_id: int) -> str | None:
+    """Поднять флаг отмены. Новый статус или None, если запуска нет; ValueError — запуск уже завершён."""
+    def write(db):
+        run = db.get(Run, run_id)
+        if run is None:
+            return None
+        if run.status == "done":
+            raise ValueError("Run is already finished")
+        run.cancel_requested = True
+        if run.status in ACTIVE_STATUSES and not is_stale(run):
+            run.status = "cancelling"  # воркеры остановятся на границе шагов, finish_run поставит cancelled
+        else:
+            run.status = "cancelled"
+            run.finished_at = run.finished_at or datetime.utcnow()
+        return run.status
+    status = run_write(write)
+    forget(run_id)
+    return status
+
+def forget(run_id: int) -> None:
+    with _cancel_lock:
+        _cancel_cache.pop(run_id, None)
+
+# ---- Resume ----
+def request_resume(run_id: int) -> str | None:
+    """Вернуть запуск в running перед продолжением. Прежний статус или None; ValueError — запуск ещё жив."""
+    def write(db):
+        run = db.get(Run, run_id)
+        if run is None:
+            return None
+        if run.status in ACTIVE_STATUSES and not is_stale(run):
+            raise ValueError("Run is still running")
+        previous = run.status
+        run.status = "running"
+        run.finished_at = None
+        run.cancel_requested = False
+        run.heartbeat_at = datetime.utcnow()
+        return previous
+    previous = run_write(write)
+    forget(run_id)
+    return previous
@@ -0,0 +1,540 @@
+"""
+Ядро конвейера: SEARCH → CRAWL → (по каждому источнику) FETCH → CLEAN → FILTER → DEDUP → E1..E7 → BUILD_ID → SAVE.
+
+Один код для обоих режимов запуска; как распределяются источники
+(последовательно, пул потоков, Celery) решает executor — см. executors.py.
+Все записи в БД — короткие транзакции через StepRecorder (на SQLite — через
+очередь единственного писателя, см. db.run_write), поэтому process_source
+безопасно вызывать параллельно из потоков и процессов.
+
+FILTER: офлайн-классификатор (agents/relevance.py) отсеивает страницы, не описывающие
+меру поддержки (новости, контакты, разделы порталов): шаг FILTER со статусом filtered
+и оценкой в payload, дальше источник не идёт.
+
+DEDUP: источник, текст которого почти совпадает с уже извлечённым (MinHash/LSH,
+см. persistence/dedup_index.py), не идёт в E1..E7 — его URL дописывается
+в provenance существующей карточки.
+
+Чекпоинты: результат каждого шага лежит в Step.payload, поэтому resume_run
+восстанавливает источник по его ok-шагам (restore_state) и делает только
+недостающее; отмена и heartbeat — см. control.py.
+"""
+import os, asyncio, threading, traceback, zlib
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import select, update, text, func
+from sqlalchemy.exc import IntegrityError
+from packages.persistence.db import engine, session_scope, run_write, init_db
+from packages.persistence.models import Run, Step, Source, Snapshot as DBSnapshot, Measure
+from packages.persistence.search_index import index_measure
+from packages.persistence import dedup_index
+from packages.agents.search import search_official_urls
+from packages.agents.gemini import GeminiClient, GEMINI_REPAIR_ATTEMPTS
+from packages.agents import relevance
+from packages.agents.id_builder import build_intlid
+from packages.schemas.validator import stage_errors
+from packages.scraper.fetch import fetch_and_snapshot, Snapshot
+from packages.scraper.crawl import discover_documents
+from packages.scraper.clean import clean_snapshot
+from packages.observability.tracing import span, collect
+from .control import RunCancelled, check_cancelled, heartbeat, forget as forget_cancel
+
+STAGE_MAP = [
+    ("E1", "E1_Passport"),
+    ("E2", "E2_Finance_Legal"),
+    ("E3", "E3_Operations"),
+    ("E4", "E4_DNA"),
+    ("E5", "E5_Applicant_Profile"),
+    ("E6", "E6_Scoring"),
+    ("E7", "E7_Strategic_Insights"),
+]
+
+def region_code() -> str:
+    return str(os.getenv("REGION_DEFAULT_CODE", "92"))
+
+def _run_async(coro):
+    # Каждый источник обрабатывается в своём потоке/процессе — свой event loop на вызов
+    return asyncio.run(coro)
+
+# ---- Recording ----
+class StepHandle:
+    def __init__(self, recorder: "StepRecorder", step_id: int, spans: list[dict]):
+        self.recorder = recorder
+        self.id = step_id
+        self.spans = spans
+        self.status: str | None = None
+
+    def finish(self, status: str, payload: dict | None = None) -> None:
+        self.recorder.finish_step(self.id, status, payload, self.spans)
+        self.status = status
+
+class StepRecorder:
+    """Запись запусков/шагов/результатов в БД."""
+
+    _measure_lock = threading.Lock()
+
+    def start_run(self, region: str) -> int:
+        def write(db):
+            run = Run(region=region, status="running", started_at=datetime.utcnow(),
+                      heartbeat_at=datetime.utcnow(), cancel_requested=False)
+            db.add(run); db.flush()
+            return run.id
+        return run_write(write)
+
+    def update_run(self, run_id: int, **fields) -> None:
+        run_write(lambda db: db.execute(update(Run).where(Run.id == run_id).values(**fields)))
+
+    def bump(self, run_id: int, **deltas: int) -> None:
+        # Атомарный инкремент счётчиков: источники одного запуска пишут параллельно.
+        # coalesce — для строк, которым колонка досталась NULL'ом при миграции без DEFAULT
+        values = {getattr(Run, k): func.coalesce(getattr(Run, k), 0) + v for k, v in deltas.items()}
+        run_write(lambda db: db.execute(update(Run).where(Run.id == run_id).values(values)))
+
+    def new_step(self, run_id: int, stage: str, source_id: int | None = None) -> int:
+        def write(db):
+            st = Step(run_id=run_id, stage=stage, status="running", created_at=datetime.utcnow(), source_id=source_id)
+            db.add(st); db.flush()
+            return st.id
+        return run_write(write)
+
+    def finish_step(self, step_id: int, status: str, payload: dict | None = None, spans: list[dict] | None = None) -> None:
+        values = {"status": status, "payload": payload, "finished_at": datetime.utcnow()}
+        if spans:
+            values["spans"] = list(spans)
+            tokens = sum(s["attrs"].get("tokens") or 0 for s in spans)
+            if tokens:
+                values["llm_tokens"] = tokens
+        run_write(lambda db: db.execute(update(Step).where(Step.id == step_id).values(**values)))
+
+    @contextmanager
+    def step(self, run_id: int, stage: str, source_id: int | None = None):
+        """Шаг: исключение внутри блока записывается как status=error и пробрасывается дальше.
+
+        Перед началом проверяется отмена запуска (RunCancelled) — шаг тогда не создаётся.
+        """
+        check_cancelled(run_id)
+        step_id = self.new_step(run_id, stage, source_id)
+        with collect() as spans:
+            handle = StepHandle(self, step_id, spans)
+            try:
+                yield handle
+            except Exception as e:
+                if handle.status is None:
+                    handle.finish("error", {"error": str(e) or type(e).__name__})
+                raise
+            else:
+                if handle.status is None:
+                    handle.finish("ok")
+
+    def source_for(self, url: str, region: str) -> int:
+        def write(db):
+            src = Source(url=url, domain="", is_official=True, region_code=region,
+                         first_seen_at=datetime.utcnow(), status="new")
+            db.add(src); db.flush()
+            return src.id
+        try:
+            return run_write(write)
+        except IntegrityError:
+            with session_scope() as db:
+                return db.execute(select(Source.id).where(Source.url == url)).scalar_one()
+
+    def save_snapshot(self, source_id: int, snap: Snapshot) -> int:
+        def write(db):
+            dbsnap = DBSnapshot(source_id=source_id, sha256=snap.sha256, stored_at=datetime.utcnow(),
+                                path_html=snap.path_html, path_txt=snap.path_txt, http_status=snap.http_status,
+                                charset=snap.charset, content_type=snap.content_type)
+            db.add(dbsnap); db.flush()
+            return dbsnap.id
+        return run_write(write)
+
+    @contextmanager
+    def measure_lock(self):
+        """BUILD_ID + SAVE под одним замком: иначе параллельные источники получат одинаковый _NNN."""
+        with self._measure_lock:
+            if engine.dialect.name != "postgresql":
+                yield
+                return
+            # Celery: воркеры в разных процессах — advisory lock на уровне сессии Postgres
+            key = zlib.crc32(b"measures.msr_intlid")
+            with engine.connect() as conn:
+                conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": key})
+                try:
+                    yield
+                finally:
+                    conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key})
+
+recorder = StepRecorder()
+
+_gemini: GeminiClient | None = None
+_gemini_lock = threading.Lock()
+
+def gemini() -> GeminiClient:
+    global _gemini
+    with _gemini_lock:
+        if _gemini is None:
+            _gemini = GeminiClient()
+        return _gemini
+
+# ---- Per-source state and stages ----
+@dataclass
+class SourceState:
+    run_id: int
+    region: str
+    url: str
+    source_id: int | None = None
+    snapshot: Snapshot | None = None
+    snapshot_id: int | None = None
+    source_text: str = ""
+    outputs: dict[str, dict] = field(default_factory=dict)
+    msr_intlid: str | None = None
+    signature: list[int] | None = None
+    shingles: int = 0
+    signature_id: int | None = None
+    duplicate_of: str | None = None
+    filtered: bool = False
+    restored: set[str] = field(default_factory=set)  # этапы, восстановленные из ok-шагов (resume)
+
+def restore_state(st: SourceState) -> bool:
+    """Состояние источника по ok-шагам этого запуска. True — источник уже полностью обработан.
+
+    Этап восстанавливается, только если восстановлены предыдущие: E1..E7 без CLEAN
+    (или с пропавшим файлом снапшота) пересчитываются заново. Карточка, сохранённая
+    без части E2..E7 (SAVE требует только E1/E4), готовой не считается: недостающие
+    этапы повторяются и карточка пересохраняется под прежним msr_intlid.
+    """
+    with session_scope() as db:
+        rows = db.execute(select(Step.stage, Step.status, Step.payload)
+                          .where(Step.run_id == st.run_id, Step.source_id == st.source_id)
+                          .order_by(Step.id)).all()
+    done: dict[str, dict] = {}
+    for stage, status, payload in rows:
+        if status in ("ok", "filtered"):
+            done[stage] = payload or {}
+        else:
+            done.pop(stage, None)
+    if not done:
+        return False
+    if "SAVE" in done:
+        st.msr_intlid = done["SAVE"].get("msr_intlid")
+        if all(stage in done for stage, _prompt in STAGE_MAP):
+            return True
+    if done.get("FILTER", {}).get("relevant") is False:
+        st.filtered = True
+        return True
+    if done.get("DEDUP", {}).get("duplicate_of"):
+        st.msr_intlid = done["DEDUP"]["duplicate_of"]
+        return True
+    fetch = done.get("FETCH")
+    if not fetch or not os.path.exists(fetch.get("path_html") or fetch.get("path_txt") or ""):
+        return False
+    st.snapshot = Snapshot(url=st.url, path_html=fetch.get("path_html"), path_txt=fetch.get("path_txt"), sha256="",
+                           http_status=None, charset=None, content_type=fetch.get("content_type") or "text/html",
+                           pages=fetch.get("pages"), truncated=bool(fetch.get("truncated")))
+    st.snapshot_id = fetch.get("snapshot_id")
+    st.restored.add("FETCH")
+    if "CLEAN" not in done or not os.path.exists(st.snapshot.path_txt or ""):
+        return False
+    with open(st.snapshot.path_txt, "r", encoding="utf-8") as f:
+        st.source_text = f.read()
+    st.restored.add("CLEAN")
+    if "FILTER" in done:
+        st.restored.add("FILTER")
+    if "DEDUP" in done:
+        st.signature_id = done["DEDUP"].get("signature_id")
+        if st.signature_id is not None:
+            st.signature, st.shingles = dedup_index.signature(st.source_text)
+        st.restored.add("DEDUP")
+    for stage, _prompt in STAGE_MAP:
+        if stage in done:
+            st.outputs[stage] = done[stage]
+            st.restored.add(stage)
+    return False
+
+def stage_fetch(st: SourceState) -> None:
+    if "FETCH" in st.restored:
+        return
+    with recorder.step(st.run_id, "FETCH", st.source_id) as step:
+        snap = _run_async(fetch_and_snapshot(st.url))
+        st.snapshot = snap
+        with span("db.save_snapshot"):
+            st.snapshot_id = recorder.save_snapshot(st.source_id, snap)
+        payload = {"snapshot_id": st.snapshot_id, "path_html": snap.path_html, "path_txt": snap.path_txt,
+                   "content_type": snap.content_type}
+        if snap.pages is not None:
+            payload.update({"pages": snap.pages, "truncated": snap.truncated})
+        step.finish("ok", payload)
+
+def stage_clean(st: SourceState) -> None:
+    if "CLEAN" in st.restored:
+        return
+    with recorder.step(st.run_id, "CLEAN", st.source_id) as step:
+        info = {}
+        if st.snapshot.needs_cleaning:
+            info = _run_async(clean_snapshot(st.snapshot.path_html, st.snapshot.path_txt))
+        with span("file.read"):
+            with open(st.snapshot.path_txt, "r", encoding="utf-8") as f:
+                st.source_text = f.read()
+        step.finish("ok", {"chars": len(st.source_text), **info})
+
+def stage_filter(st: SourceState) -> None:
+    if st.msr_intlid or not relevance.RELEVANCE_ENABLED or "FILTER" in st.restored:
+        return
+    with recorder.step(st.run_id, "FILTER", st.source_id) as step:
+        verdict = relevance.judge(st.source_text, st.url)
+        if verdict["relevant"]:
+            step.finish("ok", verdict)
+            return
+        st.filtered = True
+        step.finish("filtered", verdict)
+    recorder.bump(st.run_id, filtered=1)
+
+def _attach_duplicate(st: SourceState, match: tuple[str, int, float]) -> dict:
+    mid, _sig_id, sim = match
+    def write(db):
+        added = dedup_index.attach_source(db, mid, st.url)
+        if st.signature_id is not None:
+            dedup_index.link_signature(db, st.signature_id, mid)
+        else:
+            dedup_index.add_signature(db, st.signature, st.shingles, st.source_id, st.snapshot_id, mid)
+        return added
+    with span("db.attach_source"):
+        added = run_write(write)
+    st.msr_intlid = st.duplicate_of = mid
+    return {"duplicate_of": mid, "similarity": round(sim, 3), "url_added": added}
+
+def stage_dedup(st: SourceState) -> None:
+    # msr_intlid уже есть — дозаполняем сохранённую карточку: с ней же DEDUP и совпал бы
+    if st.msr_intlid or st.filtered or not dedup_index.DEDUP_ENABLED or "DEDUP" in st.restored:
+        return
+    with recorder.step(st.run_id, "DEDUP", st.source_id) as step:
+        with span("minhash"):
+            st.signature, st.shingles = dedup_index.signature(st.source_text)
+        if st.signature is None:
+            step.finish("ok", {"skipped": "text too short"})
+            return
+        with span("db.lsh_lookup"), session_scope() as db:
+            match = dedup_index.find_duplicate(db, st.signature)
+        if match:
+            step.finish("ok", _attach_duplicate(st, match))
+            return
+        # Подпись без карточки: msr_intlid проставит SAVE
+        st.signature_id = run_write(lambda db: dedup_index.add_signature(
+            db, st.signature, st.shingles, st.source_id, st.snapshot_id))
+        step.finish("ok", {"duplicate_of": None, "signature_id": st.signature_id, "shingles": st.shingles})
+
+def stage_variables(st: SourceState) -> dict:
+    return {
+        "msr_geocde": region_code(),
+        "msr_geonme": "Регион",  # UI/lookup can set exact name
+        "msr_prglvl": "REG",
+        "msr_srclnk": st.url,
+        "SOURCE_TEXT": st.source_text,
+        "TODAY": datetime.utcnow().strftime("%d.%m.%Y"),
+    }
+
+def repair_output(stage: str, out, errors: list[dict], variables: dict):
+    """До GEMINI_REPAIR_ATTEMPTS запросов только по полям с ошибками. (результат, оставшиеся ошибки, попыток)."""
+    attempts = 0
+    while errors and attempts < GEMINI_REPAIR_ATTEMPTS:
+        attempts += 1
+        try:
+            with span("llm.repair", attempt=attempts, fields=sorted({str(e["field"]) for e in errors})):
+                out = gemini().repair_stage(stage, out, errors, variables)
+        except Exception:
+            traceback.print_exc()
+            break
+        with span("validate"):
+            errors = stage_errors(stage, out)
+    return out, errors, attempts
+
+def stage_extract(st: SourceState) -> None:
+    """E1..E7: ошибка одного этапа не останавливает остальные; невалидные поля дозапрашиваются."""
+    if st.filtered or st.duplicate_of:
+        return
+    variables = stage_variables(st)
+    for stage, prompt in STAGE_MAP:
+        if stage in st.restored:
+            continue
+        try:
+            with recorder.step(st.run_id, stage, st.source_id) as step:
+                out = gemini().run_stage(stage, prompt, variables)
+                with span("validate"):
+                    errors = stage_errors(stage, out)
+                if errors:
+                    out, errors, attempts = repair_output(stage, out, errors, variables)
+                if errors:
+                    step.finish("invalid", {"error": errors[0]["message"], "errors": errors, "raw": out,
+                                            "repair_attempts": attempts})
+                    continue
+                step.finish("ok", out)
+                st.outputs[stage] = out
+        except RunCancelled:
+            raise
+        except Exception:
+            recorder.bump(st.run_id, errors=1)
+
+def build_card(st: SourceState) -> dict:
+    card = {}
+    for out in st.outputs.values():
+        card.update(out)
+    card["msr_intlid"] = st.msr_intlid
+    # provenance (минимально)
+    card["provenance"] = {"region_input": st.region, "source_urls": [st.url]}
+    return card
+
+def stage_build_and_save(st: SourceState) -> None:
+    if st.filtered:
+        return
+    if st.duplicate_of:
+        recorder.bump(st.run_id, ok=1)
+        return
+    missing = [k for k in ("E1", "E4") if k not in st.outputs]
+    if missing:
+        # Без E1/E4 не из чего строить msr_intlid — фиксируем причину в шагах, а не молча
+        with recorder.step(st.run_id, "SAVE", st.source_id) as step:
+            step.finish("skipped", {"error": f"missing valid {', '.join(missing)}"})
+        return
+    e1, e4 = st.outputs["E1"], st.outputs["E4"]
+    with recorder.measure_lock():
+        if st.msr_intlid is None:
+            # Копии одной меры, обработанные параллельно, на DEDUP друг друга ещё не видели:
+            # под замком проверяем снова и не заводим вторую карточку
+            match = None
+            if st.signature:
+                with session_scope() as db:
+                    match = dedup_index.find_duplicate(db, st.signature)
+            if match:
+                with recorder.step(st.run_id, "DEDUP", st.source_id) as step:
+                    step.finish("ok", _attach_duplicate(st, match))
+                recorder.bump(st.run_id, ok=1)
+                return
+            with recorder.step(st.run_id, "BUILD_ID", st.source_id) as step:
+                with span("db.build_intlid"), session_scope() as db:
+                    st.msr_intlid = build_intlid(e1, e4, db)
+                step.finish("ok", {"msr_intlid": st.msr_intlid})
+        with recorder.step(st.run_id, "SAVE", st.source_id) as step:
+            measure = Measure(msr_intlid=st.msr_intlid, card=build_card(st),
+                              region_code=e1["msr_geocde"], prglvl=e1["msr_prglvl"],
+                              segmnt=e4["msr_segmnt"], typeid=e4["msr_typeid"],
+                              chkdat=datetime.utcnow())
+            def write(db):
+                prev = db.get(Measure, st.msr_intlid)
+                if prev is not None:
+                    # Пересохранение после resume: URL копий, приклеенных DEDUP, не теряем
+                    urls = ((prev.card or {}).get("provenance") or {}).get("source_urls") or []
+                    prov = measure.card["provenance"]
+                    prov["source_urls"] = list(dict.fromkeys(urls + prov["source_urls"]))
+                db.merge(measure)
+                with span("db.index_measure"):
+                    index_measure(db, st.msr_intlid, measure.card, st.source_text)
+                if st.signature_id is not None:
+                    dedup_index.link_signature(db, st.signature_id, st.msr_intlid)
+            with span("db.save_measure"):
+                run_write(write)
+            step.finish("ok", {"msr_intlid": st.msr_intlid})
+    recorder.bump(st.run_id, ok=1)
+
+SOURCE_STAGES = [stage_fetch, stage_clean, stage_filter, stage_dedup, stage_extract, stage_build_and_save]
+
+def process_source(run_id: int, region: str, url: str) -> dict:
+    """Полная цепочка для одного URL. Не бросает исключений: ошибки пишутся в шаги и счётчики."""
+    st = SourceState(run_id=run_id, region=region, url=url)
+    try:
+        with heartbeat(run_id):
+            st.source_id = recorder.source_for(url, region_code())
+            if restore_state(st):
+                recorder.bump(run_id, **({"filtered": 1} if st.filtered else {"ok": 1}))
+                return {"url": url, "msr_intlid": st.msr_intlid, "filtered": st.filtered, "restored": True}
+            for stage in SOURCE_STAGES:
+                stage(st)
+    except RunCancelled:
+        return {"url": url, "cancelled": True}
+    except Exception as e:
+        traceback.print_exc()
+        recorder.bump(run_id, errors=1)
+        return {"url": url, "error": str(e)}
+    finally:
+        recorder.bump(run_id, processed=1)
+    return {"url": url, "msr_intlid": st.msr_intlid, "filtered": st.filtered}
+
+# ---- Run level ----
+def _ok_payload(run_id: int, stage: str) -> dict | None:
+    # Последний успешный шаг уровня запуска (SEARCH/CRAWL) — для resume
+    with session_scope() as db:
+        return db.execute(select(Step.payload).where(Step.run_id == run_id, Step.stage == stage,
+                                                     Step.status == "ok", Step.source_id.is_(None))
+                          .order_by(Step.id.desc()).limit(1)).scalar()
+
+def discover_sources(run_id: int, region: str, resume: bool = False) -> list[str]:
+    done = _ok_payload(run_id, "SEARCH") if resume else None
+    if done is not None:
+        urls = list(done.get("urls") or [])
+    else:
+        with recorder.step(run_id, "SEARCH") as step:
+            with span("search", region=region):
+                urls = search_official_urls(region, max_results=6)
+            recorder.update_run(run_id, found=len(urls))
+            step.finish("ok", {"urls": urls})
+
+    # CRAWL — положения/постановления, приложенные к найденным страницам
+    if int(os.getenv("CRAWL_MAX_DEPTH", "1")) > 0 and urls:
+        done = _ok_payload(run_id, "CRAWL") if resume else None
+        if done is not None:
+            urls = urls + [d for d in done.get("documents") or [] if d not in urls]
+            recorder.update_run(run_id, found=len(urls))
+            return urls
+        try:
+            with recorder.step(run_id, "CRAWL") as step:
+                with span("crawl", seeds=len(urls)):
+                    docs = [d for d in _run_async(discover_documents(urls)) if d not in urls]
+                urls = urls + docs
+                recorder.update_run(run_id, found=len(urls))
+                step.finish("ok", {"documents": docs})
+        except RunCancelled:
+            raise
+        except Exception:
+            traceback.print_exc()
+    return urls
+
+def finish_run(run_id: int, status: str = "done") -> None:
+    def write(db):
+        cancelled = db.execute(select(Run.cancel_requested).where(Run.id == run_id)).scalar()
+        db.execute(update(Run).where(Run.id == run_id)
+                   .values(status="cancelled" if cancelled else status, finished_at=datetime.utcnow()))
+    run_write(write)
+
+def start_run(region: str, executor) -> int:
+    """Создать запуск, найти источники и передать их executor'у (он же завершает запуск)."""
+    init_db()
+    run_id = recorder.start_run(region)
+    try:
+        with heartbeat(run_id):
+            urls = discover_sources(run_id, region)
+        executor.run_sources(run_id, region, urls)
+    except Exception:
+        traceback.print_exc()
+        finish_run(run_id, "error")
+    return run_id
+
+def resume_run(run_id: int, executor) -> int:
+    """Продолжить запуск (после сбоя, отмены или зависания): SEARCH/CRAWL и ok-шаги источников
+    не повторяются, executor получает тот же список источников — готовые только пересчитываются в счётчиках.
+
+    Статус running ставит control.request_resume (API) — здесь он лишь подтверждается.
+    """
+    init_db()
+    with session_scope() as db:
+        region = db.execute(select(Run.region).where(Run.id == run_id)).scalar_one()
+    forget_cancel(run_id)
+    try:
+        with heartbeat(run_id):
+            recorder.update_run(run_id, status="running", finished_at=None, cancel_requested=False)
+            urls = discover_sources(run_id, region, resume=True)
+            # Счётчики источников заново: process_source учтёт и восстановленные
+            recorder.update_run(run_id, processed=0, ok=0, errors=0, filtered=0, queued=0)
+        executor.run_sources(run_id, region, urls)
+    except Exception:
+        traceback.print_exc()
+        finish_run(run_id, "error")
+    return run_id
@@ -0,0 +1,33 @@
+"""
+Executors: как источники одного запуска распределяются по исполнителям.
+
+InlineExecutor  — последовательно в текущем потоке (smoke, отладка);
+ThreadExecutor  — пул потоков в процессе API (LOCAL_SINGLEEXE);
+CeleryExecutor  — задачи Celery (apps/api/worker/app.py).
+
+Контракт: run_sources(run_id, region, urls) обрабатывает источники через
+engine.process_source и завершает запуск через engine.finish_run
+(сразу или асинхронно — как у Celery).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from .engine import process_source, finish_run
+
+class InlineExecutor:
+    name = "inline"
+
+    def run_sources(self, run_id: int, region: str, urls: list[str]) -> None:
+        for url in urls:
+            process_source(run_id, region, url)
+        finish_run(run_id)
+
+class ThreadExecutor:
+    name = "thread"
+
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers = max_workers or int(os.getenv("PIPELINE_WORKERS", "3"))
+
+    def run_sources(self, run_id: int, region: str, urls: list[str]) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"run{run_id}") as pool:
+            list(pool.map(lambda u: process_source(run_id, region, u), urls))
+        finish_run(run_id)
@@ -1,24 +1,90 @@
 import json, os
+from functools import lru_cache
 from jsonschema import validate, Draft202012Validator
 from jsonschema.exceptions import ValidationError
 
 SCHEMAS_DIR = os.path.dirname(__file__)
+STAGE_SCHEMAS = {
+    "E1": "e1.json", "E2": "e2.json", "E3": "e3.json",
+    "E4": "e4.json", "E5": "e5.json", "E6": "e6.json", "E7": "e7.json"
+}
 
 def _load(name: str) -> dict:
     path = os.path.join(SCHEMAS_DIR, name)
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+@lru_cache(maxsize=None)
+def _validator(stage: str) -> Draft202012Validator:
+    return Draft202012Validator(_load(STAGE_SCHEMAS[stage]))
+
 def validate_stage(stage: str, data: dict) -> tuple[bool, str | None]:
-    mapping = {
-        "E1": "e1.json", "E2": "e2.json", "E3": "e3.json",
-        "E4": "e4.json", "E5": "e5.json", "E6": "e6.json", "E7": "e7.json"
-    }
-    if stage not in mapping:
+    if stage not in STAGE_SCHEMAS:
         return True, None
-    schema = _load(mapping[stage])
     try:
-        Draft202012Validator(schema).validate(data)
+        _validator(stage).validate(data)
         return True, None
     except ValidationError as e:
         return False, str(e)
+
+def _path(parts) -> str:
+    return "".join(f"[{p}]" if isinstance(p, int) else (f".{p}" if i else str(p)) for i, p in enumerate(parts))
+
+def stage_errors(stage: str, data) -> list[dict]:
+    """Все ошибки схемы с путями: [{"field": верхнеуровневое поле | None, "path", "message", "extra"}].
+
+    field=None — ошибка всего объекта (не JSON-объект); extra=True — лишнее поле (его достаточно удалить).
+    """
+    if stage not in STAGE_SCHEMAS:
+        return []
+    validator = _validator(stage)
+    props = validator.schema.get("properties", {})
+    out = []
+    for e in sorted(validator.iter_errors(data), key=lambda e: list(map(str, e.absolute_path))):
+        path = list(e.absolute_path)
+        if not path and e.validator == "required":
+            out += [{"field": f, "path": f, "message": f"'{f}' is a required property", "extra": False}
+                    for f in e.validator_value if isinstance(e.instance, dict) and f not in e.instance]
+        elif not path and e.validator == "additionalProperties" and isinstance(e.instance, dict):
+            out += [{"field": f, "path": f, "message": f"'{f}' is not allowed", "extra": True}
+                    for f in e.instance if f not in props]
+        else:
+            out.append({"field": str(path[0]) if path else None, "path": _path(path), "message": e.message,
+                        "extra": False})
+    # required даёт по ошибке на каждое отсутствующее поле, но validator_value у них общий
+    return list({(err["path"], err["message"]): err for err in out}.values())
+
+def _inline_refs(node, root: dict):
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/"):
+            target = root
+            for part in ref[2:].split("/"):
+                target = target[part]
+            return _inline_refs(target, root)
+        return {k: _inline_refs(v, root) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_inline_refs(v, root) for v in node]
+    return node
+
+@lru_cache(maxsize=None)
+def _llm_schema(stage: str) -> str:
+    schema = _load(STAGE_SCHEMAS[stage])
+    resolved = _inline_refs(schema, schema)
+    for key in ("$schema", "$id", "$defs", "defs"):
+        resolved.pop(key, None)
+    return json.dumps(resolved, ensure_ascii=False)
+
+def llm_schema(stage: str, fields: list[str] | None = None) -> dict | None:
+    """Схема этапа для response_json_schema: без $schema/$id, ссылки раскрыты.
+
+    fields — только эти поля (все обязательные): схема ответа на запрос исправления.
+    """
+    if stage not in STAGE_SCHEMAS:
+        return None
+    schema = json.loads(_llm_schema(stage))
+    if fields is not None:
+        props = schema.get("properties", {})
+        schema["properties"] = {f: props[f] for f in fields if f in props}
+        schema["required"] = list(schema["properties"])
+    return schema
@@ -0,0 +1,104 @@
+"""
+Этап CLEAN: HTML снапшота -> текст для LLM.
+
+Сначала быстрый экстрактор (selectolax, если установлен, иначе lxml) по основному
+контейнеру страницы (<main>/<article>/role=main). Если контейнер не найден или
+текста мало — readability. Страницы больше CLEAN_MAX_BYTES обрезаются и идут
+только через быстрый путь. Работа выполняется в пуле процессов (pool.py).
+"""
+import os, re, time
+from lxml import html as lxml_html
+from bs4 import BeautifulSoup
+from readability import Document
+from .pool import run_in_pool
+from packages.observability.tracing import span
+
+try:
+    from selectolax.parser import HTMLParser  # опционально: pip install selectolax
+except ImportError:
+    HTMLParser = None
+
+CLEAN_MAX_BYTES = int(os.getenv("CLEAN_MAX_BYTES", str(2 * 1024 * 1024)))
+CLEAN_MIN_CHARS = int(os.getenv("CLEAN_MIN_CHARS", "400"))
+CLEAN_TIMEOUT = float(os.getenv("CLEAN_TIMEOUT", "30"))
+
+DROP_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer", "aside", "form")
+MAIN_XPATH = "//main | //article | //*[@role='main'] | //*[@id='content' or @id='main']"
+BLOCK_TAGS = {"p", "div", "li", "tr", "br", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table", "ul", "ol", "dd", "dt"}
+
+_blank_lines = re.compile(r"\n\s*\n+")
+
+def _normalize(text: str) -> str:
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return _blank_lines.sub("\n\n", "\n".join(lines)).strip()
+
+def _lxml_text(el) -> str:
+    parts = []
+    for node in el.iter():
+        if isinstance(node.tag, str) and node.tag in BLOCK_TAGS:
+            parts.append("\n")
+        if node.text and isinstance(node.tag, str):
+            parts.append(node.text)
+        if node.tail and node is not el:
+            parts.append(node.tail)
+    return "".join(parts)
+
+def extract_lxml(html: str) -> tuple[str, bool]:
+    """(текст, найден ли основной контейнер)."""
+    doc = lxml_html.document_fromstring(html)
+    for el in doc.xpath("|".join(f"//{t}" for t in DROP_TAGS)):
+        el.drop_tree()
+    main = doc.xpath(MAIN_XPATH)
+    root = max(main, key=lambda e: len(e.text_content())) if main else doc
+    return _normalize(_lxml_text(root)), bool(main)
+
+def extract_selectolax(html: str) -> tuple[str, bool]:
+    tree = HTMLParser(html)
+    tree.strip_tags(list(DROP_TAGS))
+    main = tree.css("main, article, [role=main], #content, #main")
+    root = max(main, key=lambda n: len(n.text())) if main else (tree.body or tree.root)
+    if root is None:
+        return "", False
+    return _normalize(root.text(separator="\n")), bool(main)
+
+def extract_readability(html: str) -> str:
+    try:
+        summary_html = Document(html).summary()
+        return _normalize(BeautifulSoup(summary_html, "lxml").get_text("\n"))
+    except Exception:
+        return _normalize(BeautifulSoup(html, "lxml").get_text("\n"))
+
+def extract_fast(html: str) -> tuple[str, bool]:
+    return extract_selectolax(html) if HTMLParser is not None else extract_lxml(html)
+
+def clean_html(html: str, max_bytes: int = CLEAN_MAX_BYTES, min_chars: int = CLEAN_MIN_CHARS) -> dict:
+    truncated = len(html) > max_bytes
+    if truncated:
+        html = html[:max_bytes]
+    extractor = "selectolax" if HTMLParser is not None else "lxml"
+    try:
+        text, has_main = extract_fast(html)
+    except Exception:
+        text, has_main = "", False
+    if not truncated and not (has_main and len(text) >= min_chars):
+        fallback = extract_readability(html)
+        if len(fallback) >= min(len(text), min_chars):
+            text, extractor = fallback, "readability"
+    return {"text": text, "extractor": extractor, "truncated": truncated}
+
+def clean_file(path_html: str, path_txt: str, max_bytes: int = CLEAN_MAX_BYTES) -> dict:
+    """Воркер пула: читает HTML с диска, пишет TXT; наружу — только метаданные."""
+    t0 = time.perf_counter()
+    with open(path_html, "r", encoding="utf-8", errors="ignore") as f:
+        html = f.read(max_bytes + 1)
+    result = clean_html(html, max_bytes)
+    with open(path_txt, "w", encoding="utf-8") as f:
+        f.write(result["text"])
+    return {"chars": len(result["text"]), "extractor": result["extractor"], "truncated": result["truncated"],
+            "worker_ms": round((time.perf_counter() - t0) * 1000, 2)}
+
+async def clean_snapshot(path_html: str, path_txt: str, timeout: float = CLEAN_TIMEOUT) -> dict:
+    with span("clean.pool") as attrs:
+        info = await run_in_pool(clean_file, path_html, path_txt, CLEAN_MAX_BYTES, timeout=timeout)
+        attrs.update(extractor=info["extractor"], chars=info["chars"], worker_ms=info["worker_ms"])
+    return info
@@ -0,0 +1,324 @@
+"""
+Фронтир обхода: от найденных официальных страниц к приложенным документам
+(положения, постановления, порядки предоставления).
+
+Вежливость: per-host лимит параллельности и задержка, кэш robots.txt,
+лимиты глубины и бюджета страниц, дедупликация по множеству увиденных URL
+(для больших обходов — Bloom-фильтр).
+
+Запрашивается и возвращается исходный абсолютный URL (схема и query сохраняются:
+http-сайты и /download.php?id=17 должны работать); crawl_key — только ключ дедупликации.
+Документами считаются только типы, которые умеет разбирать FETCH (documents.SUPPORTED_KINDS):
+.doc/.rtf/.odt и прочие бинарные ссылки не скачиваются и в источники не попадают.
+"""
+import os, re, time, math, asyncio, hashlib, traceback
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from urllib.parse import urlparse, urldefrag
+from urllib.robotparser import RobotFileParser
+import httpx
+from lxml import html as lxml_html
+from packages.agents.search import canonicalize, is_official
+from .documents import SUPPORTED_KINDS, CONTENT_TYPES
+
+USER_AGENT = os.getenv("USER_AGENT", "Autoparser/1.0 (+contact@example.com)")
+
+DOC_EXTENSIONS = tuple(f".{kind}" for kind in SUPPORTED_KINDS)
+DOC_CONTENT_TYPES = {ct: kind for kind, ct in CONTENT_TYPES.items()}
+# Не HTML и не разбираемый документ — не качаем вовсе
+SKIP_EXTENSIONS = (".doc", ".rtf", ".odt", ".xls", ".xlsx", ".ppt", ".pptx", ".zip", ".rar", ".7z",
+                   ".jpg", ".jpeg", ".png", ".gif", ".mp3", ".mp4")
+# Ссылки с такими словами в тексте/URL обходим раньше прочих
+PRIORITY_HINTS = re.compile(r"положени|постановлени|порядок|приказ|субсиди|грант|документ|npa|docs?|files?|upload", re.I)
+
+@dataclass
+class CrawlConfig:
+    max_depth: int = 1
+    max_pages: int = 40
+    max_docs: int = 20
+    concurrency: int = 8
+    per_host_concurrency: int = 2
+    per_host_delay: float = 1.0
+    timeout: float = 30.0
+    deadline: float = 300.0  # сек. на весь обход; по истечении возвращается найденное
+    max_page_bytes: int = 5 * 1024 * 1024
+    bloom_capacity: int = 0  # 0 — обычный set, иначе Bloom-фильтр на столько элементов
+
+    @classmethod
+    def from_env(cls) -> "CrawlConfig":
+        return cls(
+            max_depth=int(os.getenv("CRAWL_MAX_DEPTH", "1")),
+            max_pages=int(os.getenv("CRAWL_MAX_PAGES", "40")),
+            max_docs=int(os.getenv("CRAWL_MAX_DOCS", "20")),
+            concurrency=int(os.getenv("CRAWL_CONCURRENCY", "8")),
+            per_host_concurrency=int(os.getenv("CRAWL_HOST_CONCURRENCY", "2")),
+            per_host_delay=float(os.getenv("CRAWL_HOST_DELAY", "1.0")),
+            timeout=int(os.getenv("REQUEST_TIMEOUT_MS", "30000")) / 1000,
+            deadline=float(os.getenv("CRAWL_DEADLINE", "300")),
+            max_page_bytes=int(os.getenv("CRAWL_MAX_PAGE_BYTES", str(5 * 1024 * 1024))),
+            bloom_capacity=int(os.getenv("CRAWL_BLOOM_CAPACITY", "0")),
+        )
+
+@dataclass
+class CrawlResult:
+    url: str
+    depth: int
+    parent: str | None
+    kind: str  # html / pdf / docx / other
+    http_status: int | None = None
+
+    @property
+    def is_document(self) -> bool:
+        return self.kind in SUPPORTED_KINDS
+
+# ---- Seen-set ----
+class BloomFilter:
+    """Bloom-фильтр на bytearray; k хэшей — double hashing поверх blake2b."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+def make_seen_set(bloom_capacity: int = 0):
+    return BloomFilter(bloom_capacity) if bloom_capacity > 0 else set()
+
+# ---- Link extraction ----
+def crawl_key(url: str) -> str:
+    """Ключ дедупликации: canonicalize (схема/регистр хоста) + query — разные ?id= не склеиваются."""
+    query = urlparse(url).query
+    return canonicalize(url) + (f"?{query}" if query else "")
+
+def classify_url(url: str) -> str:
+    path = urlparse(url).path.lower()
+    for ext in DOC_EXTENSIONS:
+        if path.endswith(ext):
+            return ext[1:]
+    return "other" if path.endswith(SKIP_EXTENSIONS) else "html"
+
+def classify_content_type(content_type: str | None) -> str:
+    ct = (content_type or "").split(";")[0].strip().lower()
+    if ct in DOC_CONTENT_TYPES:
+        return DOC_CONTENT_TYPES[ct]
+    if ct in ("text/html", "application/xhtml+xml", ""):
+        return "html"
+    return "other"
+
+def extract_links(html: str | bytes, base_url: str) -> list[tuple[str, str]]:
+    """Исходящие ссылки страницы: [(абсолютный url без #fragment, anchor_text)] без повторов."""
+    try:
+        doc = lxml_html.document_fromstring(html, base_url=base_url)
+    except Exception:
+        return []
+    doc.make_links_absolute(base_url, resolve_base_href=True, handle_failures="discard")
+    out, seen = [], set()
+    for a in doc.iter("a"):
+        href = (a.get("href") or "").strip()
+        if not href.startswith(("http://", "https://")):
+            continue
+        url = urldefrag(href)[0]
+        key = crawl_key(url)
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append((url, " ".join(a.text_content().split())[:200]))
+    return out
+
+def should_follow(url: str, parent: str) -> bool:
+    host = urlparse(url).netloc
+    return host == urlparse(parent).netloc or is_official(host)
+
+def link_priority(url: str, anchor: str) -> int:
+    if classify_url(url) != "html":
+        return 0
+    return 1 if PRIORITY_HINTS.search(url) or PRIORITY_HINTS.search(anchor) else 2
+
+# ---- Politeness ----
+class HostLimiter:
+    """Per-host семафор + минимальный интервал между запросами к одному хосту."""
+
+    def __init__(self, concurrency: int, delay: float):
+        self.concurrency = max(1, concurrency)
+        self.delay = delay
+        self._sems: dict[str, asyncio.Semaphore] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._next_at: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str, delay: float | None = None):
+        sem = self._sems.setdefault(host, asyncio.Semaphore(self.concurrency))
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with sem:
+            async with lock:
+                wait = self._next_at.get(host, 0.0) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_at[host] = time.monotonic() + max(self.delay, delay or 0.0)
+            yield
+
+class RobotsCache:
+    """robots.txt на хост: качаем один раз, конкурентные запросы ждут ту же загрузку."""
+
+    def __init__(self, client: httpx.AsyncClient, user_agent: str = USER_AGENT):
+        self.client = client
+        self.user_agent = user_agent
+        self._parsers: dict[str, RobotFileParser] = {}
+        self._pending: dict[str, asyncio.Future] = {}
+
+    async def _load(self, origin: str) -> RobotFileParser:
+        rp = RobotFileParser()
+        try:
+            resp = await self.client.get(origin + "/robots.txt")
+            if resp.status_code in (401, 403):
+                rp.disallow_all = True
+            elif resp.status_code >= 400:
+                rp.allow_all = True
+            else:
+                rp.parse(resp.text.splitlines())
+        except Exception:
+            rp.allow_all = True
+        return rp
+
+    async def get(self, url: str) -> RobotFileParser:
+        p = urlparse(url)
+        origin = f"{p.scheme}://{p.netloc}"
+        if origin in self._parsers:
+            return self._parsers[origin]
+        fut = self._pending.get(origin)
+        if fut is None:
+            fut = self._pending[origin] = asyncio.ensure_future(self._load(origin))
+        rp = await fut
+        self._parsers[origin] = rp
+        self._pending.pop(origin, None)
+        return rp
+
+    async def allowed(self, url: str) -> bool:
+        return (await self.get(url)).can_fetch(self.user_agent, url)
+
+    async def crawl_delay(self, url: str) -> float:
+        delay = (await self.get(url)).crawl_delay(self.user_agent)
+        return float(delay) if delay else 0.0
+
+# ---- Frontier ----
+class CrawlFrontier:
+    def __init__(self, config: CrawlConfig | None = None, client: httpx.AsyncClient | None = None):
+        self.config = config or CrawlConfig.from_env()
+        self._client = client
+        self.seen = make_seen_set(self.config.bloom_capacity)
+        self.results: list[CrawlResult] = []
+        self.pages_fetched = 0
+        self.docs_found = 0
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._order = 0
+        self.limiter = HostLimiter(self.config.per_host_concurrency, self.config.per_host_delay)
+        self.timed_out = False
+
+    def _enqueue(self, url: str, depth: int, parent: str | None, priority: int) -> None:
+        key = crawl_key(url)
+        if key in self.seen:
+            return
+        self.seen.add(key)
+        self._order += 1
+        self._queue.put_nowait((depth, priority, self._order, url, parent))
+
+    async def _fetch_page(self, client: httpx.AsyncClient, url: str, read_body: bool) -> tuple[int | None, str, bytes, str]:
+        """(статус, вид, тело, итоговый URL после редиректов). read_body=False — только заголовки."""
+        async with client.stream("GET", url) as resp:
+            kind = classify_content_type(resp.headers.get("content-type"))
+            final_url = str(resp.url)
+            if kind != "html" or resp.status_code >= 400 or not read_body:
+                return resp.status_code, kind, b"", final_url
+            body = bytearray()
+            async for chunk in resp.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > self.config.max_page_bytes:
+                    break
+            return resp.status_code, kind, bytes(body), final_url
+
+    async def _visit(self, client: httpx.AsyncClient, robots: RobotsCache, item) -> None:
+        depth, _prio, _order, url, parent = item
+        kind = classify_url(url)
+        if kind == "other":
+            return
+        if kind != "html":
+            # Документы — листья фронтира: скачиваются позже, на этапе FETCH (robots проверяем уже здесь)
+            if await robots.allowed(url) and self.docs_found < self.config.max_docs:
+                self.docs_found += 1
+                self.results.append(CrawlResult(url, depth, parent, kind))
+            return
+        if not await robots.allowed(url) or self.pages_fetched >= self.config.max_pages:
+            return
+        self.pages_fetched += 1
+        host = urlparse(url).netloc
+        async with self.limiter.slot(host, await robots.crawl_delay(url)):
+            try:
+                # На последней глубине ссылки не нужны: тело не читаем, хватает Content-Type
+                status, kind, body, base = await self._fetch_page(client, url, depth < self.config.max_depth)
+            except httpx.HTTPError:
+                return
+        if kind != "html":
+            if kind in SUPPORTED_KINDS and self.docs_found < self.config.max_docs:
+                self.docs_found += 1
+                self.results.append(CrawlResult(url, depth, parent, kind, status))
+            return
+        self.results.append(CrawlResult(url, depth, parent, kind, status))
+        if depth >= self.config.max_depth or not body:
+            return
+        # Относительные ссылки — от итогового URL (/support → /support/, http → https)
+        for link, anchor in extract_links(body, base):
+            if should_follow(link, base) and classify_url(link) != "other":
+                self._enqueue(link, depth + 1, url, link_priority(link, anchor))
+
+    async def _worker(self, client: httpx.AsyncClient, robots: RobotsCache) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._visit(client, robots, item)
+            except Exception:
+                # Битая ссылка или страница не должна останавливать воркер: иначе join() не дождётся очереди
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    async def run(self, seeds: list[str]) -> list[CrawlResult]:
+        for s in seeds:
+            self._enqueue(urldefrag(s)[0], 0, None, 0)
+        client = self._client or httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT}, follow_redirects=True, timeout=self.config.timeout
+        )
+        robots = RobotsCache(client)
+        workers = [asyncio.create_task(self._worker(client, robots)) for _ in range(max(1, self.config.concurrency))]
+        try:
+            await asyncio.wait_for(self._queue.join(), self.config.deadline or None)
+        except asyncio.TimeoutError:
+            self.timed_out = True
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self._client is None:
+                await client.aclose()
+        return self.results
+
+async def crawl(seeds: list[str], config: CrawlConfig | None = None) -> list[CrawlResult]:
+    return await CrawlFrontier(config).run(seeds)
+
+async def discover_documents(seeds: list[str], config: CrawlConfig | None = None) -> list[str]:
+    """URL документов, найденных обходом от seed-страниц (сами seed-страницы не включаются)."""
+    seed_keys = {crawl_key(s) for s in seeds}
+    return [r.url for r in await crawl(seeds, config) if r.is_document and crawl_key(r.url) not in seed_keys]
@@ -0,0 +1,117 @@
+"""
+Документы (PDF/DOCX): потоковое скачивание на диск и постраничное извлечение текста.
+
+Извлечение выполняется в пуле процессов (см. pool.py): текст пишется в .txt
+по мере чтения страниц, в память целиком документ не поднимается. Для каждой
+страницы сохраняются смещения в .txt — для provenance.
+"""
+import os, hashlib, zipfile
+import httpx
+import aiofiles
+from lxml import etree
+
+USER_AGENT = os.getenv("USER_AGENT", "Autoparser/1.0 (+contact@example.com)")
+DOC_MAX_BYTES = int(os.getenv("DOC_MAX_BYTES", str(50 * 1024 * 1024)))
+DOC_MAX_PAGES = int(os.getenv("DOC_MAX_PAGES", "500"))
+DOC_TIMEOUT = float(os.getenv("DOC_TIMEOUT", "120"))  # сек. на извлечение текста; дольше — воркер убивается
+SUPPORTED_KINDS = ("pdf", "docx")
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+class DocumentTooLarge(ValueError):
+    pass
+
+async def download_to_file(url: str, dest: str, max_bytes: int = DOC_MAX_BYTES) -> dict:
+    """Скачать url в dest чанками; превышение max_bytes — DocumentTooLarge (частичный файл удаляется)."""
+    sha = hashlib.sha256()
+    size = 0
+    timeout = int(os.getenv("REQUEST_TIMEOUT_MS", "30000")) / 1000
+    try:
+        async with httpx.AsyncClient(headers={"User-Agent": USER_AGENT}, follow_redirects=True, timeout=timeout) as client:
+            async with client.stream("GET", url) as resp:
+                resp.raise_for_status()
+                declared = int(resp.headers.get("content-length") or 0)
+                if declared > max_bytes:
+                    raise DocumentTooLarge(f"{url}: {declared} bytes > {max_bytes}")
+                async with aiofiles.open(dest, "wb") as fh:
+                    async for chunk in resp.aiter_bytes(1 << 16):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise DocumentTooLarge(f"{url}: more than {max_bytes} bytes")
+                        sha.update(chunk)
+                        await fh.write(chunk)
+                return {
+                    "http_status": resp.status_code,
+                    "content_type": resp.headers.get("content-type"),
+                    "size": size,
+                    "sha256": sha.hexdigest(),
+                }
+    except Exception:
+        if os.path.exists(dest):
+            os.remove(dest)
+        raise
+
+# ---- Page iterators (run inside worker processes) ----
+def _iter_pdf_pages(path: str):
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    for page in reader.pages:
+        try:
+            yield page.extract_text() or ""
+        except Exception:
+            yield ""
+
+def _iter_docx_pages(path: str):
+    """DOCX не хранит разбивку на страницы — режем по явным/последним отрисованным разрывам."""
+    lines: list[str] = []
+    para: list[str] = []
+    with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as fh:
+        for _event, el in etree.iterparse(fh, events=("end",)):
+            tag = el.tag
+            if tag == W_NS + "t":
+                para.append(el.text or "")
+            elif tag == W_NS + "tab":
+                para.append("\t")
+            elif tag == W_NS + "lastRenderedPageBreak" or (tag == W_NS + "br" and el.get(W_NS + "type") == "page"):
+                if para:
+                    lines.append("".join(para))
+                    para = []
+                if any(lines):
+                    yield "\n".join(lines)
+                lines = []
+            elif tag == W_NS + "p":
+                lines.append("".join(para))
+                para = []
+                el.clear()
+                while el.getprevious() is not None:
+                    del el.getparent()[0]
+    if para:
+        lines.append("".join(para))
+    if any(lines):
+        yield "\n".join(lines)
+
+def extract_document(path: str, kind: str, path_txt: str, max_pages: int = DOC_MAX_PAGES) -> dict:
+    """Текст документа в path_txt постранично; возвращает смещения страниц (в символах .txt)."""
+    if kind == "pdf":
+        pages_iter = _iter_pdf_pages(path)
+    elif kind == "docx":
+        pages_iter = _iter_docx_pages(path)
+    else:
+        raise ValueError(f"Unsupported document kind: {kind}")
+    pages = []
+    offset = 0
+    truncated = False
+    with open(path_txt, "w", encoding="utf-8") as out:
+        for num, text in enumerate(pages_iter, start=1):
+            if num > max_pages:
+                truncated = True
+                break
+            text = text.strip()
+            out.write(text + "\n\n")
+            pages.append({"page": num, "start": offset, "end": offset + len(text)})
+            offset += len(text) + 2
+    return {"pages": pages, "chars": offset, "truncated": truncated}
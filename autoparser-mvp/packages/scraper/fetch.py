@@ -1,9 +1,12 @@
-import os, hashlib, time, asyncio
+import os, hashlib, time, uuid, asyncio
 from dataclasses import dataclass
 from urllib.parse import urlparse
+import httpx
 from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
-from readability import Document
+from .crawl import classify_url, classify_content_type
+from .documents import SUPPORTED_KINDS, CONTENT_TYPES, DOC_MAX_BYTES, DOC_MAX_PAGES, DOC_TIMEOUT, download_to_file, extract_document
+from .pool import run_in_pool
+from packages.observability.tracing import span
 
 SNAP_DIR = os.getenv("SNAP_DIR", "data/snapshots")
 
@@ -15,38 +18,97 @@ class Snapshot:
     sha256: str
     http_status: int | None
     charset: str | None
+    content_type: str = "text/html"
+    pages: list[dict] | None = None  # PDF/DOCX: [{"page", "start", "end"}] — смещения в path_txt
+    truncated: bool = False
+
+    @property
+    def needs_cleaning(self) -> bool:
+        # Для документов текст извлекается уже на FETCH
+        return self.content_type == "text/html"
+
+async def sniff_kind(url: str) -> str:
+    """html / pdf / docx / ... — по расширению, иначе по Content-Type из HEAD
+    (сервер без HEAD — 403/405/501 — спрашиваем GET первого байта)."""
+    kind = classify_url(url)
+    if kind != "html":
+        return kind
+    with span("fetch.sniff") as attrs:
+        kind = await _head_kind(url)
+        attrs["kind"] = kind
+    return kind
+
+async def _head_kind(url: str) -> str:
+    kind = "html"
+    try:
+        async with httpx.AsyncClient(headers={"User-Agent": os.getenv("USER_AGENT", "Autoparser/1.0 (+contact@example.com)")},
+                                     follow_redirects=True, timeout=10) as client:
+            resp = await client.head(url)
+            if resp.status_code in (403, 405, 501):
+                # Тело не читаем: хватает заголовков (Range соблюдают не все — закрываем поток сразу)
+                async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as resp:
+                    pass
+        if resp.status_code < 400:
+            kind = classify_content_type(resp.headers.get("content-type"))
+    except httpx.HTTPError:
+        pass
+    return "html" if kind == "other" else kind
+
+def _snapshot_base(url: str, sha: str) -> str:
+    ts = int(time.time())
+    host = urlparse(url).netloc.replace(":","_")
+    return f"{SNAP_DIR}/{host}_{ts}_{sha[:8]}"
+
+async def fetch_document(url: str, kind: str) -> Snapshot:
+    if kind not in SUPPORTED_KINDS:
+        raise ValueError(f"Unsupported document type '{kind}': {url}")
+    os.makedirs(SNAP_DIR, exist_ok=True)
+    tmp = f"{SNAP_DIR}/.{uuid.uuid4().hex}.part"
+    with span("document.download", kind=kind) as attrs:
+        meta = await download_to_file(url, tmp, DOC_MAX_BYTES)
+        attrs["bytes"] = meta["size"]
+    base = _snapshot_base(url, meta["sha256"])
+    path_doc = f"{base}.{kind}"
+    os.replace(tmp, path_doc)
+    path_txt = base + ".txt"
+    with span("document.extract", kind=kind) as attrs:
+        extracted = await run_in_pool(extract_document, path_doc, kind, path_txt, DOC_MAX_PAGES,
+                                      timeout=DOC_TIMEOUT)
+        attrs["pages"] = len(extracted["pages"])
+    return Snapshot(
+        url=url, path_html=path_doc, path_txt=path_txt,
+        sha256=meta["sha256"], http_status=meta["http_status"], charset="utf-8",
+        content_type=CONTENT_TYPES[kind], pages=extracted["pages"], truncated=extracted["truncated"]
+    )
 
 async def fetch_and_snapshot(url: str) -> Snapshot:
+    # PDF/DOCX в браузере отдают оболочку вьюера — их качаем и разбираем сами
+    kind = await sniff_kind(url)
+    if kind != "html":
+        return await fetch_document(url, kind)
+
     os.makedirs(SNAP_DIR, exist_ok=True)
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=os.getenv("PLAYWRIGHT_HEADLESS","true")=="true")
-        ctx = await browser.new_context(user_agent=os.getenv("USER_AGENT", "Autoparser/1.0 (+contact@example.com)"))
-        page = await ctx.new_page()
-        resp = await page.goto(url, wait_until="domcontentloaded", timeout=int(os.getenv("REQUEST_TIMEOUT_MS","30000")))
-        html = await page.content()
+        with span("browser.launch"):
+            browser = await p.chromium.launch(headless=os.getenv("PLAYWRIGHT_HEADLESS","true")=="true")
+            ctx = await browser.new_context(user_agent=os.getenv("USER_AGENT", "Autoparser/1.0 (+contact@example.com)"))
+            page = await ctx.new_page()
+        with span("browser.navigate") as attrs:
+            resp = await page.goto(url, wait_until="domcontentloaded", timeout=int(os.getenv("REQUEST_TIMEOUT_MS","30000")))
+            attrs["http_status"] = resp.status if resp else None
+        with span("browser.content"):
+            html = await page.content()
         await browser.close()
 
     sha = hashlib.sha256(html.encode("utf-8","ignore")).hexdigest()
-    ts = int(time.time())
-    host = urlparse(url).netloc.replace(":","_")
-    base = f"{SNAP_DIR}/{host}_{ts}_{sha[:8]}"
+    base = _snapshot_base(url, sha)
     path_html = base + ".html"
-    with open(path_html, "w", encoding="utf-8") as f:
-        f.write(html)
-
-    # Clean: readability + BS4 fallback
-    try:
-        doc = Document(html)
-        summary_html = doc.summary()
-        soup = BeautifulSoup(summary_html, "lxml")
-        text = soup.get_text("\n")
-    except Exception:
-        soup = BeautifulSoup(html, "lxml")
-        text = soup.get_text("\n")
+    with span("snapshot.write", chars=len(html)):
+        with open(path_html, "w", encoding="utf-8") as f:
+            f.write(html)
 
+    # Текст (path_txt) пишет отдельный этап CLEAN — см. clean.py
     path_txt = base + ".txt"
-    with open(path_txt, "w", encoding="utf-8") as f:
-        f.write(text)
 
     return Snapshot(
         url=url, path_html=path_html, path_txt=path_txt,
@@ -0,0 +1,115 @@
+"""
+Общий пул процессов для CPU-bound работы скрапера (очистка HTML, разбор PDF/DOCX),
+чтобы она не блокировала event loop.
+
+Очередь ограничена: одновременно в пуле не больше SCRAPER_QUEUE задач (по умолчанию —
+числу воркеров, чтобы задачи не стояли в очереди самого executor'а), остальные вызывающие
+ждут слот (backpressure вместо неограниченного накопления).
+
+Timeout отсчитывается в воркере с начала выполнения задачи (SIGALRM): просроченная задача
+прерывается исключением, воркер и чужие задачи живут дальше. Пул пересоздаётся только если
+задача не прервалась и за POOL_KILL_GRACE (застряла в C-коде).
+"""
+import os, signal, asyncio, threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+POOL_KILL_GRACE = float(os.getenv("POOL_KILL_GRACE", "10"))  # сек. сверх timeout до пересоздания пула
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+def pool_size() -> int:
+    return int(os.getenv("SCRAPER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Семафор потоковый, а не asyncio: пул делят event loop'ы разных потоков
+_slots = threading.BoundedSemaphore(int(os.getenv("SCRAPER_QUEUE", str(pool_size()))))
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=pool_size())
+        return _pool
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _recycle(pool: ProcessPoolExecutor) -> None:
+    """Убить процессы пула и отцепить его: следующий вызов get_pool() создаст новый.
+
+    Крайняя мера для задачи, не прервавшейся по SIGALRM: иначе она навсегда занимает воркер и слот.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    procs = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in procs:
+        p.terminate()
+
+def _expired(signum, frame):
+    raise TimeoutError("scraper task timed out")
+
+def _call(fn, args: tuple, timeout: float | None):
+    """Выполняется в воркере: fn(*args) с таймером от начала выполнения."""
+    if not timeout or not hasattr(signal, "setitimer"):
+        return fn(*args)
+    previous = signal.signal(signal.SIGALRM, _expired)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+async def _acquire_slot(timeout: float | None) -> bool:
+    acquire = asyncio.ensure_future(asyncio.to_thread(_slots.acquire, True, timeout))
+    try:
+        return await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # Поток всё равно дождётся слота — вернуть его, раз задача уже не нужна
+        acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or not f.result() or _slots.release())
+        raise
+
+async def run_in_pool(fn, *args, timeout: float | None = None):
+    """Выполнить fn(*args) в пуле процессов; fn и аргументы должны быть picklable.
+
+    По timeout (с начала выполнения в воркере) вызывающий получает asyncio.TimeoutError.
+    Ожидание слота тоже ограничено timeout. Задачи, попавшие под пересоздание пула
+    (BrokenProcessPool), повторяются один раз.
+    """
+    for attempt in (1, 2):
+        if not await _acquire_slot(timeout):
+            raise asyncio.TimeoutError("scraper pool queue is full")
+        pool = get_pool()
+        try:
+            fut = pool.submit(_call, fn, args, timeout)
+        except (BrokenProcessPool, RuntimeError):
+            # Пул сломан (упал воркер) или только что снят другим вызовом
+            _slots.release()
+            _recycle(pool)
+            if attempt == 2:
+                raise
+            continue
+        except Exception:
+            _slots.release()
+            raise
+        fut.add_done_callback(lambda _f: _slots.release())
+        hard_limit = None if timeout is None else timeout + POOL_KILL_GRACE
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), hard_limit)
+        except (TimeoutError, asyncio.TimeoutError) as e:
+            if not fut.done():
+                # Таймер в воркере не сработал (задача в C-коде) — остаётся только убить пул
+                await asyncio.to_thread(_recycle, pool)
+            raise asyncio.TimeoutError(str(e) or "scraper task timed out") from e
+        except BrokenProcessPool:
+            await asyncio.to_thread(_recycle, pool)
+            if attempt == 2:
+                raise
@@ -0,0 +1,77 @@
+"""
+Сравнение экстракторов очистки HTML на корпусе сохранённых снапшотов.
+
+    python -m scripts.bench_clean --dir data/snapshots
+    python -m scripts.bench_clean --dir data/snapshots --extractors lxml,readability --repeat 3
+
+Для каждого экстрактора: число страниц, МБ/с, страниц/с, средняя и медианная длина текста.
+"""
+import argparse, glob, os, statistics, time
+from packages.scraper import clean
+
+def _extractors() -> dict:
+    ex = {
+        "lxml": lambda html: clean.extract_lxml(html)[0],
+        "readability": clean.extract_readability,
+        "pipeline": lambda html: clean.clean_html(html)["text"],
+    }
+    if clean.HTMLParser is not None:
+        ex["selectolax"] = lambda html: clean.extract_selectolax(html)[0]
+    return ex
+
+def load_corpus(directory: str, limit: int | None = None) -> list[str]:
+    paths = sorted(glob.glob(os.path.join(directory, "*.html")))[:limit]
+    corpus = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            corpus.append(f.read())
+    return corpus
+
+def bench(fn, corpus: list[str], repeat: int = 1) -> dict:
+    lengths, best = [], None
+    for _ in range(repeat):
+        lengths = []
+        t0 = time.perf_counter()
+        for html in corpus:
+            try:
+                lengths.append(len(fn(html)))
+            except Exception:
+                lengths.append(0)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    size_mb = sum(len(h.encode("utf-8", "ignore")) for h in corpus) / 1024 / 1024
+    return {
+        "pages": len(corpus),
+        "seconds": best,
+        "mb_per_s": size_mb / best if best else 0.0,
+        "pages_per_s": len(corpus) / best if best else 0.0,
+        "avg_chars": statistics.mean(lengths) if lengths else 0,
+        "median_chars": statistics.median(lengths) if lengths else 0,
+        "empty": sum(1 for n in lengths if n == 0),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dir", default=os.getenv("SNAP_DIR", "data/snapshots"))
+    ap.add_argument("--extractors", default="", help="через запятую; по умолчанию все доступные")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+
+    corpus = load_corpus(args.dir, args.limit)
+    if not corpus:
+        raise SystemExit(f"No *.html snapshots in {args.dir}")
+    available = _extractors()
+    names = [n.strip() for n in args.extractors.split(",") if n.strip()] or list(available)
+
+    print(f"{'extractor':<12} {'pages':>6} {'sec':>8} {'MB/s':>8} {'pages/s':>9} {'avg chars':>10} {'median':>8} {'empty':>6}")
+    for name in names:
+        if name not in available:
+            print(f"{name:<12} (недоступен)")
+            continue
+        r = bench(available[name], corpus, args.repeat)
+        print(f"{name:<12} {r['pages']:>6} {r['seconds']:>8.2f} {r['mb_per_s']:>8.2f} {r['pages_per_s']:>9.1f} "
+              f"{r['avg_chars']:>10.0f} {r['median_chars']:>8.0f} {r['empty']:>6}")
+
+if __name__ == "__main__":
+    main()
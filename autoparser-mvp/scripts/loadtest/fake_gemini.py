@@ -0,0 +1,81 @@
+"""
+Локальный fake Gemini (Developer API generateContent) для нагрузочных прогонов.
+
+Отдаёт schema-valid JSON для E1..E7 (benchmarks/fixtures/stage_outputs.json),
+этап определяется по заголовку промпта «КАРТОЧКА МЕРЫ _ ЭN» (он же в промпте
+исправления полей Repair_Fields — такие запросы считаются в /stats как EN_repair).
+На проверку релевантности (Relevance_Check, RELEVANCE_LLM=1) отвечает «это мера» — RELEVANCE.
+Настраиваются задержка, доля ошибок 500 и доля 429.
+
+    python -m scripts.loadtest.fake_gemini --port 8090 --latency-ms 800 --jitter-ms 400 --error-rate 0.02 --rate-429 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8090 GEMINI_API_KEY=fake ...
+"""
+import argparse, asyncio, json, os, random, re, threading
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+FIXTURES = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../benchmarks/fixtures/stage_outputs.json"))
+STAGE_RE = re.compile(r"КАРТОЧКА МЕРЫ _ Э(\d)")
+RELEVANCE_MARK = "ПРОВЕРКА РЕЛЕВАНТНОСТИ"
+
+def create_app(latency_ms: int = 500, jitter_ms: int = 0, error_rate: float = 0.0, rate_429: float = 0.0,
+               seed: int | None = None) -> FastAPI:
+    with open(FIXTURES, "r", encoding="utf-8") as f:
+        outputs = json.load(f)
+    rnd = random.Random(seed)
+    stats = Counter()
+    lock = threading.Lock()
+    app = FastAPI(title="Fake Gemini")
+
+    def _error(code: int, status: str, message: str) -> JSONResponse:
+        return JSONResponse({"error": {"code": code, "status": status, "message": message}}, status_code=code)
+
+    @app.post("/{version}/models/{model_action}")
+    async def generate(version: str, model_action: str, request: Request):
+        body = await request.json()
+        prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+        m = STAGE_RE.search(prompt)
+        stage = f"E{m.group(1)}" if m else ("RELEVANCE" if RELEVANCE_MARK in prompt else "E1")
+        with lock:
+            roll = rnd.random()
+            delay = max(0, latency_ms + rnd.randint(-jitter_ms, jitter_ms)) / 1000 if jitter_ms else latency_ms / 1000
+        await asyncio.sleep(delay)
+        if roll < rate_429:
+            stats["429"] += 1
+            return _error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (fake)")
+        if roll < rate_429 + error_rate:
+            stats["500"] += 1
+            return _error(500, "INTERNAL", "Internal error (fake)")
+        stats[f"{stage}_repair" if "исправление полей" in prompt else stage] += 1
+        answer = {"is_measure": True, "reason": "fake"} if stage == "RELEVANCE" else outputs.get(stage, {})
+        text = json.dumps(answer, ensure_ascii=False)
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4,
+                              "totalTokenCount": (len(prompt) + len(text)) // 4},
+            "modelVersion": model_action.split(":")[0],
+        }
+
+    @app.get("/stats")
+    def get_stats():
+        return dict(stats)
+
+    return app
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--latency-ms", type=int, default=500)
+    ap.add_argument("--jitter-ms", type=int, default=0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Статический HTTP-сервер с записанными страницами официальных сайтов.
+
+    python -m scripts.loadtest.site_server --port 8091 --dir benchmarks/fixtures/snapshots
+
+Сервер многопоточный; --delay-ms имитирует медленный хост.
+"""
+import argparse, functools, os, time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+DEFAULT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../benchmarks/fixtures/snapshots"))
+
+class SiteHandler(SimpleHTTPRequestHandler):
+    delay = 0.0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+def page_urls(base_url: str, directory: str = DEFAULT_DIR) -> list[str]:
+    names = sorted(n for n in os.listdir(directory) if n.endswith((".html", ".htm", ".pdf", ".docx")))
+    return [f"{base_url.rstrip('/')}/{n}" for n in names]
+
+def serve(port: int, directory: str = DEFAULT_DIR, delay_ms: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    handler = type("Handler", (SiteHandler,), {"delay": delay_ms / 1000})
+    return ThreadingHTTPServer((host, port), functools.partial(handler, directory=directory))
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8091)
+    ap.add_argument("--dir", default=DEFAULT_DIR)
+    ap.add_argument("--delay-ms", type=int, default=0)
+    args = ap.parse_args()
+    httpd = serve(args.port, args.dir, args.delay_ms, args.host)
+    print(f"Serving {args.dir} on http://{args.host}:{args.port}/")
+    httpd.serve_forever()
+
+if __name__ == "__main__":
+    main()
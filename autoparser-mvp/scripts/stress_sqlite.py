@@ -0,0 +1,177 @@
+"""
+Стресс-тест SQLite в режиме single-exe: параллельные запуски конвейера + опрос API, как в админке.
+
+    python -m scripts.stress_sqlite --runs 4 --sources 6 --pollers 4
+    python -m scripts.stress_sqlite --baseline     # без WAL/очереди писателя — для сравнения
+
+Поиск, FETCH и Gemini подменяются офлайн-заглушками (короткие задержки), всё
+остальное — настоящий код: StepRecorder, id_builder, эндпоинты FastAPI.
+Отчёт: ошибки "database is locked", p50/p95 задержки записей шагов и опроса API
+(без нагрузки и во время запусков).
+Код выхода 1, если были ошибки блокировки или запуск не дошёл до done.
+"""
+import argparse, asyncio, json, os, random, sys, tempfile, threading, time
+from collections import Counter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def _configure(args) -> str:
+    # До импорта packages.*: настройки БД читаются при импорте db.py
+    tmp = tempfile.mkdtemp(prefix="autoparser-stress-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/stress.db"
+    os.environ["SNAP_DIR"] = os.path.join(tmp, "snapshots")
+    os.environ["PIPELINE_WORKERS"] = str(args.pipeline_workers)
+    os.environ["CRAWL_MAX_DEPTH"] = "0"
+    if args.baseline:
+        os.environ.update({"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL",
+                           "SQLITE_BUSY_TIMEOUT_MS": "0", "SQLITE_SINGLE_WRITER": "0"})
+    return tmp
+
+def _install_fakes(engine, tmp: str, args) -> None:
+    from packages.scraper.fetch import Snapshot
+    with open(os.path.join(ROOT, "benchmarks/fixtures/stage_outputs.json"), "r", encoding="utf-8") as f:
+        outputs = json.load(f)
+    os.makedirs(os.environ["SNAP_DIR"], exist_ok=True)
+    sentence = "Субсидия на возмещение части затрат субъектам МСП. "
+
+    def page(url):
+        # Текст у каждого источника свой: иначе DEDUP приклеит их к первой карточке и BUILD_ID/SAVE не нагрузятся
+        rnd = random.Random(url)
+        words = " ".join(f"слово{rnd.getrandbits(32):x}" for _ in range(200))
+        return f"<html><body><main><p>{sentence * 10}</p><p>{words}</p></main></body></html>"
+
+    def search(region, max_results=6):
+        return [f"https://stress.example/{region}/{random.getrandbits(48):x}" for _ in range(args.sources)]
+
+    async def fetch(url):
+        await asyncio.sleep(args.fetch_ms / 1000)
+        base = os.path.join(os.environ["SNAP_DIR"], url.rsplit("/", 1)[1])
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(page(url))
+        return Snapshot(url=url, path_html=base + ".html", path_txt=base + ".txt", sha256=url,
+                        http_status=200, charset="utf-8")
+
+    class FakeGemini:
+        def run_stage(self, stage, prompt_name, variables):
+            time.sleep(args.llm_ms / 1000)
+            return outputs[stage]
+
+    engine.search_official_urls = search
+    engine.fetch_and_snapshot = fetch
+    engine._gemini = FakeGemini()
+
+def _poll(client, stop: threading.Event, latencies: list, errors: Counter, interval: float) -> None:
+    while not stop.is_set():
+        resp = _timed_get(client, "/runs", latencies, errors)
+        runs = resp.json() if resp is not None and resp.status_code == 200 else []
+        for r in runs[:2]:
+            for path in (f"/runs/{r['id']}/steps", f"/runs/{r['id']}/timeline", f"/runs/{r['id']}/measures"):
+                _timed_get(client, path, latencies, errors)
+        stop.wait(interval)
+
+def _timed_get(client, path: str, latencies: list, errors: Counter):
+    t0 = time.perf_counter()
+    resp = None
+    try:
+        resp = client.get(path)
+        if resp.status_code >= 500:
+            errors["api_" + str(resp.status_code)] += 1
+    except Exception as e:
+        errors[_error_kind(e)] += 1
+    latencies.append((time.perf_counter() - t0) * 1000)
+    return resp
+
+def _error_kind(e: Exception) -> str:
+    return "database is locked" if "database is locked" in str(e) else type(e).__name__
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=4, help="параллельных запусков")
+    ap.add_argument("--sources", type=int, default=6, help="источников на запуск")
+    ap.add_argument("--pipeline-workers", type=int, default=3)
+    ap.add_argument("--pollers", type=int, default=4, help="потоков, опрашивающих API")
+    ap.add_argument("--poll-ms", type=int, default=50)
+    ap.add_argument("--llm-ms", type=int, default=20)
+    ap.add_argument("--fetch-ms", type=int, default=20)
+    ap.add_argument("--baseline", action="store_true", help="без WAL, busy_timeout и очереди писателя")
+    args = ap.parse_args()
+
+    tmp = _configure(args)
+    sys.path.insert(0, ROOT)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    from packages.persistence import db as dbmod
+    from packages.persistence.models import Run, Step, Measure
+    from packages.pipeline import engine
+    from packages.pipeline.executors import ThreadExecutor
+    from apps.api.main import app
+    from scripts.loadtest.driver import percentile
+
+    dbmod.init_db()
+    _install_fakes(engine, tmp, args)
+
+    # Задержки записей: оборачиваем run_write, через который пишет StepRecorder
+    write_ms: list[float] = []
+    write_errors: Counter = Counter()
+    real_write = engine.run_write
+    def timed_write(fn):
+        t0 = time.perf_counter()
+        try:
+            return real_write(fn)
+        except Exception as e:
+            write_errors[_error_kind(e)] += 1
+            raise
+        finally:
+            write_ms.append((time.perf_counter() - t0) * 1000)
+    engine.run_write = timed_write
+
+    stop = threading.Event()
+    poll_ms: list[float] = []
+    poll_errors: Counter = Counter()
+    # Один event loop на всё время теста (как у uvicorn): пул async-соединений API привязан к нему
+    with TestClient(app) as client:
+        # Опрос без нагрузки — базовая линия: под записью задержки API не должны заметно расти
+        idle_ms: list[float] = []
+        for _ in range(50):
+            _timed_get(client, "/runs", idle_ms, poll_errors)
+        pollers = [threading.Thread(target=_poll, args=(client, stop, poll_ms, poll_errors, args.poll_ms / 1000),
+                                    daemon=True) for _ in range(args.pollers)]
+        for p in pollers:
+            p.start()
+
+        t0 = time.monotonic()
+        run_ids: list[int] = []
+        def one_run():
+            run_ids.append(engine.start_run("92", ThreadExecutor(args.pipeline_workers)))
+        runners = [threading.Thread(target=one_run) for _ in range(args.runs)]
+        for t in runners:
+            t.start()
+        for t in runners:
+            t.join()
+        wall = time.monotonic() - t0
+        stop.set()
+        for p in pollers:
+            p.join()
+
+    with dbmod.SessionLocal() as s:
+        runs = s.query(Run).filter(Run.id.in_(run_ids)).all()
+        steps = Counter(st.status for st in s.query(Step).filter(Step.run_id.in_(run_ids)))
+        measures = s.query(Measure).count()
+        journal = s.execute(text("PRAGMA journal_mode")).scalar()
+
+    locked = write_errors["database is locked"] + poll_errors["database is locked"]
+    print(f"profile={'baseline' if args.baseline else 'tuned'} journal={journal} db={tmp}/stress.db")
+    print(f"runs={len(runs)} statuses={Counter(r.status for r in runs)} wall={wall:.1f}s")
+    print(f"sources: processed={sum(r.processed or 0 for r in runs)} ok={sum(r.ok or 0 for r in runs)} "
+          f"errors={sum(r.errors or 0 for r in runs)}; measures={measures}; steps={dict(steps)}")
+    print(f"writes: n={len(write_ms)} p50={percentile(write_ms, 50):.1f}ms p95={percentile(write_ms, 95):.1f}ms "
+          f"errors={dict(write_errors)}")
+    print(f"idle:   n={len(idle_ms)} p50={percentile(idle_ms, 50):.1f}ms p95={percentile(idle_ms, 95):.1f}ms")
+    print(f"polls:  n={len(poll_ms)} p50={percentile(poll_ms, 50):.1f}ms p95={percentile(poll_ms, 95):.1f}ms "
+          f"errors={dict(poll_errors)}")
+    failed = locked or any(r.status != "done" for r in runs) or len(runs) != args.runs
+    print("FAIL" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Обучение фильтра релевантности (этап FILTER) на истории запусков.
+
+Разметка берётся из шагов: источник с SAVE ok или DEDUP-копией — мера (1);
+источник, по которому SAVE пропущен из-за невалидных E1/E4 (модель ответила,
+но меры не нашла), и отказ FILTER, подтверждённый LLM, — не мера (0). Пропуск SAVE
+из-за ошибки E1/E4 (сбой сети, 429) ничего не говорит о тексте и не размечается. Текст — очищенный снапшот источника.
+Ручная разметка дополняет историю: JSONL со строками {"text" | "path", "label": 0|1}.
+
+    python -m scripts.train_relevance                       # метрики, веса не пишутся
+    python -m scripts.train_relevance --labels labels.jsonl --write
+"""
+import argparse, json, os
+from sqlalchemy import select
+from packages.persistence.db import session_scope, init_db
+from packages.persistence.models import Step, Snapshot
+from packages.agents import relevance
+
+def history_labels() -> dict[int, int]:
+    """{source_id: метка} по последнему решающему шагу источника."""
+    labels: dict[int, int] = {}
+    required: dict[int, dict[str, str]] = {}  # последние статусы E1/E4 источника
+    with session_scope() as db:
+        rows = db.execute(select(Step.source_id, Step.stage, Step.status, Step.payload)
+                          .where(Step.source_id.is_not(None), Step.stage.in_(("E1", "E4", "SAVE", "DEDUP", "FILTER")))
+                          .order_by(Step.id)).all()
+    for source_id, stage, status, payload in rows:
+        payload = payload or {}
+        if stage in ("E1", "E4"):
+            required.setdefault(source_id, {})[stage] = status
+        elif stage == "SAVE" and status == "ok":
+            labels[source_id] = 1
+        elif stage == "SAVE" and status == "skipped":
+            # Не мера — только если модель ответила, но E1/E4 невалидны; ошибка (сбой, 429) — не разметка
+            missing = [s for s in required.get(source_id, {}).values() if s != "ok"]
+            if missing and all(s == "invalid" for s in missing):
+                labels[source_id] = 0
+        elif stage == "DEDUP" and status == "ok" and payload.get("duplicate_of"):
+            labels[source_id] = 1
+        elif stage == "FILTER" and status == "filtered" and (payload.get("llm") or {}).get("is_measure") is False:
+            labels[source_id] = 0
+    return labels
+
+def history_samples() -> list[tuple[str, int]]:
+    labels = history_labels()
+    with session_scope() as db:
+        paths = dict(db.execute(select(Snapshot.source_id, Snapshot.path_txt)
+                                .where(Snapshot.source_id.in_(list(labels)))
+                                .order_by(Snapshot.id)).all())  # последний снапшот источника
+    return [(_read(paths[sid]), y) for sid, y in labels.items() if paths.get(sid) and os.path.exists(paths[sid])]
+
+def file_samples(path: str) -> list[tuple[str, int]]:
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                out.append((row.get("text") or _read(row["path"]), int(row["label"])))
+    return out
+
+def _read(path: str) -> str:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--labels", action="append", default=[], help="JSONL с ручной разметкой (можно несколько)")
+    ap.add_argument("--no-history", action="store_true", help="только ручная разметка, без шагов из БД")
+    ap.add_argument("--recall", type=float, default=0.98, help="доля мер, которую порог обязан пропускать")
+    ap.add_argument("--min-df", type=int, default=3)
+    ap.add_argument("--max-features", type=int, default=2000)
+    ap.add_argument("--epochs", type=int, default=30)
+    ap.add_argument("--out", default=relevance.RELEVANCE_WEIGHTS)
+    ap.add_argument("--write", action="store_true", help="записать веса в --out")
+    args = ap.parse_args()
+
+    samples = []
+    if not args.no_history:
+        init_db()
+        samples += history_samples()
+    for path in args.labels:
+        samples += file_samples(path)
+    n_pos = sum(y for _t, y in samples)
+    print(f"samples: {len(samples)} (measures={n_pos}, other={len(samples) - n_pos})")
+    if not n_pos or n_pos == len(samples):
+        raise SystemExit("нужны примеры обоих классов")
+    model, metrics = relevance.train(samples, min_df=args.min_df, max_features=args.max_features,
+                                     epochs=args.epochs, recall=args.recall)
+    print("holdout:", json.dumps(metrics, ensure_ascii=False))
+    top = sorted(model["weights"].items(), key=lambda kv: kv[1])
+    print("не мера:", ", ".join(k for k, _w in top[:15]))
+    print("мера:   ", ", ".join(k for k, _w in top[-15:][::-1]))
+    if args.write:
+        relevance.save_model(model, args.out)
+        print(f"weights -> {args.out}")
+
+if __name__ == "__main__":
+    main()
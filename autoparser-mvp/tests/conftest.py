@@ -0,0 +1,125 @@
+"""
+Общие фикстуры тестов. Всё офлайн: временная SQLite, локальный статический сайт
+на http.server (порт выбирает ОС).
+"""
+import os, sys, tempfile, threading, time, functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# До импорта packages.persistence.db: тесты никогда не пишут в рабочую БД
+_tmp = tempfile.mkdtemp(prefix="autoparser-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["SNAP_DIR"] = os.path.join(_tmp, "snapshots")
+
+class _SiteHandler(SimpleHTTPRequestHandler):
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map, ".php": "application/pdf"}
+    delay = 0.0
+    head_status: int | None = None  # ответ на HEAD вместо обычного (403/405 — HEAD не поддержан)
+    send_length = True  # False — без Content-Length, тело до закрытия соединения
+    log: list = []
+    state: dict = {}
+
+    def do_HEAD(self):
+        if self.head_status:
+            self.send_error(self.head_status)
+            return
+        super().do_HEAD()
+
+    def send_header(self, keyword, value):
+        if self.send_length or keyword.lower() != "content-length":
+            super().send_header(keyword, value)
+
+    def do_GET(self):
+        with self.state["lock"]:
+            self.state["inflight"] += 1
+            self.state["max_inflight"] = max(self.state["max_inflight"], self.state["inflight"])
+            self.log.append((time.monotonic(), self.path))
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            super().do_GET()
+        finally:
+            with self.state["lock"]:
+                self.state["inflight"] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+class Site:
+    """Локальный сайт: pages — {путь: содержимое}; log — [(время, путь запроса)]."""
+
+    def __init__(self, root: str, pages: dict[str, str | bytes], delay: float = 0.0, **handler_options):
+        for path, body in pages.items():
+            full = os.path.join(root, path.lstrip("/"))
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "wb") as f:
+                f.write(body.encode("utf-8") if isinstance(body, str) else body)
+        self.log: list = []
+        self.state = {"lock": threading.Lock(), "inflight": 0, "max_inflight": 0}
+        handler = type("Handler", (_SiteHandler,), {"delay": delay, "log": self.log, "state": self.state, **handler_options})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=root))
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def paths(self) -> list[str]:
+        return [p for _t, p in self.log]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def make_site(tmp_path):
+    sites = []
+    def make(pages: dict, delay: float = 0.0, **handler_options) -> Site:
+        site = Site(str(tmp_path / f"site{len(sites)}"), pages, delay, **handler_options)
+        sites.append(site)
+        return site
+    yield make
+    for site in sites:
+        site.close()
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+PAGE = "<html><body><main><p>{}</p></main></body></html>"
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    """Конвейер без сети: страницы — из словаря texts, LLM — ответы этапов из fixtures; fail — этапы, падающие с ошибкой.
+
+    DEDUP и FILTER выключены: тесты, которым они нужны, включают их сами.
+    """
+    import asyncio, json
+    from packages.pipeline import engine
+    from packages.persistence.db import init_db
+    from packages.scraper.fetch import Snapshot
+    init_db()
+    with open(os.path.join(FIXTURES, "stage_outputs.json"), "r", encoding="utf-8") as f:
+        outputs = json.load(f)
+    state = {"texts": {}, "fail": set(), "calls": [], "fetches": [], "outputs": outputs}
+
+    async def fetch(url):
+        state["fetches"].append(url)
+        base = str(tmp_path / f"{abs(hash(url)):x}")
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(PAGE.format(state["texts"][url]))
+        return Snapshot(url=url, path_html=base + ".html", path_txt=base + ".txt", sha256=url,
+                        http_status=200, charset="utf-8")
+
+    class FakeGemini:
+        def run_stage(self, stage, prompt_name, variables):
+            state["calls"].append(stage)
+            if stage in state["fail"]:
+                raise RuntimeError("gemini down")
+            return outputs[stage]
+
+    monkeypatch.setattr(engine, "search_official_urls", lambda region, max_results=6: list(state["texts"]))
+    monkeypatch.setattr(engine, "discover_documents", lambda urls: asyncio.sleep(0, result=[]))
+    monkeypatch.setattr(engine, "fetch_and_snapshot", fetch)
+    monkeypatch.setattr(engine, "_gemini", FakeGemini())
+    monkeypatch.setattr(engine.dedup_index, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(engine.relevance, "RELEVANCE_ENABLED", False)
+    return state
@@ -0,0 +1,128 @@
+import asyncio, time
+from packages.scraper import crawl as crawl_module
+from packages.scraper.crawl import (CrawlConfig, CrawlFrontier, HostLimiter, crawl, crawl_key, discover_documents,
+                                    extract_links)
+
+PDF = b"%PDF-1.4\n%fake\n"
+
+def _config(**kw) -> CrawlConfig:
+    return CrawlConfig(**{"max_depth": 1, "per_host_delay": 0.0, "timeout": 5.0, "concurrency": 4, **kw})
+
+def _site_pages() -> dict:
+    return {
+        "index.html": """<html><body>
+            <a href="/files/polozhenie.pdf">Положение о субсидии</a>
+            <a href="/files/polozhenie.pdf#page=2">то же, страница 2</a>
+            <a href="/download.php?id=17">Порядок</a>
+            <a href="/download.php?id=18">Приложение</a>
+            <a href="/docs/page.html">Документы</a>
+            <a href="https://example.com/other.pdf">чужой сайт</a>
+            <a href="/private/secret.pdf">закрыто</a>
+            <a href="/private/page.html">закрыто</a>
+        </body></html>""",
+        "docs/page.html": '<html><body><a href="/files/deep.pdf">Постановление</a></body></html>',
+        "private/page.html": '<html><body><a href="/files/hidden.pdf">x</a></body></html>',
+        "files/polozhenie.pdf": PDF, "files/deep.pdf": PDF, "files/hidden.pdf": PDF,
+        "private/secret.pdf": PDF, "download.php": PDF,
+        "robots.txt": "User-agent: *\nDisallow: /private/\n",
+    }
+
+def test_extract_links_keeps_scheme_and_query():
+    links = extract_links('<a href="/a.pdf#x">A</a><a href="/a.pdf">A2</a><a href="/d.php?id=1">B</a>'
+                          '<a href="/d.php?id=2">C</a><a href="mailto:x@y.ru">m</a>', "http://h.gov.ru/dir/")
+    assert links == [("http://h.gov.ru/a.pdf", "A"), ("http://h.gov.ru/d.php?id=1", "B"),
+                     ("http://h.gov.ru/d.php?id=2", "C")]
+    assert crawl_key("http://H.gov.ru/d.php?id=1") == crawl_key("https://h.gov.ru/d.php?id=1") != crawl_key("https://h.gov.ru/d.php?id=2")
+
+def test_discover_documents_on_local_http_site(make_site):
+    site = make_site(_site_pages())
+    docs = asyncio.run(discover_documents([f"{site.url}/index.html"], _config()))
+    assert sorted(docs) == sorted([f"{site.url}/files/polozhenie.pdf", f"{site.url}/download.php?id=17",
+                                   f"{site.url}/download.php?id=18"])
+
+def test_depth_limit(make_site):
+    site = make_site(_site_pages())
+    results = asyncio.run(crawl([f"{site.url}/index.html"], _config(max_depth=2)))
+    by_url = {r.url: r for r in results}
+    assert by_url[f"{site.url}/files/deep.pdf"].depth == 2
+    assert by_url[f"{site.url}/files/deep.pdf"].parent == f"{site.url}/docs/page.html"
+    shallow = asyncio.run(crawl([f"{site.url}/index.html"], _config(max_depth=1)))
+    assert f"{site.url}/files/deep.pdf" not in {r.url for r in shallow}
+
+def test_page_and_document_budgets(make_site):
+    site = make_site(_site_pages())
+    results = asyncio.run(crawl([f"{site.url}/index.html"], _config(max_pages=1, max_docs=1)))
+    assert [r.url for r in results if not r.is_document] == [f"{site.url}/index.html"]
+    assert sum(r.is_document for r in results) == 1
+    assert "/docs/page.html" not in site.paths
+
+def test_robots_disallow_applies_to_pages_and_documents(make_site):
+    site = make_site(_site_pages())
+    results = asyncio.run(crawl([f"{site.url}/index.html"], _config(max_depth=2)))
+    urls = {r.url for r in results}
+    assert f"{site.url}/private/secret.pdf" not in urls
+    assert f"{site.url}/private/page.html" not in urls
+    assert f"{site.url}/files/hidden.pdf" not in urls
+    assert not any(p.startswith("/private/") for p in site.paths)
+    assert site.paths.count("/robots.txt") == 1
+
+def test_per_host_concurrency_limit(make_site):
+    pages = {"index.html": "".join(f'<a href="/p{i}.html">p{i}</a>' for i in range(6))}
+    pages.update({f"p{i}.html": "<html><body>x</body></html>" for i in range(6)})
+    site = make_site(pages, delay=0.05)
+    asyncio.run(crawl([f"{site.url}/index.html"], _config(concurrency=6, per_host_concurrency=1)))
+    assert len([p for p in site.paths if p.startswith("/p")]) == 6
+    assert site.state["max_inflight"] == 1
+
+def test_host_limiter_delay():
+    limiter = HostLimiter(concurrency=4, delay=0.05)
+    starts = []
+
+    async def hit():
+        async with limiter.slot("h"):
+            starts.append(time.monotonic())
+
+    async def main():
+        await asyncio.gather(*(hit() for _ in range(4)))
+    asyncio.run(main())
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert all(g >= 0.045 for g in gaps)
+
+def test_unsupported_documents_are_not_fetched(make_site):
+    site = make_site({"index.html": '<a href="/old.doc">doc</a><a href="/old.rtf">rtf</a><a href="/scan.jpg">jpg</a>'
+                                    '<a href="/new.docx">docx</a>',
+                      "old.doc": b"\xd0\xcf\x11\xe0", "old.rtf": "{\\rtf1}", "scan.jpg": b"\xff\xd8", "new.docx": b"PK"})
+    docs = asyncio.run(discover_documents([f"{site.url}/index.html"], _config()))
+    assert docs == [f"{site.url}/new.docx"]
+    assert not any(p.endswith((".doc", ".rtf", ".jpg")) for p in site.paths)
+
+def test_relative_links_resolve_against_redirect_target(make_site):
+    # /support → 301 /support/: "rules.pdf" на странице — это /support/rules.pdf
+    site = make_site({"support/index.html": '<a href="rules.pdf">Правила</a>', "support/rules.pdf": PDF})
+    docs = asyncio.run(discover_documents([f"{site.url}/support"], _config()))
+    assert docs == [f"{site.url}/support/rules.pdf"]
+
+def test_worker_survives_unexpected_errors(make_site, monkeypatch):
+    site = make_site(_site_pages())
+    real = crawl_module.extract_links
+    calls = []
+
+    def flaky(body, base):
+        calls.append(base)
+        if len(calls) == 1:
+            raise UnicodeError("bad href")
+        return real(body, base)
+    monkeypatch.setattr(crawl_module, "extract_links", flaky)
+    seeds = [f"{site.url}/index.html", f"{site.url}/docs/page.html"]
+    results = asyncio.run(asyncio.wait_for(crawl(seeds, _config(concurrency=1)), 10))
+    assert len(calls) == 2 and {r.url for r in results} >= set(seeds)
+
+def test_crawl_deadline_returns_partial_results(make_site):
+    pages = {"index.html": "".join(f'<a href="/p{i}.html">p{i}</a>' for i in range(20))}
+    pages.update({f"p{i}.html": "<html><body>x</body></html>" for i in range(20)})
+    site = make_site(pages, delay=0.1)
+    frontier = CrawlFrontier(_config(concurrency=1, deadline=0.5))
+    started = time.monotonic()
+    results = asyncio.run(frontier.run([f"{site.url}/index.html"]))
+    assert frontier.timed_out and time.monotonic() - started < 3
+    assert 0 < len(results) < 21
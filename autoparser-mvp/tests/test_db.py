@@ -0,0 +1,65 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import create_engine, event, text
+from packages.pipeline.engine import recorder
+from packages.persistence import db as dbmod
+from packages.persistence.db import Base, init_db, run_write, session_scope
+from packages.persistence.models import Run
+
+@pytest.fixture(autouse=True)
+def _db():
+    init_db()
+
+def _counters(run_id: int) -> tuple:
+    with session_scope() as db:
+        return db.query(Run.ok, Run.filtered, Run.queued).filter(Run.id == run_id).one()
+
+def test_concurrent_writers_are_serialized():
+    run_id = run_write(lambda db: (db.add(run := Run(region="92")), db.flush(), run.id)[-1])
+    writers, errors = set(), []
+
+    def bump(i: int) -> None:
+        def write(db):
+            writers.add(threading.current_thread().name)
+            db.execute(text("UPDATE runs SET ok = ok + 1 WHERE id = :id"), {"id": run_id})
+        try:
+            run_write(write)
+            recorder.bump(run_id, filtered=1)
+            with session_scope() as db:  # чтения идут параллельно с очередью записи
+                db.get(Run, run_id)
+        except Exception as e:  # "database is locked" и прочее — в список, а не в поток пула
+            errors.append(e)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(bump, range(200)))
+    assert errors == []
+    assert writers == {"sqlite-writer"}
+    assert tuple(_counters(run_id)) == (200, 200, 0)
+
+def test_nested_write_runs_inline():
+    # run_write из самого писателя не встаёт в свою же очередь (иначе взаимоблокировка)
+    assert run_write(lambda db: run_write(lambda inner: threading.current_thread().name)) == "sqlite-writer"
+
+def test_missing_counters_are_added_with_default(tmp_path, monkeypatch):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", future=True)
+    event.listen(legacy, "connect", dbmod.apply_sqlite_pragmas)
+    with legacy.begin() as conn:
+        conn.execute(text("CREATE TABLE runs (id INTEGER PRIMARY KEY, region TEXT, started_at DATETIME, "
+                          "status TEXT, found INTEGER, processed INTEGER, ok INTEGER, errors INTEGER)"))
+        conn.execute(text("INSERT INTO runs (id, region, status, ok) VALUES (1, '92', 'done', 3)"))
+    Base.metadata.create_all(bind=legacy)  # остальные таблицы; существующую runs не трогает
+    monkeypatch.setattr(dbmod, "engine", legacy)
+    dbmod._add_missing_columns()
+    with legacy.begin() as conn:
+        row = conn.execute(text("SELECT filtered, queued, cancel_requested, heartbeat_at FROM runs")).one()
+        assert tuple(row) == (0, 0, 0, None)  # у datetime-колонки нет скалярного дефолта
+        conn.execute(text("UPDATE runs SET filtered = filtered + 1"))
+        assert conn.execute(text("SELECT filtered FROM runs")).scalar() == 1
+
+def test_bump_counts_from_null():
+    # Строки, получившие колонку NULL'ом при старой миграции без DEFAULT
+    run_id = run_write(lambda db: (db.add(run := Run(region="92")), db.flush(), run.id)[-1])
+    run_write(lambda db: db.execute(text("UPDATE runs SET filtered = NULL, queued = NULL WHERE id = :id"), {"id": run_id}))
+    recorder.bump(run_id, filtered=1, queued=2)
+    assert tuple(_counters(run_id))[1:] == (1, 2)
@@ -0,0 +1,97 @@
+import random
+import pytest
+from packages.pipeline import engine
+from packages.pipeline.executors import InlineExecutor, ThreadExecutor
+from packages.persistence import dedup_index
+from packages.persistence.db import init_db, run_write, session_scope
+from packages.persistence.models import Measure, Run, Snapshot, Source, Step
+
+@pytest.fixture(autouse=True)
+def _db():
+    init_db()
+
+def _text(seed: int, n: int = 400) -> list[str]:
+    rnd = random.Random(seed)
+    return [f"мера{rnd.randrange(10 ** 6)}" for _ in range(n)]
+
+def _copy(words: list[str], changed: int, seed: int = 0) -> list[str]:
+    # changed слов заменены в разных местах текста: каждое выбивает до SHINGLE шинглов
+    words = list(words)
+    for i in random.Random(seed).sample(range(len(words)), changed):
+        words[i] = f"правка{i}"
+    return words
+
+def _store(mid: str, text_: str) -> None:
+    sig, n = dedup_index.signature(text_)
+    def write(db):
+        db.merge(Measure(msr_intlid=mid, card={}, region_code="92", prglvl="REG", segmnt="MSP", typeid="DEDUP"))
+        dedup_index.add_signature(db, sig, n, msr_intlid=mid)
+    run_write(write)
+
+def _find(text_: str):
+    with session_scope() as db:
+        return dedup_index.find_duplicate(db, dedup_index.signature(text_)[0])
+
+def _measures() -> int:
+    with session_scope() as db:
+        return db.query(Measure).count()
+
+def test_signature_is_bounded_and_skips_short_texts():
+    words = _text(1, dedup_index.DEDUP_MAX_WORDS * 4)
+    assert dedup_index.signature(" ".join(words)) == dedup_index.signature(" ".join(words[:dedup_index.DEDUP_MAX_WORDS]))
+    assert dedup_index.signature(" ".join(words[:dedup_index.DEDUP_MIN_WORDS - 1])) == (None, 0)
+
+def test_lsh_finds_near_copies_only():
+    base = _text(2)
+    _store("92_REG_MSP_DEDUP_LSH", " ".join(base))
+    assert _find(" ".join(_copy(base, 3)))[0] == "92_REG_MSP_DEDUP_LSH"  # Жаккар ≈ 0.93
+    assert _find(" ".join(_copy(base, 40))) is None  # ≈ 0.4: кандидат LSH, но ниже DEDUP_THRESHOLD
+    assert _find(" ".join(_text(3))) is None
+
+def test_threshold_boundary_is_inclusive(monkeypatch):
+    base = _text(4)
+    _store("92_REG_MSP_DEDUP_EDGE", " ".join(base))
+    copy = " ".join(_copy(base, 12))
+    sim = dedup_index.similarity(dedup_index.signature(" ".join(base))[0], dedup_index.signature(copy)[0])
+    assert 0.42 < sim < 1  # достаточно похожи, чтобы LSH выдал кандидата
+    monkeypatch.setattr(dedup_index, "DEDUP_THRESHOLD", sim)
+    assert _find(copy)[:1] == ("92_REG_MSP_DEDUP_EDGE",) and _find(copy)[2] == sim
+    monkeypatch.setattr(dedup_index, "DEDUP_THRESHOLD", sim + 1 / dedup_index.NUM_PERM)
+    assert _find(copy) is None
+
+@pytest.mark.parametrize("executor", [InlineExecutor, lambda: ThreadExecutor(max_workers=2)])
+def test_copy_is_attached_without_extraction(pipeline, monkeypatch, executor):
+    monkeypatch.setattr(dedup_index, "DEDUP_ENABLED", True)
+    base = _text(5 + (executor is InlineExecutor))
+    original, copy = "https://min.example.ru/measure", "https://mybiz.example.ru/measure"
+    pipeline["texts"][original] = " ".join(base)
+    pipeline["texts"][copy] = "Мой бизнес. " + " ".join(_copy(base, 2))
+    before = _measures()
+    run_id = engine.start_run("92", executor())
+    # Параллельные копии на DEDUP друг друга не видят — вторую ловит проверка под замком в SAVE
+    assert _measures() == before + 1
+    with session_scope() as db:
+        run = db.get(Run, run_id)
+        assert (run.ok, run.errors) == (2, 0)
+        dedup = [s.payload for s in db.query(Step).filter(Step.run_id == run_id, Step.stage == "DEDUP")
+                 if (s.payload or {}).get("duplicate_of")]
+        assert len(dedup) == 1
+        card = db.get(Measure, dedup[0]["duplicate_of"]).card
+    assert sorted(card["provenance"]["source_urls"]) == sorted([original, copy])
+    if executor is InlineExecutor:
+        assert len(pipeline["calls"]) == len(engine.STAGE_MAP)  # копия не прошла E1..E7
+
+def test_backfill_signs_saved_measures(tmp_path):
+    path = tmp_path / "source.txt"
+    path.write_text(" ".join(_text(7)), encoding="utf-8")
+    mid = "92_REG_MSP_DEDUP_BACKFILL"
+    def write(db):
+        run, source = Run(region="92"), Source(url="https://min.example.ru/backfill")
+        db.add_all([run, source])
+        db.flush()
+        db.add(Snapshot(source_id=source.id, path_txt=str(path)))
+        db.add(Step(run_id=run.id, source_id=source.id, stage="SAVE", status="ok", payload={"msr_intlid": mid}))
+        db.merge(Measure(msr_intlid=mid, card={}, region_code="92", prglvl="REG", segmnt="MSP", typeid="DEDUP"))
+    run_write(write)
+    assert dedup_index.backfill() >= 1
+    assert _find(path.read_text(encoding="utf-8"))[0] == mid
@@ -0,0 +1,98 @@
+import asyncio, io, os, zipfile
+import pytest
+from packages.scraper import documents, fetch
+from packages.scraper.documents import DocumentTooLarge, download_to_file, extract_document
+
+def make_pdf(pages: list[str]) -> bytes:
+    """Минимальный PDF: по странице на строку текста (Helvetica, ASCII)."""
+    n = len(pages)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(n)) + b"] /Count %d >>" % n,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (" + text.encode("ascii") + b") Tj ET"
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out, offsets = io.BytesIO(), []
+    out.write(b"%PDF-1.4\n")
+    for num, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % off for off in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+def make_docx(pages: list[list[str]]) -> bytes:
+    """DOCX из абзацев; между страницами — явный разрыв страницы."""
+    w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = []
+    for i, paragraphs in enumerate(pages):
+        if i:
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        body += [f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphs]
+    xml = f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{w}"><w:body>{"".join(body)}</w:body></w:document>'
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("word/document.xml", xml)
+    return buf.getvalue()
+
+PDF_PAGES = ["Subsidy rules page one", "Eligibility criteria page two", "Application form page three"]
+DOCX_PAGES = [["Порядок предоставления субсидии", "1. Общие положения"], ["2. Критерии отбора"]]
+
+def _pages_text(path_txt: str, pages: list[dict]) -> list[str]:
+    with open(path_txt, "r", encoding="utf-8") as f:
+        text = f.read()
+    return [text[p["start"]:p["end"]] for p in pages]
+
+def test_pdf_pages_and_offsets(tmp_path):
+    path = tmp_path / "rules.pdf"
+    path.write_bytes(make_pdf(PDF_PAGES))
+    info = extract_document(str(path), "pdf", str(tmp_path / "rules.txt"))
+    assert [p["page"] for p in info["pages"]] == [1, 2, 3] and not info["truncated"]
+    assert _pages_text(str(tmp_path / "rules.txt"), info["pages"]) == PDF_PAGES
+
+def test_docx_page_breaks_and_offsets(tmp_path):
+    path = tmp_path / "rules.docx"
+    path.write_bytes(make_docx(DOCX_PAGES))
+    info = extract_document(str(path), "docx", str(tmp_path / "rules.txt"))
+    assert _pages_text(str(tmp_path / "rules.txt"), info["pages"]) == ["\n".join(p) for p in DOCX_PAGES]
+
+def test_page_limit_truncates(tmp_path):
+    path = tmp_path / "rules.pdf"
+    path.write_bytes(make_pdf(PDF_PAGES))
+    info = extract_document(str(path), "pdf", str(tmp_path / "rules.txt"), max_pages=2)
+    assert len(info["pages"]) == 2 and info["truncated"]
+
+@pytest.mark.parametrize("send_length", [True, False])
+def test_download_size_cap(make_site, tmp_path, send_length):
+    # С Content-Length отказ сразу по заголовку, без него — по мере чтения потока
+    site = make_site({"big.pdf": b"%PDF" + b"0" * 200_000}, send_length=send_length)
+    dest = str(tmp_path / "big.part")
+    with pytest.raises(DocumentTooLarge):
+        asyncio.run(download_to_file(f"{site.url}/big.pdf", dest, max_bytes=100_000))
+    assert not os.path.exists(dest)
+    meta = asyncio.run(download_to_file(f"{site.url}/big.pdf", dest, max_bytes=300_000))
+    assert meta["size"] == 200_004 and os.path.getsize(dest) == 200_004
+
+def test_fetch_document_end_to_end(make_site, tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch, "SNAP_DIR", str(tmp_path / "snapshots"))
+    site = make_site({"files/rules.pdf": make_pdf(PDF_PAGES), "files/rules.docx": make_docx(DOCX_PAGES)})
+    snap = asyncio.run(fetch.fetch_document(f"{site.url}/files/rules.pdf", "pdf"))
+    assert snap.content_type == "application/pdf" and not snap.needs_cleaning
+    assert _pages_text(snap.path_txt, snap.pages) == PDF_PAGES
+    snap = asyncio.run(fetch.fetch_and_snapshot(f"{site.url}/files/rules.docx"))
+    assert snap.content_type == documents.CONTENT_TYPES["docx"] and len(snap.pages) == 2
+    with pytest.raises(ValueError):
+        asyncio.run(fetch.fetch_document(f"{site.url}/files/rules.doc", "doc"))
+
+@pytest.mark.parametrize("head_status", [None, 405, 403])
+def test_sniff_kind(make_site, head_status):
+    # download.php отдаётся как application/pdf; без HEAD тип берётся из GET первого байта
+    site = make_site({"download.php": make_pdf(PDF_PAGES), "page.html": "<html></html>"}, head_status=head_status)
+    assert asyncio.run(fetch.sniff_kind(f"{site.url}/download.php?id=17")) == "pdf"
+    assert asyncio.run(fetch.sniff_kind(f"{site.url}/page.html")) == "html"
+    assert asyncio.run(fetch.sniff_kind(f"{site.url}/files/rules.docx")) == "docx"
@@ -0,0 +1,75 @@
+import asyncio, csv, gzip, io, json, zlib
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from apps.api.main import app
+from packages.persistence import export
+from packages.persistence.db import init_db, run_write, session_scope
+from packages.persistence.models import Measure
+
+N = 7
+
+@pytest.fixture(autouse=True)
+def _db(monkeypatch):
+    init_db()
+    monkeypatch.setattr(export, "EXPORT_BATCH", 3)  # несколько порций и gzip-блоков на выгрузку
+    def write(db):
+        for i in range(N):
+            card = {"msr_flname": f"Мера «{i}», с запятой", "msr_scrdif": {"score": "HIGH", "text": "строка\nвторая"},
+                    "provenance": {"source_urls": [f"https://min.example.ru/{i}"]}}
+            db.merge(Measure(msr_intlid=f"92_REG_MSP_EXPORT_{i}", card=card, region_code="92", prglvl="REG",
+                             segmnt="MSP", typeid="EXPORT", chkdat=datetime(2026, 1, 1 + i)))
+    run_write(write)
+
+def _db_count(**filters) -> int:
+    with session_scope() as db:
+        return db.scalar(select(func.count()).select_from(Measure).filter_by(**filters))
+
+def _collect(query, fmt: str, gzip_: bool) -> list[bytes]:
+    async def main():
+        return [chunk async for chunk in export.stream_export(query, fmt, gzip=gzip_)]
+    return asyncio.run(main())
+
+def _csv_rows(raw: bytes) -> tuple[list[str], list[dict]]:
+    text = raw.decode("utf-8")
+    assert text.startswith("\ufeff")
+    reader = csv.DictReader(io.StringIO(text[1:]))
+    return reader.fieldnames, list(reader)
+
+def test_csv_gzip_round_trip():
+    chunks = _collect(export.export_query(typeid="EXPORT"), "csv", True)
+    assert len(chunks) > 1
+    # Поток — один gzip-член: распаковывается и целиком, и по кускам
+    z = zlib.decompressobj(31)
+    assert b"".join(z.decompress(c) for c in chunks) + z.flush() == gzip.decompress(b"".join(chunks))
+    header, rows = _csv_rows(gzip.decompress(b"".join(chunks)))
+    assert header == export.columns()
+    assert len(rows) == _db_count(typeid="EXPORT") == N
+    row = rows[2]
+    assert row["msr_intlid"] == "92_REG_MSP_EXPORT_2" and row["chkdat"] == "2026-01-03T00:00:00"
+    assert row["msr_flname"] == "Мера «2», с запятой" and row["msr_scrdif.text"] == "строка\nвторая"
+    assert json.loads(row["provenance.source_urls"]) == ["https://min.example.ru/2"]
+
+def test_ndjson_round_trip_and_empty_csv():
+    raw = b"".join(_collect(export.export_query(typeid="EXPORT", chkdat_from=datetime(2026, 1, 3)), "ndjson", False))
+    items = [json.loads(line) for line in raw.decode("utf-8").splitlines()]
+    assert [it["msr_intlid"] for it in items] == [f"92_REG_MSP_EXPORT_{i}" for i in range(2, N)]
+    assert items[0]["card"]["msr_scrdif"]["score"] == "HIGH"
+    # Пустая выборка: только заголовок
+    header, rows = _csv_rows(gzip.decompress(b"".join(_collect(export.export_query(typeid="NONE"), "csv", True))))
+    assert header == export.columns() and rows == []
+
+def test_export_endpoint_streams_gzip():
+    client = TestClient(app)
+    with client.stream("GET", "/measures/export", params={"format": "csv", "typeid": "EXPORT"},
+                       headers={"Accept-Encoding": "gzip"}) as resp:
+        assert resp.status_code == 200 and resp.headers["content-encoding"] == "gzip"
+        assert resp.headers["content-type"].startswith("text/csv")
+        raw = b"".join(resp.iter_raw())
+    header, rows = _csv_rows(gzip.decompress(raw))
+    assert header == export.columns() and len(rows) == _db_count(typeid="EXPORT")
+    resp = client.get("/measures/export", params={"format": "ndjson", "region_code": "92", "typeid": "EXPORT"},
+                      headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    assert len(resp.text.splitlines()) == _db_count(region_code="92", typeid="EXPORT")
@@ -0,0 +1,84 @@
+import copy, json
+from types import SimpleNamespace
+import pytest
+from google.genai import types
+from jsonschema import Draft202012Validator
+from packages.agents.gemini import GeminiClient
+from packages.pipeline import engine
+from packages.schemas.validator import STAGE_SCHEMAS, llm_schema, stage_errors
+
+class StubModels:
+    """client.models без сети: отдаёт заготовленные ответы и запоминает запросы."""
+
+    def __init__(self, answers: list[dict]):
+        self.answers = list(answers)
+        self.requests = []
+
+    def generate_content(self, model, contents, config):
+        self.requests.append({"prompt": contents, "config": config})
+        return SimpleNamespace(text=json.dumps(self.answers.pop(0), ensure_ascii=False), usage_metadata=None)
+
+def _client(answers: list[dict]) -> GeminiClient:
+    client = GeminiClient.__new__(GeminiClient)
+    client.model = "stub"
+    client.client = SimpleNamespace(models=StubModels(answers))
+    return client
+
+@pytest.fixture
+def e6(pipeline):
+    return copy.deepcopy(pipeline["outputs"]["E6"])
+
+def _broken(e6: dict) -> dict:
+    bad = copy.deepcopy(e6)
+    bad["msr_scrdif"]["score"] = "VERY HIGH"  # вложенное поле вне enum
+    del bad["msr_scrcom"]                     # обязательное поле пропущено
+    bad["junk"] = 1                           # лишнее поле
+    return bad
+
+@pytest.mark.parametrize("stage", sorted(STAGE_SCHEMAS))
+def test_llm_schema_is_inlined_and_accepted(stage, pipeline):
+    schema = llm_schema(stage)
+    dumped = json.dumps(schema)
+    assert "$ref" not in dumped and "$schema" not in dumped and "defs" not in schema
+    types.GenerateContentConfig(response_mime_type="application/json", response_json_schema=schema)
+    # Раскрытая схема проверяет то же, что исходная
+    Draft202012Validator(schema).validate(pipeline["outputs"][stage])
+    assert stage_errors(stage, pipeline["outputs"][stage]) == []
+
+def test_stage_errors_report_top_level_fields(e6):
+    errors = stage_errors("E6", _broken(e6))
+    by_field = {e["field"]: e for e in errors}
+    assert set(by_field) == {"msr_scrdif", "msr_scrcom", "junk"}
+    assert by_field["msr_scrdif"]["path"] == "msr_scrdif.score" and not by_field["msr_scrdif"]["extra"]
+    assert by_field["junk"]["extra"] and not by_field["msr_scrcom"]["extra"]
+    assert stage_errors("E6", ["not", "an", "object"])[0]["field"] is None
+
+def test_repair_requests_only_failing_fields(e6):
+    bad = _broken(e6)
+    fixed = {"msr_scrdif": {"score": "HIGH", "text": "исправлено"}, "msr_scrcom": {"score": "LOW", "text": "добавлено"},
+             "msr_scrspe": {"score": "LOW", "text": "модель не должна это менять"}}
+    client = _client([fixed])
+    out = client.repair_stage("E6", bad, stage_errors("E6", bad), {"SOURCE_TEXT": "текст"})
+    request = client.client.models.requests[0]
+    schema = request["config"].response_json_schema
+    assert set(schema["properties"]) == set(schema["required"]) == {"msr_scrdif", "msr_scrcom"}
+    # Валидные поля уходят в запрос как контекст и остаются нетронутыми
+    assert out["msr_scrspe"] == e6["msr_scrspe"] and out["msr_scrval"] == e6["msr_scrval"]
+    assert out["msr_scrdif"] == fixed["msr_scrdif"] and out["msr_scrcom"] == fixed["msr_scrcom"]
+    assert "junk" not in out and stage_errors("E6", out) == []
+
+def test_repair_of_extra_fields_needs_no_request(e6):
+    client = _client([])
+    out = client.repair_stage("E6", {**e6, "junk": 1}, stage_errors("E6", {**e6, "junk": 1}), {})
+    assert out == e6 and client.client.models.requests == []
+
+def test_repair_output_retries_until_valid(e6, monkeypatch):
+    bad = _broken(e6)
+    half = {"msr_scrdif": {"score": "HIGH", "text": "исправлено"}, "msr_scrcom": {"score": "??", "text": "x"}}
+    client = _client([half, {"msr_scrcom": {"score": "LOW", "text": "добавлено"}}])
+    monkeypatch.setattr(engine, "_gemini", client)
+    out, errors, attempts = engine.repair_output("E6", bad, stage_errors("E6", bad), {"SOURCE_TEXT": ""})
+    assert (errors, attempts) == ([], 2)
+    second = client.client.models.requests[1]["config"].response_json_schema
+    assert list(second["properties"]) == ["msr_scrcom"]
+    assert out["msr_scrdif"] == half["msr_scrdif"]
@@ -0,0 +1,90 @@
+import asyncio, os, signal, time
+import pytest
+from packages.scraper import pool
+
+def _hang(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+def _pid() -> int:
+    return os.getpid()
+
+def _stuck(seconds: float) -> int:
+    # Как задача в C-коде: SIGALRM её не прерывает
+    signal.signal(signal.SIGALRM, signal.SIG_IGN)
+    return _hang(seconds)
+
+def test_timeout_frees_slots():
+    async def main():
+        # Забиваем все слоты зависшими задачами: без таймера в воркере следующий вызов ждал бы их до конца
+        slots = pool._slots._initial_value
+        results = await asyncio.gather(*(pool.run_in_pool(_hang, 60, timeout=0.5) for _ in range(slots)),
+                                       return_exceptions=True)
+        assert all(isinstance(r, asyncio.TimeoutError) for r in results)
+        started = time.monotonic()
+        pid = await pool.run_in_pool(_pid, timeout=10)
+        return pid, time.monotonic() - started
+    pid, elapsed = asyncio.run(main())
+    assert pid != os.getpid() and elapsed < 10
+    assert pool._slots._value == pool._slots._initial_value
+
+def test_slot_wait_is_bounded(monkeypatch):
+    monkeypatch.setattr(pool, "_slots", pool.threading.BoundedSemaphore(1))
+    pool._slots.acquire()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(pool.run_in_pool(_pid, timeout=0.2))
+    finally:
+        pool._slots.release()
+
+def _with_workers(n: int, slots: int, main):
+    pool.shutdown_pool()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("SCRAPER_WORKERS", str(n))
+        mp.setattr(pool, "_slots", pool.threading.BoundedSemaphore(slots))
+        try:
+            return asyncio.run(main())
+        finally:
+            pool.shutdown_pool()
+
+def test_timeout_spares_other_tasks():
+    async def main():
+        # Просроченные задачи прерываются в своих воркерах; соседняя долгая задача доживает до конца
+        return await asyncio.gather(pool.run_in_pool(_hang, 1.0, timeout=10),
+                                    *(pool.run_in_pool(_hang, 60, timeout=0.3) for _ in range(2)),
+                                    return_exceptions=True)
+    healthy, *expired = _with_workers(3, 3, main)
+    assert isinstance(healthy, int) and all(isinstance(r, asyncio.TimeoutError) for r in expired)
+
+def test_stuck_task_recycles_pool_after_grace(monkeypatch):
+    monkeypatch.setattr(pool, "POOL_KILL_GRACE", 0.3)
+
+    async def main():
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run_in_pool(_stuck, 60, timeout=0.2)
+        return time.monotonic() - started, await pool.run_in_pool(_pid, timeout=10)
+    elapsed, pid = _with_workers(1, 1, main)
+    assert elapsed < 5 and pid != os.getpid()
+
+def test_timeout_counts_from_task_start():
+    async def main():
+        # Слотов больше, чем воркеров: вторая задача ждёт в очереди executor'а дольше своего timeout
+        return await asyncio.gather(pool.run_in_pool(_hang, 0.8, timeout=5), pool.run_in_pool(_hang, 0.1, timeout=0.5))
+    first, second = _with_workers(1, 2, main)
+    assert first == second
+
+def test_cancelled_slot_wait_releases_slot(monkeypatch):
+    monkeypatch.setattr(pool, "_slots", pool.threading.BoundedSemaphore(1))
+
+    async def main():
+        pool._slots.acquire()
+        task = asyncio.ensure_future(pool.run_in_pool(_pid, timeout=5))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.sleep(0)
+        pool._slots.release()
+        await asyncio.sleep(0.3)
+        return task.cancelled()
+    assert asyncio.run(main())
+    assert pool._slots._value == 1
@@ -0,0 +1,70 @@
+import importlib, os
+import pytest
+from packages.agents import relevance
+from packages.scraper.clean import clean_html
+
+SNAPSHOTS = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures", "snapshots")
+
+LOAN = "Льготный заём на модернизацию производства. Фонд развития промышленности предоставляет займы под 3% годовых на срок до 5 лет."
+REGULATION = ("Постановление Кабинета Министров Республики Татарстан от 12.03.2024 № 145 «Об утверждении Порядка "
+              "предоставления субсидий из бюджета Республики Татарстан на возмещение части затрат субъектов малого "
+              "и среднего предпринимательства»")
+GRANT = "Грант на создание и развитие малого инновационного предприятия"
+CONTACTS = ("Контакты. Адрес: г. Казань, ул. Баумана, 1. Телефон приёмной: +7 (843) 222-33-44, "
+            "e-mail: info@mert.tatarstan.ru. Руководство министерства.")
+NEWS = ("Новости. 01.07.2025 Министр провёл рабочее совещание с руководителями районов. "
+        "02.07.2025 Фоторепортаж с выставки. Смотреть видео.")
+VACANCIES = "Вакансии министерства. Открыт приём документов на замещение вакантных должностей гражданской службы."
+
+def _snapshot(name: str) -> str:
+    with open(os.path.join(SNAPSHOTS, f"{name}.html"), "r", encoding="utf-8") as f:
+        return clean_html(f.read())["text"]
+
+@pytest.mark.parametrize("text_", [LOAN, REGULATION, GRANT, "fund_loan_article", "mert_tatarstan_subsidy"])
+def test_starter_model_keeps_measures(text_):
+    text_ = _snapshot(text_) if text_.isidentifier() else text_
+    assert relevance.classify(text_)["relevant"]
+
+@pytest.mark.parametrize("text_", [CONTACTS, NEWS, VACANCIES])
+def test_starter_model_rejects_non_measures(text_):
+    assert not relevance.classify(text_)["relevant"]
+
+def test_trained_model_separates_news_feed():
+    # Лента новостей полна слов мер: стартовый словарь её пропускает, обученная модель — нет
+    assert relevance.classify(_snapshot("portal_news_list"))["relevant"]
+    positives = [LOAN, REGULATION, GRANT, _snapshot("fund_loan_article"), _snapshot("mert_tatarstan_subsidy")]
+    negatives = [CONTACTS, NEWS, VACANCIES, _snapshot("portal_news_list")]
+    samples = [(t, 1) for t in positives] + [(t, 0) for t in negatives]
+    model, metrics = relevance.train(samples * 3, min_df=1)
+    assert metrics["recall"] == 1.0
+    assert all(relevance.classify(t, model)["relevant"] for t in positives)
+    assert not any(relevance.classify(t, model)["relevant"] for t in negatives)
+
+def test_filter_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("RELEVANCE_ENABLED", raising=False)
+    assert importlib.reload(relevance).RELEVANCE_ENABLED is False
+
+def test_history_labels_ignore_skips_caused_by_errors():
+    from packages.persistence.db import init_db, session_scope
+    from packages.persistence.models import Run, Source, Step
+    from scripts.train_relevance import history_labels
+    init_db()
+    cases = {"saved": [("E1", "ok"), ("E4", "ok"), ("SAVE", "ok")],
+             "invalid": [("E1", "ok"), ("E4", "invalid"), ("SAVE", "skipped")],
+             "outage": [("E1", "error"), ("E4", "error"), ("SAVE", "skipped")],
+             "mixed": [("E1", "invalid"), ("E4", "error"), ("SAVE", "skipped")],
+             "resumed": [("E1", "ok"), ("E4", "error"), ("SAVE", "skipped"), ("E4", "ok"), ("SAVE", "ok")]}
+    with session_scope() as db:
+        run = Run(region="92")
+        db.add(run)
+        db.flush()
+        ids = {}
+        for name, steps in cases.items():
+            source = Source(url=f"https://labels.example.ru/{name}")
+            db.add(source)
+            db.flush()
+            ids[name] = source.id
+            db.add_all(Step(run_id=run.id, source_id=source.id, stage=stage, status=status) for stage, status in steps)
+    labels = history_labels()
+    assert {name: labels.get(sid) for name, sid in ids.items()} == \
+        {"saved": 1, "invalid": 0, "outage": None, "mixed": None, "resumed": 1}
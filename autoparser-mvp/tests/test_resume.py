@@ -0,0 +1,99 @@
+import pytest
+from packages.pipeline import engine, control
+from packages.pipeline.executors import InlineExecutor
+from packages.persistence.db import session_scope
+from packages.persistence.models import Run, Step, Measure
+
+def _run(run_id: int):
+    with session_scope() as db:
+        return db.query(Run.status, Run.ok, Run.errors, Run.filtered).filter(Run.id == run_id).one()
+
+def _resume(run_id: int) -> None:
+    control.request_resume(run_id)
+    engine.resume_run(run_id, InlineExecutor())
+
+def test_saved_card_with_failed_stage_is_completed_on_resume(pipeline):
+    url = "https://min.example.ru/e5"
+    pipeline["texts"][url] = "Субсидия на возмещение затрат. " * 30
+    pipeline["fail"] = {"E5"}
+    with session_scope() as db:
+        before = db.query(Measure).count()
+    run_id = engine.start_run("92", InlineExecutor())
+    run = _run(run_id)
+    assert (run.ok, run.errors) == (1, 1)
+    with session_scope() as db:
+        source_id = db.query(Step.source_id).filter(Step.run_id == run_id, Step.stage == "SAVE").scalar()
+        mid = db.query(Step.payload).filter(Step.run_id == run_id, Step.stage == "SAVE").scalar()["msr_intlid"]
+
+    st = engine.SourceState(run_id=run_id, region="92", url=url, source_id=source_id)
+    assert engine.restore_state(st) is False
+    assert st.msr_intlid == mid
+    assert st.restored == {"FETCH", "CLEAN", "E1", "E2", "E3", "E4", "E6", "E7"}
+
+    pipeline["fail"], pipeline["calls"], pipeline["fetches"] = set(), [], []
+    _resume(run_id)
+    assert pipeline["calls"] == ["E5"] and pipeline["fetches"] == []
+    run = _run(run_id)
+    assert (run.status, run.ok, run.errors) == ("done", 1, 0)
+    with session_scope() as db:
+        assert db.query(Measure).count() == before + 1
+        card = db.get(Measure, mid).card
+    e5_field = next(iter(pipeline["outputs"]["E5"]))
+    assert e5_field in card and card["provenance"]["source_urls"] == [url]
+
+    pipeline["calls"] = []
+    _resume(run_id)
+    assert pipeline["calls"] == []
+    assert _run(run_id).ok == 1
+
+def test_resume_after_missing_e4_builds_the_card(pipeline):
+    url = "https://min.example.ru/e4"
+    pipeline["texts"][url] = "Грант на развитие производства. " * 30
+    pipeline["fail"] = {"E4"}
+    run_id = engine.start_run("92", InlineExecutor())
+    assert _run(run_id).ok == 0
+
+    pipeline["fail"], pipeline["calls"] = set(), []
+    _resume(run_id)
+    assert pipeline["calls"] == ["E4"]
+    run = _run(run_id)
+    assert (run.ok, run.errors) == (1, 0)
+    with session_scope() as db:
+        statuses = [s for s, in db.query(Step.status).filter(Step.run_id == run_id, Step.stage == "SAVE")]
+    assert statuses == ["skipped", "ok"]
+
+def test_resume_refused_while_run_is_alive(pipeline):
+    pipeline["texts"]["https://min.example.ru/alive"] = "Субсидия. " * 30
+    run_id = engine.start_run("92", InlineExecutor())
+    engine.recorder.update_run(run_id, status="running")
+    with pytest.raises(ValueError):
+        control.request_resume(run_id)
+
+def test_run_with_queued_sources_is_not_stale(pipeline):
+    from datetime import datetime, timedelta
+    run_id = engine.recorder.start_run("92")
+    # Chord отправлен, но задачи ещё в брокере: heartbeat'а нет давно
+    engine.recorder.update_run(run_id, status="running", queued=2,
+                               heartbeat_at=datetime.utcnow() - timedelta(seconds=control.RUN_STALE_SEC * 2))
+    control.mark_stale_runs()
+    assert _run(run_id).status == "running"
+    with pytest.raises(ValueError):
+        control.request_resume(run_id)
+
+    engine.recorder.update_run(run_id, queued=0)
+    control.mark_stale_runs()
+    assert _run(run_id).status == "stale"
+
+def test_celery_tasks_count_down_the_queue(pipeline, monkeypatch):
+    worker = pytest.importorskip("apps.api.worker.app")
+    dispatched = []
+    monkeypatch.setattr(worker, "chord", lambda tasks: lambda callback: dispatched.extend(tasks))
+    url = "https://min.example.ru/queued"
+    pipeline["texts"][url] = "Субсидия на возмещение затрат. " * 30
+    run_id = engine.recorder.start_run("92")
+    worker.CeleryExecutor().run_sources(run_id, "92", [url, url + "/2"])
+    with session_scope() as db:
+        assert db.get(Run, run_id).queued == 2 and len(dispatched) == 2
+    worker.process_source_task(run_id, "92", url)
+    with session_scope() as db:
+        assert db.get(Run, run_id).queued == 1
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from packages.persistence import search_index
+from packages.persistence.async_db import AsyncSessionLocal
+from packages.persistence.db import init_db, run_write
+from packages.persistence.models import Measure, Snapshot, Source, Step, Run
+
+@pytest.fixture(autouse=True)
+def _db():
+    init_db()
+
+def _save(mid: str, title: str, source: str = "", **facets) -> None:
+    card = {"msr_flname": title, "msr_shdesc": title}
+    cols = {"region_code": "92", "prglvl": "REG", "segmnt": "MSP", "typeid": "SUBS", **facets}
+    def write(db):
+        db.merge(Measure(msr_intlid=mid, card=card, **cols))
+        search_index.index_measure(db, mid, card, source)
+    run_write(write)
+
+def _search(q=None, **kw) -> dict:
+    async def main():
+        async with AsyncSessionLocal() as session:
+            return await search_index.search(session, q, **kw)
+    return asyncio.run(main())
+
+def _ids(result: dict) -> list[str]:
+    return [it["msr_intlid"] for it in result["items"]]
+
+def test_cursor_is_stable_across_equal_ranks():
+    # Одинаковые карточки — одинаковый bm25: порядок и продолжение решает msr_intlid
+    mids = [f"92_REG_MSP_TIE_{i:03d}" for i in (4, 1, 3, 0, 2)]
+    for mid in mids:
+        _save(mid, "Компенсация затрат на сертификацию экспортной продукции")
+    pages, cursor = [], None
+    while True:
+        page = _search("сертификация экспортной", limit=2, cursor=cursor, facets=False)
+        pages.append(_ids(page))
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert [len(p) for p in pages] == [2, 2, 1]
+    assert sum(pages, []) == sorted(mids)
+    assert len({it["rank"] for it in _search("сертификация экспортной", limit=10, facets=False)["items"]}) == 1
+
+def test_cursor_without_query_pages_by_id():
+    for i in range(3):
+        _save(f"92_REG_MSP_PLAIN_{i}", "Без запроса", typeid="PLAIN")
+    first = _search(None, filters={"typeid": "PLAIN"}, limit=2, facets=False)
+    rest = _search(None, filters={"typeid": "PLAIN"}, limit=2, cursor=first["next_cursor"], facets=False)
+    assert _ids(first) + _ids(rest) == [f"92_REG_MSP_PLAIN_{i}" for i in range(3)] and rest["next_cursor"] is None
+
+@pytest.mark.parametrize("q", ["лизинг", "лизинга", "лизингом оборудования", "ОБОРУДОВАНИЕМ"])
+def test_russian_word_forms_match(q):
+    _save("92_REG_MSP_LEASE", "Субсидирование лизинга оборудования")
+    assert "92_REG_MSP_LEASE" in _ids(_search(q, limit=50, facets=False))
+
+def test_fts5_query_stems_and_escapes():
+    assert search_index.fts5_query("Лизинга на оборудование") == '"лизин"* "оборудован"*'
+    assert search_index.fts5_query('") OR *') == '"or"*'
+
+def test_title_outranks_source_text():
+    _save("92_REG_MSP_RANK_TITLE", "Грант на агротуризм")
+    _save("92_REG_MSP_RANK_SOURCE", "Другая мера", source="Упоминание: агротуризм.")
+    assert _ids(_search("агротуризм", limit=5, facets=False)) == ["92_REG_MSP_RANK_TITLE", "92_REG_MSP_RANK_SOURCE"]
+
+def test_facets_ignore_own_filter():
+    _save("92_REG_MSP_FACET_A", "Фасетная мера", region_code="16", segmnt="MSP")
+    _save("92_REG_MSP_FACET_B", "Фасетная мера", region_code="16", segmnt="SELF")
+    _save("92_REG_MSP_FACET_C", "Фасетная мера", region_code="77", segmnt="MSP")
+    result = _search("фасетная", filters={"region_code": "16"}, limit=10)
+    assert sorted(_ids(result)) == ["92_REG_MSP_FACET_A", "92_REG_MSP_FACET_B"]
+    assert result["facets"]["region_code"] == {"16": 2, "77": 1}  # свой фильтр не применяется
+    assert result["facets"]["segmnt"] == {"MSP": 1, "SELF": 1}
+
+def test_rebuild_reads_source_text_by_save_step(tmp_path):
+    path = tmp_path / "source.txt"
+    path.write_text("Порядок возмещения затрат на геотермальные установки", encoding="utf-8")
+    mid = "92_REG_MSP_REBUILD"
+    def write(db):
+        run = Run(region="92")
+        source = Source(url="https://min.example.ru/rebuild")
+        db.add_all([run, source])
+        db.flush()
+        db.add(Snapshot(source_id=source.id, path_txt=str(path)))
+        db.add(Step(run_id=run.id, source_id=source.id, stage="SAVE", status="ok", payload={"msr_intlid": mid}))
+        db.merge(Measure(msr_intlid=mid, card={"msr_flname": "Карточка без слова"},
+                         region_code="92", prglvl="REG", segmnt="MSP", typeid="SUBS"))
+    run_write(write)
+    assert search_index.rebuild() >= 1
+    assert _ids(_search("геотермальные", facets=False)) == [mid]